@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,11 +42,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "tasks.middleware.RequestTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "tasks.middleware.ReadReplicaMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -56,7 +59,6 @@ TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
         "DIRS": ["templates"],
-        "APP_DIRS": True,
         "OPTIONS": {
             "context_processors": [
                 "django.template.context_processors.debug",
@@ -64,6 +66,16 @@ TEMPLATES = [
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
             ],
+            # Templates are compiled once per process, not on every render
+            "loaders": [
+                (
+                    "django.template.loaders.cached.Loader",
+                    [
+                        "django.template.loaders.filesystem.Loader",
+                        "django.template.loaders.app_directories.Loader",
+                    ],
+                ),
+            ],
         },
     },
 ]
@@ -74,13 +86,189 @@ WSGI_APPLICATION = "task_manager.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
+# DATABASE_PROFILE picks one of the configurations below: "development" (the
+# default), "sqlite" for SQLite in production or "postgresql".
+
+DATABASE_PROFILE = os.environ.get("DATABASE_PROFILE", "development")
+
+DATABASE_PROFILES = {
+    "development": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # A file rather than memory, so that tests can write from several threads
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+        # Seconds a writer waits for the write lock, long enough for the
+        # concurrent writers of the tests on a loaded machine
+        "OPTIONS": {"timeout": 20},
+    },
+    "sqlite": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ.get("SQLITE_PATH", BASE_DIR / "db.sqlite3"),
+        "CONN_MAX_AGE": 600,
+        # Seconds a writer waits for the write lock, the busy_timeout pragma
+        "OPTIONS": {"timeout": 5},
+    },
+    "postgresql": {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ.get("POSTGRES_DB", "task_manager"),
+        "USER": os.environ.get("POSTGRES_USER", "task_manager"),
+        "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+        "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
+        "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+        "CONN_MAX_AGE": 600,
+        "OPTIONS": {
+            "connect_timeout": 5,
+            # Writers wait for the per-user lock (TaskCounter.objects.lock) at
+            # most this long, instead of forever
+            "options": "-c lock_timeout=5000 -c statement_timeout=30000",
+        },
+    },
+}
+
+DATABASES = {"default": DATABASE_PROFILES[DATABASE_PROFILE]}
+
+# Read replicas
+# DATABASE_REPLICAS lists the aliases of copies of "default", comma separated in
+# the environment, none by default. tasks.routers.ReadReplicaRouter sends the
+# reads of GET requests there, except inside transactions and for the users
+# (or anonymous clients) that wrote in the last DATABASE_REPLICA_LAG_SECONDS,
+# which read their writes from the primary. The cached task lists are rendered
+# from the replicas too, so the replicas must never lag more. The "replica"
+# alias is a second SQLite file standing in for a replica locally, kept up to
+# date by manage.py sync_replica, or a replica server of PostgreSQL.
+
+if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    REPLICA = {
+        "NAME": os.environ.get("REPLICA_SQLITE_PATH", BASE_DIR / "db.replica.sqlite3")
+    }
+else:
+    REPLICA = {
+        "HOST": os.environ.get("POSTGRES_REPLICA_HOST", DATABASES["default"]["HOST"])
+    }
+# Tests read the replica from the test database
+DATABASES["replica"] = {
+    **DATABASES["default"],
+    **REPLICA,
+    "TEST": {"MIRROR": "default"},
+}
+
+DATABASE_REPLICAS = [
+    alias for alias in os.environ.get("DATABASE_REPLICAS", "").split(",") if alias
+]
+DATABASE_ROUTERS = ["tasks.routers.ReadReplicaRouter"]
+DATABASE_REPLICA_LAG_SECONDS = 10
+DATABASE_PRIMARY_COOKIE = "read_primary"
+
+# Applied to every new SQLite connection by tasks.database. With WAL, readers
+# never wait for the writer, and synchronous=normal only syncs at checkpoints,
+# which WAL keeps safe against corruption.
+SQLITE_PRAGMAS = {}
+if DATABASE_PROFILE == "sqlite":
+    SQLITE_PRAGMAS = {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64000,
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# The rendered task lists are cached per user, with the versions that
+# invalidate them, their ETags and the users pinned to the primary database.
+# Every worker process must see the same cache: TASK_CACHE_DIR switches the
+# "default" cache to the file-based backend, or point it to Memcached or Redis.
+# LocMemCache, a cache per process, only suits the single process of the
+# development server, tasks.checks warns about it elsewhere.
+
+TASK_CACHE_DIR = os.environ.get("TASK_CACHE_DIR")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "sessions": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "sessions",
+    },
+}
+
+if TASK_CACHE_DIR:
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": TASK_CACHE_DIR,
     }
+
+TASK_LIST_CACHE = "default"
+TASK_LIST_CACHE_TIMEOUT = 300
+
+if DATABASE_PROFILE == "development":
+    SILENCED_SYSTEM_CHECKS = ["tasks.W001"]
+
+
+# Sessions
+# https://docs.djangoproject.com/en/3.2/topics/http/sessions/
+# SESSION_STORE picks where sessions live: "db" (the default) reads them from
+# the database on every request, "cached_db" reads them from the "sessions"
+# cache and only falls back to the database on a miss, and "signed_cookies"
+# keeps small sessions in the cookie itself, with no storage at all.
+# cached_db saves the session query, but needs a "sessions" cache shared by
+# every worker process (Memcached, Redis, the database cache): a logout only
+# evicts the session from the cache it went through, and with a cache per
+# process the other workers would keep the session until it expires from
+# theirs, SESSION_COOKIE_AGE later. tasks.checks refuses it with LocMemCache.
+
+SESSION_STORE = os.environ.get("SESSION_STORE", "db")
+
+SESSION_ENGINES = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
 }
 
+SESSION_ENGINE = SESSION_ENGINES[SESSION_STORE]
+SESSION_CACHE_ALIAS = "sessions"
+
+# The view counter of /sessiontest is kept in the sessions cache and written
+# to the session every this many views, instead of saving the session on each.
+# Above 1 it needs the shared "sessions" cache of cached_db, each worker would
+# count its own views otherwise.
+SESSION_VIEWS_FLUSH_EVERY = 1
+
+
+# Request timing
+# Every request is timed by tasks.middleware.RequestTimingMiddleware. Requests
+# over these budgets are logged as warnings, set the level of the tasks.timing
+# logger to INFO to log all of them. The timings only go back to the client, in
+# a Server-Timing header, with REQUEST_TIMING_HEADER: they tell anyone how much
+# database work a request takes.
+
+REQUEST_TIMING_HEADER = DEBUG
+REQUEST_TIMING_QUERY_BUDGET = 20
+REQUEST_TIMING_LATENCY_BUDGET_MS = 200
+REQUEST_TIMING_TOP_QUERIES = 5
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "tasks.timing": {"handlers": ["console"], "level": "WARNING"},
+    },
+}
+
+
+# Tasks
+# Renumbers the pending tasks of a user 1..N whenever one is completed or
+# deleted, instead of leaving the hole (see also manage.py compact_priorities)
+
+TASKS_COMPACT_PRIORITIES = False
+
+# Threads the async views read in, see tasks.views. 0 reads in the thread of
+# the request, like the sync views.
+ASYNC_READ_THREADS = 16
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -120,6 +308,15 @@ USE_TZ = True
 
 STATIC_URL = "/static/"
 
+# Built by manage.py build_static into tasks/static, then collected with
+# manage.py collectstatic under names holding a hash of their content, along
+# with their gzip and brotli variants, served by tasks.views.static_file_view
+STATIC_ROOT = BASE_DIR / "staticfiles"
+STATICFILES_STORAGE = "tasks.storage.CompressedManifestStaticFilesStorage"
+
+# Hashed names never change content, unhashed ones are revalidated
+STATIC_MAX_AGE = 60 * 60 * 24 * 365
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
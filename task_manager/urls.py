@@ -13,6 +13,7 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+
 from django.contrib import admin
 from django.urls import path
 from tasks.views import (
@@ -27,6 +28,15 @@ from tasks.views import (
     GenericCompletedTaskView,
     GenericMarkTaskAsCompleteView,
     GenericAllTaskView,
+    TaskBatchView,
+    TaskExportView,
+    TaskListAPIView,
+    TaskStatsAPIView,
+    TaskStatsView,
+    async_complete_task_view,
+    async_task_detail_view,
+    async_task_view,
+    static_file_view,
 )
 from django.contrib.auth.views import LogoutView
 from django.views.generic import RedirectView
@@ -47,4 +57,14 @@ urlpatterns = [
     path("user/login/", UserLoginView.as_view()),
     path("user/logout/", LogoutView.as_view()),
     path("sessiontest", session_storage_view),
+    path("api/tasks/", TaskListAPIView.as_view()),
+    path("api/tasks/batch/", TaskBatchView.as_view()),
+    path("stats/", TaskStatsView.as_view()),
+    path("api/stats/", TaskStatsAPIView.as_view()),
+    path("export/tasks.csv", TaskExportView.as_view(format="csv")),
+    path("export/tasks.ndjson", TaskExportView.as_view(format="ndjson")),
+    path("async/tasks/", async_task_view),
+    path("async/detail-task/<pk>", async_task_detail_view),
+    path("async/complete_task/<pk>/", async_complete_task_view),
+    path("static/<path:path>", static_file_view),
 ]
@@ -1,7 +1,277 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 
-# Register your models here.
+from tasks.cache import invalidate_lists
+from tasks.models import Task, TaskCounter, TaskDailyStats, time_to_complete
+from tasks.views import compact_priorities, handlePriorityCascading
 
-from tasks.models import Task
 
-admin.sites.site.register(Task)
+def estimate_count(queryset):
+    # The rows of the whole table from what the database already knows, None
+    # when it cannot tell
+    connection = connections[queryset.db]
+    table = connection.ops.quote_name(queryset.model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            # Kept up to date by autovacuum, -1 before the first ANALYZE
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+        elif connection.vendor == "sqlite":
+            # The last id, a walk down the primary key. Archived tasks make it
+            # an overestimate.
+            cursor.execute(f"SELECT MAX(rowid) FROM {table}")
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    # The changelist counts its rows for the page links. Unfiltered, that is a
+    # scan of the whole table, estimated instead once the table is large. The
+    # filters are backed by indexes and counted exactly.
+    exact_below = 10000
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = estimate_count(self.object_list)
+            if estimate is not None and estimate >= self.exact_below:
+                return estimate
+        return super().count
+
+
+class UserFilter(admin.SimpleListFilter):
+    # Set by the links of the user column, listing every user here would not
+    # scale
+    title = "user"
+    parameter_name = "user"
+
+    def lookups(self, request, model_admin):
+        value = self.value()
+        if value and value.isdigit():
+            user = User.objects.filter(pk=value).first()
+            if user is not None:
+                return [(value, str(user))]
+        return []
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value and value.isdigit():
+            return queryset.filter(user_id=value)
+        return queryset
+
+
+class TaskStateFilter(admin.SimpleListFilter):
+    # The conditions of the partial indexes of Task
+    title = "state"
+    parameter_name = "state"
+
+    def lookups(self, request, model_admin):
+        return [
+            ("pending", "Pending"),
+            ("completed", "Completed"),
+            ("deleted", "Deleted"),
+        ]
+
+    def queryset(self, request, queryset):
+        if self.value() == "pending":
+            return queryset.pending()
+        if self.value() == "completed":
+            return queryset.filter(completed=True, deleted=False)
+        if self.value() == "deleted":
+            return queryset.filter(deleted=True)
+        return queryset
+
+
+class PriorityFilter(admin.SimpleListFilter):
+    title = "priority"
+    parameter_name = "priority"
+    ranges = {"1": (1, 1), "2-5": (2, 5), "6-10": (6, 10), "11+": (11, None)}
+
+    def lookups(self, request, model_admin):
+        return [(name, name) for name in self.ranges]
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.ranges:
+            return queryset
+        low, high = self.ranges[self.value()]
+        if high is None:
+            return queryset.filter(priority__gte=low)
+        return queryset.filter(priority__range=(low, high))
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = (
+        "title",
+        "user_link",
+        "priority",
+        "completed",
+        "deleted",
+        "created_date",
+    )
+    list_select_related = ("user",)
+    list_filter = (UserFilter, TaskStateFilter, PriorityFilter)
+    raw_id_fields = ("user",)
+    search_fields = ("title", "description")
+    ordering = ("-id",)
+    # No second count of the whole table next to the filtered one
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    actions = ("complete_tasks", "soft_delete_tasks", "compact_task_priorities")
+    # Users per compaction statement, within the parameter limit of SQLite
+    compact_batch_size = 500
+
+    @admin.display(description="user", ordering="user")
+    def user_link(self, task):
+        if task.user is None:
+            return "-"
+        return format_html('<a href="?user={}">{}</a>', task.user_id, task.user)
+
+    def get_actions(self, request):
+        # delete_selected deletes task by task and leaves the counters behind
+        actions = super().get_actions(request)
+        actions.pop("delete_selected", None)
+        return actions
+
+    def get_search_results(self, request, queryset, search_term):
+        # The full-text index of the task views instead of LIKE scans
+        if not search_term:
+            return queryset, False
+        return queryset.search(search_term), False
+
+    def save_model(self, request, obj, form, change):
+        # What the task views do around their saves: the cascade, the counters,
+        # the daily stats and the cached lists of the users involved. The
+        # change form runs in a transaction already.
+        old = None
+        if change:
+            old = (
+                Task.objects.filter(pk=obj.pk)
+                .values("user", "priority", "completed", "deleted")
+                .first()
+            )
+        user_ids = sorted(
+            {user_id for user_id in (obj.user_id, old and old["user"]) if user_id}
+        )
+        users = [User(pk=user_id) for user_id in user_ids]
+        for user in users:
+            TaskCounter.objects.lock(user)
+
+        # A task that becomes pending, or moves to another priority or user,
+        # takes its slot like in the task views
+        unmoved = (
+            old is not None
+            and not old["completed"]
+            and not old["deleted"]
+            and (old["user"], old["priority"]) == (obj.user_id, obj.priority)
+        )
+        if obj.user_id and not obj.completed and not obj.deleted and not unmoved:
+            handlePriorityCascading(obj.pk if change else None, obj.priority, obj.user)
+        super().save_model(request, obj, form, change)
+
+        if obj.user_id and old is None:
+            TaskDailyStats.objects.add(
+                obj.user, created=1, completed=int(obj.completed)
+            )
+        elif obj.user_id and obj.completed and not old["completed"]:
+            TaskDailyStats.objects.add(
+                obj.user, completed=1, completion_time=obj.created_date - obj.created_at
+            )
+        TaskCounter.objects.rebuild_many(user_ids)
+        if settings.TASKS_COMPACT_PRIORITIES and users:
+            compact_priorities(*users)
+        for user in users:
+            invalidate_lists(user)
+
+    def delete_model(self, request, obj):
+        # Soft deleted like in the task views, purge_tasks archives it later on
+        self.update_tasks(Task.objects.filter(pk=obj.pk, deleted=False), deleted=True)
+
+    def delete_queryset(self, request, queryset):
+        self.update_tasks(queryset.filter(deleted=False), deleted=True)
+
+    def selected_users(self, queryset):
+        # In the order of their ids, so that concurrent actions lock them in
+        # the same order
+        return [
+            User(pk=user_id)
+            for user_id in Task.objects.filter(pk__in=queryset.values("pk"))
+            .exclude(user=None)
+            .order_by("user")
+            .values_list("user", flat=True)
+            .distinct()
+        ]
+
+    def update_tasks(self, queryset, **changes):
+        # One UPDATE for all the selected tasks rather than a save() each, then
+        # the counters and cached lists of their users
+        tasks = Task.objects.filter(pk__in=queryset.values("pk"))
+        with transaction.atomic():
+            users = self.selected_users(tasks)
+            for user in users:
+                TaskCounter.objects.lock(user)
+            now = timezone.now()
+            if changes.get("completed"):
+                # Today's completions of each user, from the grouped selection
+                completions = (
+                    tasks.exclude(user=None)
+                    .values("user")
+                    .annotate(count=Count("id"), time=Sum(time_to_complete(now)))
+                    .order_by()
+                )
+                for row in completions:
+                    TaskDailyStats.objects.add(
+                        User(pk=row["user"]),
+                        completed=row["count"],
+                        completion_time=row["time"],
+                    )
+            updated = tasks.update(**changes, created_date=now)
+            TaskCounter.objects.rebuild_many([user.pk for user in users])
+            if settings.TASKS_COMPACT_PRIORITIES:
+                for start in range(0, len(users), self.compact_batch_size):
+                    compact_priorities(*users[start : start + self.compact_batch_size])
+            for user in users:
+                invalidate_lists(user)
+        return updated
+
+    @admin.action(description="Mark selected tasks as completed")
+    def complete_tasks(self, request, queryset):
+        updated = self.update_tasks(
+            queryset.filter(completed=False, deleted=False), completed=True
+        )
+        self.message_user(request, f"Completed {updated} tasks", messages.SUCCESS)
+
+    @admin.action(description="Delete selected tasks (soft)")
+    def soft_delete_tasks(self, request, queryset):
+        updated = self.update_tasks(queryset.filter(deleted=False), deleted=True)
+        self.message_user(request, f"Deleted {updated} tasks", messages.SUCCESS)
+
+    @admin.action(description="Renumber the pending tasks of the selected users")
+    def compact_task_priorities(self, request, queryset):
+        users = self.selected_users(queryset)
+        moved = 0
+        with transaction.atomic():
+            for start in range(0, len(users), self.compact_batch_size):
+                moved += compact_priorities(
+                    *users[start : start + self.compact_batch_size]
+                )
+            for user in users:
+                invalidate_lists(user)
+        self.message_user(
+            request,
+            f"Renumbered {moved} tasks of {len(users)} users",
+            messages.SUCCESS,
+        )
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.backends.signals import connection_created
 
 
 class TasksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tasks'
+
+    def ready(self):
+        from tasks.checks import check_sessions_cache, check_task_list_cache
+        from tasks.database import apply_sqlite_pragmas
+
+        connection_created.connect(apply_sqlite_pragmas)
+        checks.register(check_sessions_cache)
+        checks.register(check_task_list_cache)
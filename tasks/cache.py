@@ -0,0 +1,87 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+# Rendered task list pages are cached per user. Every key embeds the user's
+# version number, which the task views bump on each write, so invalidating all
+# the cached pages of a user is a single cache write and stale pages are never
+# looked up again. They simply expire.
+
+STATS_KEYS = {"hits": "tasks:list:hits", "misses": "tasks:list:misses"}
+
+
+def get_cache():
+    return caches[settings.TASK_LIST_CACHE]
+
+
+def version_key(user):
+    return f"tasks:list:version:{user.pk}"
+
+
+def new_version():
+    # Never restarting from 1 means an evicted version cannot resurrect the
+    # pages cached under an older one
+    return time.time_ns()
+
+
+def get_list_version(user):
+    cache = get_cache()
+    version = cache.get(version_key(user))
+    if version is None:
+        version = new_version()
+        cache.add(version_key(user), version, timeout=None)
+        version = cache.get(version_key(user), version)
+    return version
+
+
+def bump_list_version(user):
+    cache = get_cache()
+    try:
+        cache.incr(version_key(user))
+    except ValueError:
+        cache.set(version_key(user), new_version(), timeout=None)
+
+
+def invalidate_lists(user):
+    # Called by the task views inside their transaction. Bumping once more on
+    # commit drops any page a concurrent request rendered from the old tasks
+    # and cached under the new version in the meantime.
+    bump_list_version(user)
+    transaction.on_commit(lambda: bump_list_version(user))
+
+
+def list_page_key(user, view_name, query_params):
+    query = "&".join(
+        f"{name}={value}"
+        for name, values in sorted(query_params.lists())
+        for value in values
+    )
+    digest = hashlib.md5(query.encode()).hexdigest()
+    return f"tasks:list:{user.pk}:{get_list_version(user)}:{view_name}:{digest}"
+
+
+def get_or_set_list_value(user, name, compute):
+    # Caches anything derived from the user's tasks until their next write
+    key = f"tasks:list:{user.pk}:{get_list_version(user)}:{name}"
+    return get_cache().get_or_set(key, compute, settings.TASK_LIST_CACHE_TIMEOUT)
+
+
+def record(outcome):
+    cache = get_cache()
+    try:
+        cache.incr(STATS_KEYS[outcome])
+    except ValueError:
+        cache.add(STATS_KEYS[outcome], 0, timeout=None)
+        cache.incr(STATS_KEYS[outcome])
+
+
+def get_stats():
+    stats = get_cache().get_many(STATS_KEYS.values())
+    return {outcome: stats.get(key, 0) for outcome, key in STATS_KEYS.items()}
+
+
+def reset_stats():
+    get_cache().delete_many(STATS_KEYS.values())
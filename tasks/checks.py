@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.checks import Error, Warning
+
+# Caches of their own in every worker process
+PROCESS_LOCAL_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+def check_task_list_cache(app_configs, **kwargs):
+    # Another worker would go on serving the pages and ETags cached before a
+    # write, and reading the user's tasks from a replica, for the timeout of
+    # the cache
+    backend = settings.CACHES[settings.TASK_LIST_CACHE]["BACKEND"]
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Warning(
+            "The task list cache is not shared by the worker processes, they "
+            "can serve stale task lists after a write.",
+            hint="Set TASK_CACHE_DIR, or the "
+            f"{settings.TASK_LIST_CACHE} cache to a shared backend such as "
+            "Memcached or Redis.",
+            id="tasks.W001",
+        )
+    ]
+
+
+def check_sessions_cache(app_configs, **kwargs):
+    # A logout only evicts a cached session from the cache of the worker it
+    # went to, the others keep the session until it expires from theirs
+    backend = settings.CACHES[settings.SESSION_CACHE_ALIAS]["BACKEND"]
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    errors = []
+    if settings.SESSION_ENGINE == "django.contrib.sessions.backends.cached_db":
+        errors.append(
+            Error(
+                "Cached sessions need a cache shared by the worker processes.",
+                hint=f"Set SESSION_STORE to db, or the {settings.SESSION_CACHE_ALIAS} "
+                "cache to a shared backend such as Memcached, Redis or the "
+                "database cache.",
+                id="tasks.E001",
+            )
+        )
+    if settings.SESSION_VIEWS_FLUSH_EVERY > 1:
+        errors.append(
+            Error(
+                "The session view counters need a cache shared by the worker "
+                "processes, each would count its own views.",
+                hint="Set SESSION_VIEWS_FLUSH_EVERY to 1, or the "
+                f"{settings.SESSION_CACHE_ALIAS} cache to a shared backend.",
+                id="tasks.E002",
+            )
+        )
+    return errors
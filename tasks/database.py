@@ -0,0 +1,23 @@
+import sqlite3
+from contextlib import closing
+
+from django.conf import settings
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    # Connected to connection_created. The pragmas last as long as the
+    # connection, which CONN_MAX_AGE keeps open across requests.
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def copy_sqlite_database(source, target):
+    # SQLite's online backup, a consistent copy even while the source is
+    # written to. Readers of the target see the old or the new copy, never a
+    # mix, and their open connections stay valid.
+    with closing(sqlite3.connect(source)) as source_connection:
+        with closing(sqlite3.connect(target)) as target_connection:
+            source_connection.backup(target_connection)
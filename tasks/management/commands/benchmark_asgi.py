@@ -0,0 +1,233 @@
+import asyncio
+import io
+import json
+import logging
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from tasks.models import Task
+from tasks.management.commands.benchmark_urls import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the throughput of concurrent clients reading tasks through "
+        "WSGI and ASGI, with the sync and with the async views"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=4)
+        parser.add_argument("--tasks", type=int, default=200, help="Tasks per user")
+        parser.add_argument("--clients", type=int, default=32)
+        parser.add_argument(
+            "--requests", type=int, default=20, help="Requests per client"
+        )
+        parser.add_argument(
+            "--db-latency-ms",
+            type=float,
+            default=5.0,
+            help="Added to every query, a database over the network rather "
+            "than a local SQLite file",
+        )
+        parser.add_argument("--output", help="Write the results there, as JSON")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        # A database file, which the threads of the clients all see
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # Nothing cached, every request queries
+            with override_settings(TASK_LIST_CACHE_TIMEOUT=0):
+                results = self.run(options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def run(self, options):
+        call_command(
+            "seed_tasks",
+            users=options["users"],
+            tasks=options["tasks"],
+            prefix="benchmark",
+            stdout=io.StringIO(),
+        )
+        cookies = []
+        for user in User.objects.filter(username__startswith="benchmark-"):
+            client = Client()
+            client.force_login(user)
+            task = Task.objects.pending().filter(user=user).first()
+            cookies.append((client.cookies, task.id))
+        connections.close_all()
+
+        # Pages as requested by every client in turn, on the sync and async views
+        pages = {
+            "tasks": ("/tasks/", "/async/tasks/"),
+            "detail": ("/detail-task/{}", "/async/detail-task/{}"),
+        }
+        servers = [
+            ("wsgi", self.run_wsgi, 0),
+            ("asgi sync views", self.run_asgi, 0),
+            ("asgi async views", self.run_asgi, 1),
+        ]
+
+        latency = options["db_latency_ms"] / 1000
+
+        def add_latency(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def on_connection_created(sender, connection, **kwargs):
+            # Sent again whenever a thread reconnects after closing. First in
+            # the list, as execute_wrapper() pops the last one on its way out
+            # and connections are made while the timing of a request is
+            # installed, so the latency is not in the db time of Server-Timing.
+            if add_latency not in connection.execute_wrappers:
+                connection.execute_wrappers.insert(0, add_latency)
+
+        # Before silencing the timing logger, django.setup() configures logging
+        self.application = get_asgi_application()
+        timing_logger = logging.getLogger("tasks.timing")
+        level = timing_logger.level
+        # Every request is over the latency budget here
+        timing_logger.setLevel(logging.ERROR)
+        connection_created.connect(on_connection_created)
+        try:
+            results = {}
+            for page, paths in pages.items():
+                for server, run, view in servers:
+                    name = f"{page} {server}"
+                    results[name] = self.measure(run, paths[view], cookies, options)
+                    self.stdout.write(
+                        "{:<28} {throughput:>8.1f} req/s  p50 {p50_ms:>8.2f} ms  "
+                        "p99 {p99_ms:>8.2f} ms".format(name, **results[name])
+                    )
+        finally:
+            connection_created.disconnect(on_connection_created)
+            timing_logger.setLevel(level)
+
+        options = {
+            name: options[name]
+            for name in ("users", "tasks", "clients", "requests", "db_latency_ms")
+        }
+        return {
+            "options": {**options, "async_read_threads": settings.ASYNC_READ_THREADS},
+            "scenarios": results,
+        }
+
+    def measure(self, run, path, cookies, options):
+        # Client number i reads the tasks of user i % users
+        requests = [
+            (path.format(task_id), session_cookies)
+            for session_cookies, task_id in cookies
+        ]
+        start = time.perf_counter()
+        timings, statuses = run(requests, options)
+        elapsed = time.perf_counter() - start
+        # The connections of the finished threads are not reused
+        connections.close_all()
+        if statuses != {200}:
+            raise CommandError(f"{path} answered {sorted(statuses)}")
+        return {
+            "path": path,
+            "throughput": round(len(timings) / elapsed, 1),
+            "p50_ms": round(statistics.median(timings), 3),
+            "p99_ms": round(percentile(timings, 99), 3),
+        }
+
+    def run_wsgi(self, requests, options):
+        # A thread per client, as many as a threaded WSGI server would need
+        def run_client(number):
+            path, session_cookies = requests[number % len(requests)]
+            client = Client()
+            client.cookies = session_cookies
+            timings, statuses = [], set()
+            try:
+                for _ in range(options["requests"]):
+                    start = time.perf_counter()
+                    response = client.get(path)
+                    timings.append((time.perf_counter() - start) * 1000)
+                    statuses.add(response.status_code)
+            finally:
+                connections.close_all()
+            return timings, statuses
+
+        with ThreadPoolExecutor(options["clients"]) as executor:
+            return self.merge(executor.map(run_client, range(options["clients"])))
+
+    def run_asgi(self, requests, options):
+        # Straight to the ASGI application, which runs each request in its
+        # own thread sensitive context as under an ASGI server
+        application = self.application
+
+        async def get(path, session_cookies):
+            cookie = "; ".join(
+                f"{name}={morsel.value}" for name, morsel in session_cookies.items()
+            )
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": path,
+                "raw_path": path.encode(),
+                "query_string": b"",
+                "root_path": "",
+                "headers": [(b"host", b"testserver"), (b"cookie", cookie.encode())],
+                "client": ("127.0.0.1", 0),
+                "server": ("testserver", 80),
+            }
+            body = [{"type": "http.request", "body": b"", "more_body": False}]
+            status = None
+
+            async def receive():
+                return body.pop() if body else {"type": "http.disconnect"}
+
+            async def send(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+
+            await application(scope, receive, send)
+            return status
+
+        async def run_client(number):
+            path, session_cookies = requests[number % len(requests)]
+            timings, statuses = [], set()
+            for _ in range(options["requests"]):
+                start = time.perf_counter()
+                statuses.add(await get(path, session_cookies))
+                timings.append((time.perf_counter() - start) * 1000)
+            return timings, statuses
+
+        async def run_clients():
+            return await asyncio.gather(
+                *(run_client(number) for number in range(options["clients"]))
+            )
+
+        return self.merge(asyncio.run(run_clients()))
+
+    def merge(self, runs):
+        timings, statuses = [], set()
+        for run_timings, run_statuses in runs:
+            timings += run_timings
+            statuses |= run_statuses
+        return timings, statuses
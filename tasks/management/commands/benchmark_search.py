@@ -0,0 +1,90 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from tasks.models import Task
+
+WORDS = (
+    "call email write review plan buy fix clean book pay send read update "
+    "prepare schedule meeting report invoice groceries dentist kitchen garden "
+    "presentation budget client project taxes car insurance birthday flight"
+).split()
+# Word frequencies follow Zipf's law, as they do in real text: "call" is the most
+# common word, "flight" is in about 1% of the tasks
+VOCABULARY = WORDS + [f"word{rank}" for rank in range(5000)]
+WEIGHTS = [1 / rank for rank in range(1, len(VOCABULARY) + 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the full-text task search with the old title__icontains "
+        "search on a throwaway user, rolled back afterwards"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tasks", type=int, default=100_000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--terms", nargs="+", default=["call", "flight", "zzz"])
+
+    def handle(self, *args, tasks, repeat, terms, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The full-text search index only exists on SQLite")
+
+        with transaction.atomic():
+            user = self.seed(tasks)
+            pending_tasks = Task.objects.filter(
+                user=user, completed=False, deleted=False
+            )
+            for term in terms:
+                old = pending_tasks.filter(title__icontains=term).order_by("priority")
+                old_with_description = pending_tasks.filter(
+                    Q(title__icontains=term) | Q(description__icontains=term)
+                ).order_by("priority")
+                new = pending_tasks.search(term, user).order_by(
+                    "search_rank", "priority"
+                )
+                for name, queryset in [
+                    ("title__icontains", old),
+                    ("title|description__icontains", old_with_description),
+                    ("fts5", new),
+                ]:
+                    self.report(term, name, queryset, repeat)
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        rng = random.Random(42)
+        user = User.objects.create(username=f"benchmark-{time.time_ns()}")
+        batch = []
+        for priority in range(1, count + 1):
+            batch.append(
+                Task(
+                    title=" ".join(rng.choices(VOCABULARY, WEIGHTS, k=4)).upper(),
+                    description=" ".join(rng.choices(VOCABULARY, WEIGHTS, k=20)),
+                    completed=rng.random() < 0.3,
+                    priority=priority,
+                    user=user,
+                )
+            )
+            if len(batch) == 5000:
+                Task.objects.bulk_create(batch)
+                batch = []
+        Task.objects.bulk_create(batch)
+        return user
+
+    def report(self, term, name, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            # The first page, as the offset paginator of the list views shows it
+            found = queryset.count()
+            list(queryset[:5])
+            timings.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(
+            f"{term!r:>12} {name:<30} median {statistics.median(timings):8.2f} ms"
+            f"  max {max(timings):8.2f} ms  ({found} found)"
+        )
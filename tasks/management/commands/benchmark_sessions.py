@@ -0,0 +1,105 @@
+import contextlib
+import io
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+from tasks.cache import get_cache
+from tasks.models import Task
+
+
+class Command(BaseCommand):
+    help = (
+        "Counts the database round trips per request of the session stores, "
+        "against saving the session on every view"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--output", help="Write the results there, as JSON")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def run(self, options):
+        call_command(
+            "seed_tasks", users=1, tasks=100, prefix="benchmark", stdout=io.StringIO()
+        )
+        user = User.objects.get(username="benchmark-0")
+        task = Task.objects.pending().filter(user=user).first()
+        paths = ["/tasks/", f"/detail-task/{task.id}", "/sessiontest"]
+
+        # The first one is how sessions were stored before
+        stores = [
+            ("db, saved every view", "db", 1),
+            ("db", "db", settings.SESSION_VIEWS_FLUSH_EVERY),
+            ("cached_db", "cached_db", settings.SESSION_VIEWS_FLUSH_EVERY),
+            ("signed_cookies", "signed_cookies", settings.SESSION_VIEWS_FLUSH_EVERY),
+        ]
+        results = {}
+        for name, store, flush_every in stores:
+            with override_settings(
+                SESSION_ENGINE=settings.SESSION_ENGINES[store],
+                SESSION_VIEWS_FLUSH_EVERY=flush_every,
+            ):
+                get_cache().clear()
+                caches[settings.SESSION_CACHE_ALIAS].clear()
+                client = Client()
+                client.force_login(user)
+                for path in paths:
+                    result = self.measure(client, path, options)
+                    results[f"{path} {name}"] = result
+                    self.stdout.write(
+                        "{:<50} {queries:>5.2f} queries  {session_queries:>5.2f} "
+                        "session queries  p50 {p50_ms:>6.2f} ms".format(
+                            f"{path} {name}", **result
+                        )
+                    )
+        return {"options": {"iterations": options["iterations"]}, "scenarios": results}
+
+    def measure(self, client, path, options):
+        # The first request fills the caches
+        with contextlib.redirect_stdout(io.StringIO()):
+            client.get(path)
+        timings, queries, session_queries = [], 0, 0
+        for _ in range(options["iterations"]):
+            with CaptureQueriesContext(connection) as captured:
+                # Keeps the prints of the session view out of the report
+                with contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    client.get(path)
+                    timings.append((time.perf_counter() - start) * 1000)
+            queries += len(captured)
+            session_queries += sum(
+                "django_session" in query["sql"] for query in captured
+            )
+        return {
+            "queries": queries / options["iterations"],
+            "session_queries": session_queries / options["iterations"],
+            "p50_ms": round(statistics.median(timings), 3),
+        }
@@ -0,0 +1,502 @@
+import contextlib
+import io
+import json
+import statistics
+import time
+from collections import namedtuple
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.urls import get_resolver
+
+from tasks.cache import bump_list_version, get_cache
+from tasks.models import Task, TaskCounter
+
+# request(iteration) returns the path and the data of one request, before(iteration)
+# runs untimed ahead of it
+Scenario = namedtuple(
+    "Scenario", "name route method request before client", defaults=(None, None)
+)
+
+
+def percentile(samples, percent):
+    samples = sorted(samples)
+    index = round(percent / 100 * (len(samples) - 1))
+    return samples[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the latency and the query count of every URL of urls.py, on "
+        "seeded tasks, and fails when they regress from a baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=5)
+        parser.add_argument("--tasks", type=int, default=1000, help="Tasks per user")
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument(
+            "--run-lengths",
+            type=int,
+            nargs="+",
+            default=[0, 10, 100, 1000],
+            help="Lengths of the runs of tasks a create has to cascade",
+        )
+        parser.add_argument("--output", default="benchmark_results.json")
+        parser.add_argument("--baseline", help="Results of an earlier run to compare")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="Allowed relative slowdown of the median latency",
+        )
+        parser.add_argument(
+            "--min-slowdown-ms",
+            type=float,
+            default=1.0,
+            help="Slowdowns below this are noise, whatever the tolerance",
+        )
+        parser.add_argument(
+            "--use-current-database",
+            action="store_true",
+            help="Seed and run against the configured database instead of a "
+            "throwaway test database. It is written to!",
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"]:
+            # Read first, the output may overwrite it
+            with open(options["baseline"]) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        try:
+            setup_test_environment()
+            test_environment = True
+        except RuntimeError:
+            # Already set up, when running in the test suite
+            test_environment = False
+        old_name = None
+        if not options["use_current_database"]:
+            old_name = connection.settings_dict["NAME"]
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = self.run(options)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            if test_environment:
+                teardown_test_environment()
+
+        with open(options["output"], "w") as output:
+            json.dump(results, output, indent=2)
+        self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            regressions = self.compare(baseline, results, options)
+            if regressions:
+                raise CommandError(
+                    "Regressions from the baseline:\n" + "\n".join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS("No regressions from the baseline"))
+
+    def run(self, options):
+        get_cache().clear()
+        call_command(
+            "seed_tasks",
+            users=options["users"],
+            tasks=options["tasks"],
+            prefix="benchmark",
+            stdout=io.StringIO(),
+        )
+        user = User.objects.get(username="benchmark-0")
+        scenarios = self.get_scenarios(user, options)
+
+        missing = {str(pattern.pattern) for pattern in get_resolver().url_patterns} - {
+            scenario.route for scenario in scenarios
+        }
+        if missing:
+            raise CommandError(f"No benchmark scenario for {sorted(missing)}")
+
+        results = {}
+        for scenario in scenarios:
+            results[scenario.name] = self.measure(scenario, options)
+            self.stdout.write(
+                "{:<40} p50 {p50_ms:>8.2f} ms  p99 {p99_ms:>8.2f} ms  "
+                "{queries:>4} queries".format(scenario.name, **results[scenario.name])
+            )
+        return {"options": self.describe(options), "scenarios": results}
+
+    def describe(self, options):
+        # Results are only comparable between runs on the same data
+        return {
+            name: options[name]
+            for name in ("users", "tasks", "iterations", "warmup", "run_lengths")
+        }
+
+    def measure(self, scenario, options):
+        timings = []
+        query_counts = []
+        statuses = set()
+        total = options["warmup"] + options["iterations"]
+        for iteration in range(total):
+            if scenario.before:
+                scenario.before(iteration)
+            path, data = scenario.request(iteration)
+            request = getattr(scenario.client, scenario.method.lower())
+            kwargs = {"data": data} if data is not None else {}
+            if isinstance(data, str):
+                kwargs["content_type"] = "application/json"
+
+            with CaptureQueriesContext(connection) as queries:
+                # Keeps the prints of the session view out of the report
+                with contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    response = request(path, **kwargs)
+                    if response.streaming:
+                        # The exports only run as they are read
+                        b"".join(response.streaming_content)
+                    elapsed = time.perf_counter() - start
+            if response.status_code >= 400:
+                raise CommandError(
+                    f"{scenario.name} answered {response.status_code} for {path}"
+                )
+            if iteration >= options["warmup"]:
+                timings.append(elapsed * 1000)
+                # The async views read in other threads, which only the
+                # timing of the request sees
+                timing = response.wsgi_request.timing
+                query_counts.append(max(len(queries), timing.queries))
+                statuses.add(response.status_code)
+
+        return {
+            "route": scenario.route,
+            "method": scenario.method,
+            "p50_ms": round(statistics.median(timings), 3),
+            "p99_ms": round(percentile(timings, 99), 3),
+            "mean_ms": round(statistics.mean(timings), 3),
+            "queries": max(query_counts),
+            "statuses": sorted(statuses),
+        }
+
+    def compare(self, baseline, results, options):
+        if baseline.get("options") != results["options"]:
+            raise CommandError(
+                f"The baseline ran with {baseline.get('options')}, "
+                f"not {results['options']}"
+            )
+        regressions = []
+        for name, result in results["scenarios"].items():
+            before = baseline["scenarios"].get(name)
+            if before is None:
+                continue
+            if result["queries"] > before["queries"]:
+                regressions.append(
+                    f"{name}: {result['queries']} queries, was {before['queries']}"
+                )
+            slowdown = result["p50_ms"] - before["p50_ms"]
+            allowed = before["p50_ms"] * options["tolerance"]
+            if slowdown > max(allowed, options["min_slowdown_ms"]):
+                regressions.append(
+                    f"{name}: p50 {result['p50_ms']:.2f} ms, "
+                    f"was {before['p50_ms']:.2f} ms"
+                )
+        return regressions
+
+    def get_scenarios(self, user, options):
+        client = Client()
+        client.force_login(user)
+        anonymous = Client()
+        admin = Client()
+        admin.force_login(
+            User.objects.create_superuser(
+                username="benchmark-admin", password="benchmark-password"
+            )
+        )
+
+        pending = Task.objects.pending().filter(user=user)
+        task_ids = list(pending.order_by("priority").values_list("id", flat=True))
+        total = options["warmup"] + options["iterations"]
+        if len(task_ids) < 4 * total:
+            raise CommandError(
+                f"Seed at least {4 * total} pending tasks per user for "
+                f"{options['iterations']} iterations"
+            )
+        # Tasks only read, and tasks used up by the completing and deleting
+        viewed = task_ids[:total]
+        completed = task_ids[total : 2 * total]
+        deleted = task_ids[2 * total : 3 * total]
+        async_completed = task_ids[3 * total : 4 * total]
+
+        def task_data(task_id):
+            task = Task.objects.get(id=task_id)
+            return {
+                "title": task.title,
+                "description": task.description,
+                "priority": task.priority,
+            }
+
+        def new_task(priority):
+            return {
+                "title": "benchmark task",
+                "description": "Created by the benchmark",
+                "priority": priority,
+            }
+
+        def uncached(iteration):
+            bump_list_version(user)
+
+        scenarios = [
+            Scenario("admin index", "admin/", "GET", lambda i: ("/admin/", None)),
+            Scenario("root redirect", "", "GET", lambda i: ("/", None)),
+            Scenario(
+                "sessiontest", "sessiontest", "GET", lambda i: ("/sessiontest", None)
+            ),
+            Scenario(
+                "signup form", "user/signup/", "GET", lambda i: ("/user/signup/", None)
+            ),
+            Scenario(
+                "login form", "user/login/", "GET", lambda i: ("/user/login/", None)
+            ),
+            Scenario(
+                "logout", "user/logout/", "GET", lambda i: ("/user/logout/", None)
+            ),
+        ]
+        for route in ("tasks/", "completed_tasks/", "all_tasks/"):
+            scenarios += [
+                Scenario(
+                    f"{route} cached", route, "GET", lambda i, r=route: (f"/{r}", None)
+                ),
+                Scenario(
+                    f"{route} uncached",
+                    route,
+                    "GET",
+                    lambda i, r=route: (f"/{r}", None),
+                    before=uncached,
+                ),
+                Scenario(
+                    f"{route} page 5",
+                    route,
+                    "GET",
+                    lambda i, r=route: (f"/{r}?page=5", None),
+                    before=uncached,
+                ),
+            ]
+        scenarios += [
+            Scenario(
+                "tasks/ search",
+                "tasks/",
+                "GET",
+                lambda i: ("/tasks/?search=call", None),
+                before=uncached,
+            ),
+            Scenario(
+                "detail-task/<pk>",
+                "detail-task/<pk>",
+                "GET",
+                lambda i: (f"/detail-task/{viewed[i]}", None),
+            ),
+            Scenario(
+                "update-task/<pk> form",
+                "update-task/<pk>",
+                "GET",
+                lambda i: (f"/update-task/{viewed[i]}", None),
+            ),
+            Scenario(
+                "update-task/<pk>",
+                "update-task/<pk>",
+                "POST",
+                lambda i: (f"/update-task/{viewed[i]}", task_data(viewed[i])),
+            ),
+            Scenario(
+                "complete_task/<pk>/ form",
+                "complete_task/<pk>/",
+                "GET",
+                lambda i: (f"/complete_task/{viewed[i]}/", None),
+            ),
+            Scenario(
+                "complete_task/<pk>/",
+                "complete_task/<pk>/",
+                "POST",
+                lambda i: (f"/complete_task/{completed[i]}/", {}),
+            ),
+            Scenario(
+                "delete-task/<pk>/ form",
+                "delete-task/<pk>/",
+                "GET",
+                lambda i: (f"/delete-task/{viewed[i]}/", None),
+            ),
+            Scenario(
+                "delete-task/<pk>/",
+                "delete-task/<pk>/",
+                "POST",
+                lambda i: (f"/delete-task/{deleted[i]}/", {}),
+            ),
+            Scenario(
+                "create-task/ form",
+                "create-task/",
+                "GET",
+                lambda i: ("/create-task/", None),
+            ),
+            Scenario(
+                "create-task/ no cascade",
+                "create-task/",
+                "POST",
+                lambda i: ("/create-task/", new_task(10**6 + i)),
+            ),
+            Scenario(
+                "api/tasks/",
+                "api/tasks/",
+                "GET",
+                lambda i: ("/api/tasks/?status=all&limit=100", None),
+            ),
+            Scenario(
+                "api/tasks/ with description",
+                "api/tasks/",
+                "GET",
+                lambda i: (
+                    "/api/tasks/?status=all&limit=100&fields=id,title,description",
+                    None,
+                ),
+            ),
+            Scenario(
+                "api/tasks/batch/",
+                "api/tasks/batch/",
+                "POST",
+                lambda i: (
+                    "/api/tasks/batch/",
+                    json.dumps(
+                        {
+                            "operations": [
+                                {"op": "create", **new_task(2 * 10**6 + i)},
+                                {
+                                    "op": "reprioritize",
+                                    "id": viewed[i],
+                                    "priority": 3 * 10**6 + i,
+                                },
+                            ]
+                        }
+                    ),
+                ),
+            ),
+            Scenario(
+                "export/tasks.csv",
+                "export/tasks.csv",
+                "GET",
+                lambda i: ("/export/tasks.csv?status=all", None),
+            ),
+            Scenario(
+                "export/tasks.ndjson",
+                "export/tasks.ndjson",
+                "GET",
+                lambda i: ("/export/tasks.ndjson?status=all", None),
+            ),
+            Scenario(
+                "stats/",
+                "stats/",
+                "GET",
+                lambda i: ("/stats/", None),
+            ),
+            Scenario(
+                "api/stats/",
+                "api/stats/",
+                "GET",
+                lambda i: ("/api/stats/?days=30", None),
+            ),
+            Scenario(
+                "async/tasks/ cached",
+                "async/tasks/",
+                "GET",
+                lambda i: ("/async/tasks/", None),
+            ),
+            Scenario(
+                "async/tasks/ uncached",
+                "async/tasks/",
+                "GET",
+                lambda i: ("/async/tasks/", None),
+                before=uncached,
+            ),
+            Scenario(
+                "async/detail-task/<pk>",
+                "async/detail-task/<pk>",
+                "GET",
+                lambda i: (f"/async/detail-task/{viewed[i]}", None),
+            ),
+            Scenario(
+                "async/complete_task/<pk>/ form",
+                "async/complete_task/<pk>/",
+                "GET",
+                lambda i: (f"/async/complete_task/{viewed[i]}/", None),
+            ),
+            Scenario(
+                "async/complete_task/<pk>/",
+                "async/complete_task/<pk>/",
+                "POST",
+                lambda i: (f"/async/complete_task/{async_completed[i]}/", {}),
+            ),
+            Scenario(
+                "static/<path:path>",
+                "static/<path:path>",
+                "GET",
+                lambda i: ("/static/tasks/app.css", None),
+                client=anonymous,
+            ),
+        ]
+        for run_length in options["run_lengths"]:
+            run_client, before = self.make_run(run_length)
+            scenarios.append(
+                Scenario(
+                    f"create-task/ cascade over {run_length}",
+                    "create-task/",
+                    "POST",
+                    lambda i: ("/create-task/", new_task(1)),
+                    before=before,
+                    client=run_client,
+                )
+            )
+
+        return [
+            scenario._replace(
+                client=scenario.client
+                or {
+                    "admin/": admin,
+                    "user/signup/": anonymous,
+                    "user/login/": anonymous,
+                    "user/logout/": anonymous,
+                }.get(scenario.route, client)
+            )
+            for scenario in scenarios
+        ]
+
+    def make_run(self, run_length):
+        # Every create is timed against exactly run_length tasks at priorities 1,
+        # 2, ... that it has to push down, on a user of its own
+        user = User.objects.create_user(
+            username=f"benchmark-run-{run_length}", password="benchmark-password"
+        )
+        client = Client()
+        client.force_login(user)
+
+        def before(iteration):
+            Task.objects.filter(user=user).delete()
+            Task.objects.bulk_create(
+                Task(
+                    title=f"RUN TASK {priority}",
+                    description="Pushed down by the benchmark",
+                    priority=priority,
+                    user=user,
+                )
+                for priority in range(1, run_length + 1)
+            )
+            TaskCounter.objects.rebuild(user)
+
+        return client, before
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.staticbuild import OUTPUT_DIR, build, content_files, unknown_classes
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the stylesheet of the Tailwind classes used in the templates "
+        "and the icon sprite into tasks/static/tasks"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Fail when the built files are out of date, without writing them",
+        )
+
+    def handle(self, *args, **options):
+        for class_name in unknown_classes(content_files()):
+            self.stderr.write(f"No rule for the class {class_name}")
+
+        stale = []
+        for name, content in build().items():
+            path = OUTPUT_DIR / name
+            if path.exists() and path.read_text() == content:
+                continue
+            stale.append(name)
+            if not options["check"]:
+                OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+                path.write_text(content)
+                self.stdout.write(f"Wrote {path} ({len(content)} bytes)")
+
+        if options["check"] and stale:
+            raise CommandError(
+                f"Out of date: {', '.join(stale)}, run manage.py build_static"
+            )
@@ -0,0 +1,52 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q
+
+from tasks.cache import invalidate_lists
+from tasks.models import Task
+from tasks.views import compact_priorities
+
+
+class Command(BaseCommand):
+    help = "Renumbers the pending tasks of every user 1..N, closing the gaps"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        users = User.objects.order_by("id").values_list("id", flat=True)
+        compacted_users = 0
+        moved_tasks = 0
+        last_id = 0
+        while True:
+            batch = list(users.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]
+
+            # Only the users whose highest priority is above their task count,
+            # or who use priority 0, have gaps
+            with_gaps = (
+                Task.objects.pending()
+                .filter(user__in=batch)
+                .values("user")
+                .annotate(
+                    count=Count("id"), highest=Max("priority"), lowest=Min("priority")
+                )
+                .filter(Q(highest__gt=F("count")) | Q(lowest__lt=1))
+                .values_list("user", flat=True)
+            )
+            for user_id in with_gaps:
+                # A short transaction per user, which holds the user's lock
+                user = User(pk=user_id)
+                with transaction.atomic():
+                    moved_tasks += compact_priorities(user)
+                    invalidate_lists(user)
+                compacted_users += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Renumbered {moved_tasks} tasks of {compacted_users} users"
+            )
+        )
@@ -0,0 +1,184 @@
+import csv
+import json
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tasks.cache import invalidate_lists
+from tasks.models import Task, TaskCounter, TaskDailyStats
+from tasks.views import PendingPriorities, TaskCreateForm, move_pending_tasks
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports tasks from a JSONL or CSV file, with the validation of the task "
+        "form and the priority cascading of the task views"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["jsonl", "csv"])
+        parser.add_argument(
+            "--user", help="Username owning the rows that have no user column"
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10_000,
+            help="Rows written per transaction",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Skips the rows committed by an earlier run of the same file",
+        )
+        parser.add_argument("--max-errors", type=int, default=20)
+
+    def handle(self, *args, path, **options):
+        file_format = options["format"] or os.path.splitext(path)[1].lstrip(".")
+        if file_format not in ("jsonl", "csv"):
+            raise CommandError("Pass --format jsonl or csv")
+
+        # The number of rows of the file already committed, written after every
+        # chunk, so that a failed import can carry on where it stopped
+        self.progress_path = f"{path}.progress"
+        skip = 0
+        if os.path.exists(self.progress_path):
+            with open(self.progress_path) as progress:
+                committed = json.load(progress)["rows"]
+            if not options["resume"]:
+                raise CommandError(
+                    f"An earlier import committed the first {committed} rows, pass "
+                    f"--resume or delete {self.progress_path}"
+                )
+            skip = committed
+            self.stdout.write(f"Resuming after row {skip}")
+
+        self.users = {}
+        self.default_user = options["user"]
+        self.options = options
+        self.counts = {"imported": 0, "invalid": 0}
+        self.start = time.perf_counter()
+
+        processed = skip
+        with open(path, newline="") as rows_file:
+            rows = self.read(rows_file, file_format)
+            chunk = []
+            for line, row in rows:
+                if line <= skip:
+                    continue
+                chunk.append((line, row))
+                if len(chunk) == options["chunk_size"]:
+                    processed = self.import_chunk(chunk)
+                    chunk = []
+            if chunk:
+                processed = self.import_chunk(chunk)
+
+        if os.path.exists(self.progress_path):
+            os.remove(self.progress_path)
+        elapsed = time.perf_counter() - self.start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {self.counts['imported']} tasks from {processed - skip} "
+                f"rows in {elapsed:.1f}s ({self.throughput():.0f} rows/s), "
+                f"{self.counts['invalid']} invalid rows skipped"
+            )
+        )
+
+    def read(self, rows_file, file_format):
+        # Yields (row number, row), counting from 1 and without the CSV header
+        if file_format == "csv":
+            yield from enumerate(csv.DictReader(rows_file), start=1)
+            return
+        for line, text in enumerate(rows_file, start=1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError:
+                row = None
+            yield line, row if isinstance(row, dict) else {"__invalid__": text}
+
+    def import_chunk(self, chunk):
+        tasks_by_user = {}
+        for line, row in chunk:
+            task = self.validate(line, row)
+            if task is not None:
+                tasks_by_user.setdefault(task.user, []).append(task)
+
+        with transaction.atomic():
+            # Locked in the same order by every import, so two cannot deadlock
+            for user in sorted(tasks_by_user, key=lambda user: user.pk):
+                self.save_tasks(user, tasks_by_user[user])
+            last_line = chunk[-1][0]
+            transaction.on_commit(lambda: self.save_progress(last_line))
+
+        self.stdout.write(
+            f"{last_line} rows read, {self.counts['imported']} tasks imported "
+            f"({self.throughput():.0f} rows/s)"
+        )
+        return last_line
+
+    def validate(self, line, row):
+        if "__invalid__" in row:
+            return self.invalid(line, {"row": ["Not a JSON object"]})
+
+        form = TaskCreateForm(data=row)
+        if not form.is_valid():
+            return self.invalid(line, form.errors)
+        username = row.get("user") or self.default_user
+        if username not in self.users:
+            self.users[username] = User.objects.filter(username=username).first()
+        if self.users[username] is None:
+            return self.invalid(line, {"user": [f"No user {username!r}"]})
+
+        task = form.save(commit=False)
+        task.user = self.users[username]
+        return task
+
+    def invalid(self, line, errors):
+        self.counts["invalid"] += 1
+        if self.counts["invalid"] <= self.options["max_errors"]:
+            messages = "; ".join(
+                f"{field}: {' '.join(field_errors)}"
+                for field, field_errors in errors.items()
+            )
+            self.stderr.write(f"Row {line} skipped, {messages}")
+        return None
+
+    def save_tasks(self, user, tasks):
+        # The cascading of handlePriorityCascading, resolved in memory for the
+        # whole chunk like the batch endpoint does
+        TaskCounter.objects.lock(user)
+        pending = PendingPriorities(
+            Task.objects.pending().filter(user=user).values_list("id", "priority")
+        )
+        original_priorities = dict(pending.by_key)
+        for index, task in enumerate(tasks):
+            pending.place(None if task.completed else ("new", index), task.priority)
+        for index, task in enumerate(tasks):
+            task.priority = pending.by_key.get(("new", index), task.priority)
+
+        move_pending_tasks(original_priorities, pending.by_key)
+        Task.objects.bulk_create(tasks, batch_size=self.options["batch_size"])
+
+        completed = sum(task.completed for task in tasks)
+        TaskCounter.objects.add(
+            user, pending=len(tasks) - completed, completed=completed
+        )
+        TaskDailyStats.objects.add(user, created=len(tasks), completed=completed)
+        invalidate_lists(user)
+        self.counts["imported"] += len(tasks)
+
+    def save_progress(self, line):
+        with open(self.progress_path, "w") as progress:
+            json.dump({"rows": line}, progress)
+
+    def throughput(self):
+        return (self.counts["imported"] + self.counts["invalid"]) / max(
+            time.perf_counter() - self.start, 1e-9
+        )
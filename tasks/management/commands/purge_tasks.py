@@ -0,0 +1,90 @@
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from tasks.cache import invalidate_lists
+from tasks.models import Task, TaskArchive, TaskCounter
+
+ARCHIVED_FIELDS = (
+    "title",
+    "description",
+    "completed",
+    "created_date",
+    "created_at",
+    "deleted",
+    "user_id",
+    "priority",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves the completed and deleted tasks unchanged for --days into the "
+        "archive table, a batch per transaction"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.0,
+            help="Seconds to wait between batches, leaving the database to the views",
+        )
+
+    def handle(self, *args, days, batch_size, pause, **options):
+        # created_date is the time of the last change, so of the completion or
+        # the deletion of these tasks
+        cutoff = timezone.now() - timedelta(days=days)
+        finished_tasks = Task.objects.filter(
+            Q(completed=True) | Q(deleted=True), created_date__lt=cutoff
+        ).order_by("id")
+
+        archived = 0
+        last_id = 0
+        while True:
+            # Walking the primary key reads the table once over all the batches
+            tasks = finished_tasks.filter(id__gt=last_id)
+            batch = list(tasks.values("id", *ARCHIVED_FIELDS)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]["id"]
+            self.archive(batch)
+            archived += len(batch)
+            self.stdout.write(f"{archived} tasks archived")
+            if pause:
+                time.sleep(pause)
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} tasks"))
+
+    def archive(self, batch):
+        completed = Counter()
+        deleted = Counter()
+        for task in batch:
+            if task["deleted"]:
+                deleted[task["user_id"]] += 1
+            else:
+                completed[task["user_id"]] += 1
+
+        with transaction.atomic():
+            TaskArchive.objects.bulk_create(
+                TaskArchive(
+                    task_id=task["id"],
+                    **{field: task[field] for field in ARCHIVED_FIELDS},
+                )
+                for task in batch
+            )
+            Task.objects.filter(id__in=[task["id"] for task in batch]).delete()
+            for user_id in (completed | deleted).keys() - {None}:
+                user = User(pk=user_id)
+                TaskCounter.objects.add(
+                    user, completed=-completed[user_id], deleted=-deleted[user_id]
+                )
+                invalidate_lists(user)
@@ -0,0 +1,63 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tasks.models import TaskCounter
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the per-user task counters from the tasks table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only compare the stored counters with the tasks, without writing",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, verify=False, batch_size=1000, **options):
+        user_ids = list(User.objects.order_by("id").values_list("id", flat=True))
+        mismatches = 0
+
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start : start + batch_size]
+            if not verify:
+                # Counted and replaced under the locks of the users, no view
+                # changes their counters in between
+                with transaction.atomic():
+                    for user_id in batch:
+                        TaskCounter.objects.lock(User(pk=user_id))
+                    TaskCounter.objects.rebuild_many(batch)
+                continue
+
+            counters = {user_id: TaskCounter(user_id=user_id) for user_id in batch}
+            for row in TaskCounter.objects.count_tasks(batch):
+                counter = counters[row.pop("user")]
+                for field, value in row.items():
+                    setattr(counter, field, value)
+
+            stored = TaskCounter.objects.in_bulk(batch)
+            for user_id, counter in counters.items():
+                if user_id not in stored:
+                    continue
+                current = stored[user_id]
+                expected = (counter.pending, counter.completed, counter.deleted)
+                found = (current.pending, current.completed, current.deleted)
+                if expected != found:
+                    mismatches += 1
+                    self.stderr.write(
+                        f"User {user_id}: expected (pending, completed, deleted) "
+                        f"{expected}, found {found}"
+                    )
+
+        if verify:
+            if mismatches:
+                raise CommandError(f"{mismatches} task counters are out of date")
+            self.stdout.write(self.style.SUCCESS("All task counters are up to date"))
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Rebuilt the task counters of {len(user_ids)} users"
+                )
+            )
@@ -0,0 +1,89 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+from tasks.models import (
+    Task,
+    TaskArchive,
+    TaskCounter,
+    TaskDailyStats,
+    time_to_complete,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the daily task stats of every user from the tasks and the "
+        "archived tasks, with grouped counts over a batch of users at a time"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        users = User.objects.order_by("id").values_list("id", flat=True)
+        rows = 0
+        last_id = 0
+        while True:
+            batch = list(users.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]
+
+            # Counted and replaced under the locks of the users, a transaction
+            # per batch. No task view adds to their stats in between.
+            with transaction.atomic():
+                for user_id in batch:
+                    TaskCounter.objects.lock(User(pk=user_id))
+
+                stats = {}
+                for model in (Task, TaskArchive):
+                    tasks = model.objects.filter(user__in=batch)
+                    created = (
+                        tasks.annotate(date=TruncDate("created_at"))
+                        .values("user", "date")
+                        .annotate(count=Count("id"))
+                        .order_by()
+                    )
+                    for row in created:
+                        self.get_stats(stats, row).created += row["count"]
+
+                    # created_date is the time of the last change, of the
+                    # completion for completed tasks
+                    completed = (
+                        tasks.filter(completed=True)
+                        .annotate(date=TruncDate("created_date"))
+                        .values("user", "date")
+                        .annotate(
+                            count=Count("id"),
+                            time=Sum(time_to_complete(F("created_date"))),
+                        )
+                        .order_by()
+                    )
+                    for row in completed:
+                        day = self.get_stats(stats, row)
+                        day.completed += row["count"]
+                        if row["time"]:
+                            day.completion_seconds += max(
+                                0, int(row["time"].total_seconds())
+                            )
+
+                TaskDailyStats.objects.filter(user__in=batch).delete()
+                TaskDailyStats.objects.bulk_create(stats.values())
+            rows += len(stats)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} daily task stats"))
+
+    def get_stats(self, stats, row):
+        key = (row["user"], row["date"])
+        if key not in stats:
+            stats[key] = TaskDailyStats(
+                user_id=row["user"],
+                date=row["date"],
+                created=0,
+                completed=0,
+                completion_seconds=0,
+            )
+        return stats[key]
@@ -0,0 +1,82 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tasks.management.commands.benchmark_search import VOCABULARY, WEIGHTS
+from tasks.models import Task, TaskCounter
+
+
+class Command(BaseCommand):
+    help = "Seeds users with synthetic tasks, for benchmarks and load tests"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--tasks", type=int, default=1000, help="Tasks per user")
+        parser.add_argument("--completed-ratio", type=float, default=0.3)
+        parser.add_argument("--deleted-ratio", type=float, default=0.05)
+        parser.add_argument(
+            "--run-probability",
+            type=float,
+            default=0.85,
+            help="Chance that a pending task takes the priority right after the "
+            "previous one, instead of leaving a gap",
+        )
+        parser.add_argument("--prefix", default="seed", help="Prefix of the usernames")
+        parser.add_argument("--password", default="benchmark-password")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        # Hashing once, the same password for every seeded user
+        password = make_password(options["password"])
+        users = []
+
+        for number in range(options["users"]):
+            with transaction.atomic():
+                user = User.objects.create(
+                    username=f"{options['prefix']}-{number}", password=password
+                )
+                self.seed_user(user, rng, options)
+                TaskCounter.objects.rebuild(user)
+            users.append(user)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {len(users)} users with {options['tasks']} tasks each"
+            )
+        )
+        return None
+
+    def seed_user(self, user, rng, options):
+        batch = []
+        next_priority = 1
+        for _ in range(options["tasks"]):
+            completed = rng.random() < options["completed_ratio"]
+            deleted = rng.random() < options["deleted_ratio"]
+            if completed or deleted:
+                # Finished and deleted tasks keep the priority they had
+                priority = rng.randint(1, max(next_priority, 1))
+            else:
+                # Pending priorities come in runs, split by the occasional gap
+                if rng.random() > options["run_probability"]:
+                    next_priority += int(rng.expovariate(1 / 3)) + 1
+                priority = next_priority
+                next_priority += 1
+            batch.append(
+                Task(
+                    title=" ".join(rng.choices(VOCABULARY, WEIGHTS, k=4)).upper(),
+                    description=" ".join(rng.choices(VOCABULARY, WEIGHTS, k=20)),
+                    completed=completed,
+                    deleted=deleted,
+                    priority=priority,
+                    user=user,
+                )
+            )
+            if len(batch) == options["batch_size"]:
+                Task.objects.bulk_create(batch)
+                batch = []
+        Task.objects.bulk_create(batch)
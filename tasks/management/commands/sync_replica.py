@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from tasks.database import copy_sqlite_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies the SQLite database into the file of a replica alias, which "
+        "stands in for a read replica locally"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="replica", help="The replica alias")
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Copy again every this many seconds, until interrupted, the lag "
+            "of the replica. Keep it below DATABASE_REPLICA_LAG_SECONDS.",
+        )
+
+    def handle(self, *args, database="replica", interval=0, **options):
+        if database not in connections:
+            raise CommandError(f"No database alias {database}")
+        primary = connections[DEFAULT_DB_ALIAS].settings_dict
+        replica = connections[database].settings_dict
+        if (
+            primary["ENGINE"] != "django.db.backends.sqlite3"
+            or replica["ENGINE"] != "django.db.backends.sqlite3"
+        ):
+            raise CommandError(
+                "Only SQLite databases are copied, other replicas are kept up to "
+                "date by their database server"
+            )
+        if str(primary["NAME"]) == str(replica["NAME"]):
+            raise CommandError(f"{database} is the primary database file itself")
+
+        while True:
+            start = time.perf_counter()
+            copy_sqlite_database(str(primary["NAME"]), str(replica["NAME"]))
+            self.stdout.write(
+                f"Copied {primary['NAME']} to {replica['NAME']} in "
+                f"{(time.perf_counter() - start) * 1000:.1f} ms"
+            )
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from tasks.cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = "Shows the hit and miss counters of the task list page cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Reset the counters afterwards"
+        )
+
+    def handle(self, *args, reset=False, **options):
+        stats = get_stats()
+        lookups = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / lookups if lookups else 0
+        self.stdout.write(
+            f"hits: {stats['hits']}  misses: {stats['misses']}  hit ratio: {ratio:.1%}"
+        )
+        if reset:
+            reset_stats()
@@ -0,0 +1,221 @@
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from tasks.routers import (
+    RoutingState,
+    is_pinned_to_primary,
+    pin_to_primary,
+    request_routing,
+)
+
+logger = logging.getLogger("tasks.timing")
+
+# The SQL django hands to the database has %s placeholders for the values
+# already, only the length of IN lists and the odd inlined number vary
+PLACEHOLDER_LIST = re.compile(r"%s(?:\s*,\s*%s)+")
+NUMBER = re.compile(r"\b\d+\b")
+WHITESPACE = re.compile(r"\s+")
+
+
+def sql_shape(sql):
+    sql = PLACEHOLDER_LIST.sub("%s, ...", sql)
+    sql = NUMBER.sub("N", sql)
+    return WHITESPACE.sub(" ", sql).strip()
+
+
+class RequestTiming:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_start = None
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper() on every database
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            self.shapes[sql_shape(sql)] += 1
+
+    def start_template(self):
+        self.template_start = time.perf_counter()
+
+    def end_template(self, response):
+        self.template_time += time.perf_counter() - self.template_start
+
+    def repeated_queries(self):
+        return [
+            {"sql": shape, "count": count}
+            for shape, count in self.shapes.most_common(
+                settings.REQUEST_TIMING_TOP_QUERIES
+            )
+            if count > 1
+        ]
+
+
+class RequestTimingMiddleware:
+    # Times the queries, the template rendering and the whole of each request.
+    # The times go into a log line on the "tasks.timing" logger, a warning when
+    # the request is over the budgets of the settings, and with
+    # REQUEST_TIMING_HEADER into a Server-Timing header, which the browser
+    # devtools show with the request.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timing = RequestTiming()
+        request.timing = timing
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            self.install(stack, timing)
+            response = self.get_response(request)
+        return self.finish(request, response, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        # Under ASGI the sync views and the rendering run in the request's
+        # thread of sync_to_async, so the wrappers are installed there. The
+        # async views install request.timing in their executors themselves.
+        timing = RequestTiming()
+        request.timing = timing
+        start = time.perf_counter()
+        stack = ExitStack()
+        await sync_to_async(self.install, thread_sensitive=True)(stack, timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close, thread_sensitive=True)()
+        return self.finish(request, response, time.perf_counter() - start)
+
+    def install(self, stack, timing):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timing))
+
+    def finish(self, request, response, total_time):
+        timing = request.timing
+        if settings.REQUEST_TIMING_HEADER:
+            response["Server-Timing"] = ", ".join(
+                [
+                    f'db;dur={timing.db_time * 1000:.2f};desc="{timing.queries} queries"',
+                    f"tpl;dur={timing.template_time * 1000:.2f}",
+                    f"total;dur={total_time * 1000:.2f}",
+                ]
+            )
+
+        over_budget = []
+        if timing.queries > settings.REQUEST_TIMING_QUERY_BUDGET:
+            over_budget.append("queries")
+        if total_time * 1000 > settings.REQUEST_TIMING_LATENCY_BUDGET_MS:
+            over_budget.append("latency")
+        line = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": timing.queries,
+            "db_ms": round(timing.db_time * 1000, 2),
+            "template_ms": round(timing.template_time * 1000, 2),
+            "total_ms": round(total_time * 1000, 2),
+            "over_budget": over_budget,
+            "repeated_queries": timing.repeated_queries(),
+        }
+        logger.log(
+            logging.WARNING if over_budget else logging.INFO,
+            json.dumps(line),
+            extra={"timing": line},
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        # Called right before the response is rendered, which includes the
+        # queries of the querysets the template evaluates
+        request.timing.start_template()
+        response.add_post_render_callback(request.timing.end_template)
+        return response
+
+
+class ReadReplicaMiddleware:
+    # Lets tasks.routers.ReadReplicaRouter send the reads of GET requests to a
+    # replica. A request that writes keeps the reads of the user's next
+    # requests on the primary, from any device, until the replicas have caught
+    # up with the write. Anonymous clients (signing up, logging in) are kept
+    # there by a cookie. Comes after AuthenticationMiddleware, the session and
+    # the user are read from the primary.
+    sync_capable = True
+    async_capable = True
+    safe_methods = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = request_routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_routing.reset(token)
+        return self.finish(request, state, response)
+
+    async def __acall__(self, request):
+        # The user may have to be read from the database
+        state = await sync_to_async(self.start, thread_sensitive=True)(request)
+        token = request_routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_routing.reset(token)
+        if state.wrote:
+            return await sync_to_async(self.finish, thread_sensitive=True)(
+                request, state, response
+            )
+        return self.finish(request, state, response)
+
+    def start(self, request):
+        replica = None
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method in self.safe_methods
+            and settings.DATABASE_PRIMARY_COOKIE not in request.COOKIES
+            and not (
+                request.user.is_authenticated and is_pinned_to_primary(request.user)
+            )
+        ):
+            # The same replica for all the reads of the request
+            replica = random.choice(settings.DATABASE_REPLICAS)
+        return RoutingState(replica)
+
+    def finish(self, request, state, response):
+        if state.wrote and settings.DATABASE_REPLICAS:
+            if request.user.is_authenticated:
+                pin_to_primary(request.user)
+            response.set_cookie(
+                settings.DATABASE_PRIMARY_COOKIE,
+                "1",
+                max_age=settings.DATABASE_REPLICA_LAG_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,41 @@
+# Generated by Django 4.0.1 on 2026-10-16 22:52
+
+from django.db import migrations, models
+
+
+def cascade_duplicate_priorities(apps, schema_editor):
+    # Pending tasks created before the constraint may share a priority, bump them
+    # the same way the cascading in the views would have
+    Task = apps.get_model('tasks', 'Task')
+    pending_tasks = Task.objects.filter(completed=False, deleted=False).order_by('user_id', 'priority', 'id')
+    tasks_to_update = []
+    previous_user_id, previous_priority = None, None
+    for task in pending_tasks.only('id', 'user_id', 'priority').iterator():
+        if task.user_id == previous_user_id and task.priority <= previous_priority:
+            task.priority = previous_priority + 1
+            tasks_to_update.append(task)
+        previous_user_id, previous_priority = task.user_id, task.priority
+    Task.objects.bulk_update(tasks_to_update, ['priority'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0005_task_priority'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('completed', True)), fields=['user', 'priority'], name='completed_task_priority_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['user', 'completed', 'priority'], name='live_task_priority_idx'),
+        ),
+        migrations.RunPython(cascade_duplicate_priorities, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(condition=models.Q(('completed', False), ('deleted', False)), fields=('user', 'priority'), name='unique_pending_task_priority'),
+        ),
+    ]
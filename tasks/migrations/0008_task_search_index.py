@@ -0,0 +1,36 @@
+from django.db import migrations
+
+from tasks.search import (
+    CREATE_FTS_TABLE,
+    FTS_TABLE,
+    REBUILD_FTS_TABLE,
+    create_fts_triggers,
+)
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_FTS_TABLE)
+    create_fts_triggers(apps, schema_editor)
+    # Indexing the tasks which already exist
+    schema_editor.execute(REBUILD_FTS_TABLE)
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for suffix in ('insert', 'delete', 'update'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0007_taskcounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
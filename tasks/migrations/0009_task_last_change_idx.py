@@ -0,0 +1,17 @@
+# Generated by Django 4.0.1 on 2026-10-16 23:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_task_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'created_date'], name='task_last_change_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.0.1 on 2026-10-16 23:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0009_task_last_change_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.BigIntegerField(unique=True)),
+                ('title', models.CharField(max_length=100)),
+                ('description', models.TextField()),
+                ('completed', models.BooleanField()),
+                ('created_date', models.DateTimeField()),
+                ('deleted', models.BooleanField()),
+                ('priority', models.PositiveIntegerField()),
+                ('archived_date', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.0.1 on 2026-10-17 00:12
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+import django.db.models.deletion
+import django.utils.timezone
+
+from tasks.search import create_fts_triggers
+
+
+def copy_created_date(apps, schema_editor):
+    # The creation time of the existing tasks is lost, their last change is the
+    # closest there is
+    for model_name in ('Task', 'TaskArchive'):
+        model = apps.get_model('tasks', model_name)
+        model.objects.update(created_at=F('created_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tasks', '0010_taskarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='created_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='taskarchive',
+            name='created_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(copy_created_date, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='task',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='taskarchive',
+            name='created_at',
+            field=models.DateTimeField(),
+        ),
+        migrations.CreateModel(
+            name='TaskDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('created', models.PositiveIntegerField(default=0)),
+                ('completed', models.PositiveIntegerField(default=0)),
+                ('completion_seconds', models.PositiveBigIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='taskdailystats',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='unique_task_daily_stats'),
+        ),
+        # SQLite remade tasks_task without the triggers of the search index
+        migrations.RunPython(create_fts_triggers, migrations.RunPython.noop),
+    ]
@@ -1,16 +1,236 @@
-from django.db import models
+from django.db import connections, models
+from django.utils import timezone
 
 from django.contrib.auth.models import User
 
+from tasks.search import FTS_TABLE, SEARCH_JOIN, SEARCH_RANK, build_match_query
+
+
+class TaskQuerySet(models.QuerySet):
+    def search(self, search_term, user=None):
+        # Annotates search_rank, lower is more relevant
+        if connections[self.db].vendor != "sqlite":
+            return self.filter(
+                models.Q(title__icontains=search_term)
+                | models.Q(description__icontains=search_term)
+            ).annotate(search_rank=models.Value(0))
+
+        match_query = build_match_query(search_term, user and user.pk)
+        if not match_query:
+            return self.annotate(search_rank=models.Value(0)).none()
+        return self.extra(
+            select={"search_rank": SEARCH_RANK},
+            tables=[FTS_TABLE],
+            where=[SEARCH_JOIN, f"{FTS_TABLE} MATCH %s"],
+            params=[match_query],
+        )
+
+    def pending(self):
+        # The predicates of the unique priority constraint, so its index is used
+        return self.filter(completed=False, deleted=False)
+
+
+class LiveTaskManager(models.Manager.from_queryset(TaskQuerySet)):
+    # Tasks that are not soft deleted. Its filter matches the condition of
+    # live_task_priority_idx.
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted=False)
+
 
 class Task(models.Model):
     title = models.CharField(max_length=100)
     description = models.TextField()
     completed = models.BooleanField(default=False)
     created_date = models.DateTimeField(auto_now=True)
+    # created_date is really the time of the last change, this one never changes
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     deleted = models.BooleanField(default=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     priority = models.PositiveIntegerField(default=1)
 
+    objects = TaskQuerySet.as_manager()
+    live = LiveTaskManager()
+
+    class Meta:
+        constraints = [
+            # No two pending tasks of a user can share a priority. Its partial
+            # index also serves the pending tasks list ordered by priority.
+            models.UniqueConstraint(
+                fields=["user", "priority"],
+                condition=models.Q(completed=False, deleted=False),
+                name="unique_pending_task_priority",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "priority"],
+                condition=models.Q(completed=True),
+                name="completed_task_priority_idx",
+            ),
+            models.Index(
+                fields=["user", "completed", "priority"],
+                condition=models.Q(deleted=False),
+                name="live_task_priority_idx",
+            ),
+            # Covers the newest change and task count behind conditional GETs
+            models.Index(fields=["user", "created_date"], name="task_last_change_idx"),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class TaskCounterManager(models.Manager):
+    def add(self, user, pending=0, completed=0, deleted=0):
+        # Called after the task write, inside the same transaction. A counter
+        # that drifted below what it loses (tasks written around the views) is
+        # counted again from the tasks rather than going negative.
+        changes = {"pending": pending, "completed": completed, "deleted": deleted}
+        bounds = {
+            f"{field}__gte": -change for field, change in changes.items() if change < 0
+        }
+        updated = self.filter(user=user, **bounds).update(
+            pending=models.F("pending") + pending,
+            completed=models.F("completed") + completed,
+            deleted=models.F("deleted") + deleted,
+        )
+        if not updated:
+            self.rebuild(user)
+
+    def lock(self, user):
+        # Serializes the task writes of a user until the end of the transaction.
+        # The no-op update takes the row lock of the user's counter on
+        # PostgreSQL and the write lock of the database on SQLite, where
+        # select_for_update() does nothing. Call it before reading priorities.
+        if not self.filter(user=user).update(pending=models.F("pending")):
+            self.rebuild(user)
+            self.filter(user=user).update(pending=models.F("pending"))
+
+    def count_tasks(self, users):
+        # One grouped aggregate query for any number of users
+        return (
+            Task.objects.filter(user__in=users)
+            .values("user")
+            .annotate(
+                pending=models.Count(
+                    "id", filter=models.Q(completed=False, deleted=False)
+                ),
+                completed=models.Count(
+                    "id", filter=models.Q(completed=True, deleted=False)
+                ),
+                deleted=models.Count("id", filter=models.Q(deleted=True)),
+            )
+            .order_by()
+        )
+
+    def rebuild(self, user):
+        counts = {"pending": 0, "completed": 0, "deleted": 0}
+        for row in self.count_tasks([user]):
+            counts.update(row)
+        counts.pop("user", None)
+        counter, _ = self.update_or_create(user=user, defaults=counts)
+        return counter
+
+    def rebuild_many(self, user_ids):
+        # rebuild() for any number of users, with one grouped count. Call it with
+        # the users locked.
+        counters = {user_id: self.model(user_id=user_id) for user_id in user_ids}
+        for row in self.count_tasks(user_ids):
+            counter = counters[row.pop("user")]
+            for field, value in row.items():
+                setattr(counter, field, value)
+        self.filter(user__in=user_ids).delete()
+        self.bulk_create(counters.values())
+
+
+class TaskCounter(models.Model):
+    # Denormalized task counts of a user, kept up to date by the task views
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name="task_counter"
+    )
+    pending = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    deleted = models.PositiveIntegerField(default=0)
+
+    objects = TaskCounterManager()
+
+    def __str__(self):
+        return f"{self.user}: {self.completed} of {self.completed + self.pending}"
+
+
+class TaskArchive(models.Model):
+    # Old completed and deleted tasks, moved out of tasks_task by purge_tasks
+    task_id = models.BigIntegerField(unique=True)
+    title = models.CharField(max_length=100)
+    description = models.TextField()
+    completed = models.BooleanField()
+    created_date = models.DateTimeField()
+    created_at = models.DateTimeField()
+    deleted = models.BooleanField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    priority = models.PositiveIntegerField()
+    archived_date = models.DateTimeField(auto_now_add=True)
+
     def __str__(self):
         return self.title
+
+
+def time_to_complete(completed_at):
+    # From the creation of a task to completed_at, a datetime or an expression
+    if not hasattr(completed_at, "resolve_expression"):
+        completed_at = models.Value(completed_at, output_field=models.DateTimeField())
+    return models.ExpressionWrapper(
+        completed_at - models.F("created_at"), output_field=models.DurationField()
+    )
+
+
+class TaskDailyStatsManager(models.Manager):
+    def add(self, user, created=0, completed=0, completion_time=None):
+        # Called after TaskCounter.objects.add(), inside the same transaction
+        # and so under the lock of the user. completion_time is the time to
+        # complete summed over the completed tasks.
+        completion_seconds = (
+            int(completion_time.total_seconds()) if completion_time else 0
+        )
+        today = timezone.localdate()
+        updated = self.filter(user=user, date=today).update(
+            created=models.F("created") + created,
+            completed=models.F("completed") + completed,
+            completion_seconds=models.F("completion_seconds") + completion_seconds,
+        )
+        if not updated:
+            self.create(
+                user=user,
+                date=today,
+                created=created,
+                completed=completed,
+                completion_seconds=completion_seconds,
+            )
+
+
+class TaskDailyStats(models.Model):
+    # The tasks a user created and completed each day, kept up to date by the
+    # task views and rebuilt by manage.py rebuild_task_stats. The stats views
+    # read these rows only, one per day whatever the number of tasks. Days are
+    # those of TIME_ZONE.
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="task_daily_stats"
+    )
+    date = models.DateField()
+    created = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    # From creation to completion, summed over the tasks completed that day
+    completion_seconds = models.PositiveBigIntegerField(default=0)
+
+    objects = TaskDailyStatsManager()
+
+    class Meta:
+        constraints = [
+            # Also the index of the date ranges of a user the stats views read
+            models.UniqueConstraint(
+                fields=["user", "date"], name="unique_task_daily_stats"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} on {self.date}: {self.completed} of {self.created}"
@@ -0,0 +1,76 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from tasks.cache import get_cache
+
+# Always read from the primary, a replica lagging behind would lose the
+# session of a user who just logged in
+PRIMARY_APPS = {"sessions"}
+
+
+class RoutingState:
+    # The database routing of one request, set by ReadReplicaMiddleware. The
+    # replica is None when the request must read from the primary.
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+
+# Unset outside of requests, in the management commands and the shell. Copied
+# into the threads of sync_to_async along with the rest of the context.
+request_routing = ContextVar("request_routing", default=None)
+
+
+def primary_pin_key(user):
+    return f"tasks:read_primary:{user.pk}"
+
+
+def pin_to_primary(user):
+    # Keeps the reads of the user on the primary, from every device, until the
+    # replicas have caught up with their write. In the cache of the task lists,
+    # which their versions already need shared by the worker processes.
+    get_cache().set(primary_pin_key(user), True, settings.DATABASE_REPLICA_LAG_SECONDS)
+
+
+def is_pinned_to_primary(user):
+    return get_cache().get(primary_pin_key(user)) is not None
+
+
+class ReadReplicaRouter:
+    # Sends the reads of safe requests to one of settings.DATABASE_REPLICAS and
+    # everything else to "default". Reads stay on the primary inside
+    # transaction.atomic(), and once the request wrote anything, to see what
+    # it wrote.
+    def db_for_read(self, model, **hints):
+        state = request_routing.get()
+        if state is None:
+            return None
+        if (
+            state.replica is None
+            or state.wrote
+            or model._meta.app_label in PRIMARY_APPS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = request_routing.get()
+        if state is not None and model._meta.app_label not in PRIMARY_APPS:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema with the rows, from the primary
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
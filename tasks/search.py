@@ -0,0 +1,72 @@
+import re
+
+# Full-text index over the title and description of tasks, for SQLite (FTS5).
+# It is an external content table: the text lives in tasks_task only and the
+# index is kept in sync by the triggers below. The user id is indexed too, so
+# a search only walks the matches of one user.
+
+FTS_TABLE = "tasks_task_fts"
+
+CREATE_FTS_TABLE = f"""
+CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+    title, description, user_id, content='tasks_task', content_rowid='id'
+)
+"""
+
+# SQLite drops the triggers of a table whenever django remakes it in a
+# migration, so migrations altering Task have to run these again
+FTS_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON tasks_task BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description, user_id)
+        VALUES (new.id, new.title, new.description, new.user_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON tasks_task BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, user_id)
+        VALUES ('delete', old.id, old.title, old.description, old.user_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF title, description, user_id ON tasks_task BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, user_id)
+        VALUES ('delete', old.id, old.title, old.description, old.user_id);
+        INSERT INTO {FTS_TABLE}(rowid, title, description, user_id)
+        VALUES (new.id, new.title, new.description, new.user_id);
+    END
+    """,
+]
+
+REBUILD_FTS_TABLE = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+
+# bm25() is lower for better matches, a title match weighs ten description ones
+SEARCH_RANK = f"bm25({FTS_TABLE}, 10.0, 1.0, 0.0)"
+
+# The unary + stops SQLite from probing the index by rowid once per task of the
+# user, which re-runs the full-text query every time. The index is scanned once
+# instead and the matching tasks are fetched by primary key.
+SEARCH_JOIN = f'+{FTS_TABLE}.rowid = "tasks_task"."id"'
+
+
+def create_fts_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for trigger in FTS_TRIGGERS:
+        schema_editor.execute(trigger)
+
+
+def build_match_query(search_term, user_id=None):
+    # Every word of the search term has to match the start of a word in the
+    # title or description. Quoting them keeps FTS5 operators typed by the user
+    # inert.
+    words = re.findall(r"\w+", search_term)
+    if not words:
+        return ""
+    match_query = "{title description} : (%s)" % " ".join(
+        f'"{word}"*' for word in words
+    )
+    if user_id is not None:
+        match_query += f' AND user_id : "{int(user_id)}"'
+    return match_query
@@ -0,0 +1,321 @@
+import re
+import xml.etree.ElementTree as ElementTree
+from pathlib import Path
+
+from django.conf import settings
+
+# The stylesheet and the icons of the templates, built by manage.py
+# build_static from tasks/assets into tasks/static/tasks, which collectstatic
+# then hashes and compresses. The stylesheet holds the Tailwind utilities used
+# in the templates and the forms, with Tailwind's values, and nothing else.
+# Nothing is compiled in the browser or loaded from a CDN.
+
+APP_DIR = Path(__file__).resolve().parent
+ASSETS_DIR = APP_DIR / "assets"
+OUTPUT_DIR = APP_DIR / "static" / "tasks"
+SVG_NAMESPACE = "http://www.w3.org/2000/svg"
+
+COLORS = {
+    "white": "#fff",
+    "black": "#000",
+    "transparent": "transparent",
+    "gray-50": "#f9fafb",
+    "gray-100": "#f3f4f6",
+    "gray-200": "#e5e7eb",
+    "gray-300": "#d1d5db",
+    "gray-400": "#9ca3af",
+    "gray-500": "#6b7280",
+    "gray-600": "#4b5563",
+    "gray-700": "#374151",
+    "gray-800": "#1f2937",
+    "gray-900": "#111827",
+    "slate-50": "#f8fafc",
+    "slate-100": "#f1f5f9",
+    "slate-200": "#e2e8f0",
+    "slate-300": "#cbd5e1",
+    "slate-400": "#94a3b8",
+    "slate-500": "#64748b",
+    "slate-600": "#475569",
+    "slate-700": "#334155",
+    "slate-800": "#1e293b",
+    "slate-900": "#0f172a",
+    "red-50": "#fef2f2",
+    "red-100": "#fee2e2",
+    "red-200": "#fecaca",
+    "red-300": "#fca5a5",
+    "red-400": "#f87171",
+    "red-500": "#ef4444",
+    "red-600": "#dc2626",
+    "red-700": "#b91c1c",
+    "red-800": "#991b1b",
+    "red-900": "#7f1d1d",
+    "rose-500": "#f43f5e",
+    "rose-600": "#e11d48",
+    "teal-400": "#2dd4bf",
+    "teal-500": "#14b8a6",
+    "lime-500": "#84cc16",
+    "lime-600": "#65a30d",
+}
+COLOR = "|".join(sorted(map(re.escape, COLORS), key=len, reverse=True))
+
+# Font size and line height
+FONT_SIZES = {
+    "xs": ("0.75rem", "1rem"),
+    "sm": ("0.875rem", "1.25rem"),
+    "base": ("1rem", "1.5rem"),
+    "lg": ("1.125rem", "1.75rem"),
+    "xl": ("1.25rem", "1.75rem"),
+    "2xl": ("1.5rem", "2rem"),
+    "3xl": ("1.875rem", "2.25rem"),
+    "4xl": ("2.25rem", "2.5rem"),
+}
+FONT_WEIGHTS = {"normal": 400, "medium": 500, "semibold": 600, "bold": 700}
+RADII = {
+    None: "0.25rem",
+    "none": "0px",
+    "sm": "0.125rem",
+    "md": "0.375rem",
+    "lg": "0.5rem",
+    "xl": "0.75rem",
+    "2xl": "1rem",
+    "3xl": "1.5rem",
+    "full": "9999px",
+}
+MAX_WIDTHS = {"xs": "20rem", "sm": "24rem", "md": "28rem", "lg": "32rem", "xl": "36rem"}
+SIDES = {
+    "": [""],
+    "x": ["-left", "-right"],
+    "y": ["-top", "-bottom"],
+    "t": ["-top"],
+    "r": ["-right"],
+    "b": ["-bottom"],
+    "l": ["-left"],
+}
+SPACE = r"\d+(?:\.5)?|px"
+SIZES = {"full": "100%", "min": "min-content", "max": "max-content"}
+
+PSEUDO_CLASSES = {"hover": ":hover", "focus": ":focus"}
+SCREENS = {"sm": "640px", "md": "768px", "lg": "1024px", "xl": "1280px"}
+
+
+def spacing(value):
+    if value == "px":
+        return "1px"
+    return f"{float(value) / 4:g}rem" if value != "0" else "0px"
+
+
+def sides(prefix, match):
+    return ";".join(f"{prefix}{side}:{spacing(match[2])}" for side in SIDES[match[1]])
+
+
+def margin(match):
+    value = spacing(match[3])
+    if match[1] and value != "0px":
+        value = f"-{value}"
+    return ";".join(f"margin{side}:{value}" for side in SIDES[match[2]])
+
+
+def size(prefix, screen_unit):
+    def declaration(match):
+        value = match[1]
+        if value in SIZES:
+            return f"{prefix}:{SIZES[value]}"
+        if value == "screen":
+            return f"{prefix}:100{screen_unit}"
+        return f"{prefix}:{spacing(value)}"
+
+    return declaration
+
+
+def ring(match):
+    width = match[1] or "3"
+    return (
+        "--tw-ring-offset-shadow:0 0 0 var(--tw-ring-offset-width) "
+        "var(--tw-ring-offset-color);"
+        f"--tw-ring-shadow:0 0 0 calc({width}px + var(--tw-ring-offset-width)) "
+        "var(--tw-ring-color);"
+        "box-shadow:var(--tw-ring-offset-shadow),var(--tw-ring-shadow)"
+    )
+
+
+# (pattern, declarations, selector suffix), in the order of Tailwind's output,
+# which decides between utilities setting the same property
+UTILITIES = [
+    (r"(static|fixed|absolute|relative|sticky)", lambda m: f"position:{m[1]}", ""),
+    (rf"(-?)m([xytrbl]?)-({SPACE})", margin, ""),
+    (
+        r"(block|inline-block|inline|flex|inline-flex|grid|hidden)",
+        lambda m: "display:none" if m[1] == "hidden" else f"display:{m[1]}",
+        "",
+    ),
+    (rf"h-({SPACE}|full|screen)", size("height", "vh"), ""),
+    (r"min-h-(0|full|screen)", size("min-height", "vh"), ""),
+    (rf"w-({SPACE}|full|screen|min|max)", size("width", "vw"), ""),
+    (r"max-w-(xs|sm|md|lg|xl)", lambda m: f"max-width:{MAX_WIDTHS[m[1]]}", ""),
+    (r"cursor-(pointer|default|not-allowed)", lambda m: f"cursor:{m[1]}", ""),
+    (
+        r"flex-(row|col)",
+        lambda m: f"flex-direction:{m[1].replace('col', 'column')}",
+        "",
+    ),
+    (
+        r"items-(start|end|center|baseline|stretch)",
+        lambda m: f"align-items:{m[1].replace('start', 'flex-start').replace('end', 'flex-end')}",
+        "",
+    ),
+    (
+        r"justify-(start|end|center|between|around|evenly)",
+        lambda m: "justify-content:"
+        + {"start": "flex-start", "end": "flex-end", "center": "center"}.get(
+            m[1], f"space-{m[1]}"
+        ),
+        "",
+    ),
+    (
+        rf"space-y-({SPACE})",
+        lambda m: f"margin-top:{spacing(m[1])}",
+        ">:not([hidden])~:not([hidden])",
+    ),
+    (
+        rf"space-x-({SPACE})",
+        lambda m: f"margin-left:{spacing(m[1])}",
+        ">:not([hidden])~:not([hidden])",
+    ),
+    (
+        r"rounded(?:-(none|sm|md|lg|xl|2xl|3xl|full))?",
+        lambda m: f"border-radius:{RADII[m[1]]}",
+        "",
+    ),
+    (r"border(?:-([0248]))?", lambda m: f"border-width:{m[1] or 1}px", ""),
+    (rf"border-({COLOR})", lambda m: f"border-color:{COLORS[m[1]]}", ""),
+    (rf"bg-({COLOR})", lambda m: f"background-color:{COLORS[m[1]]}", ""),
+    (rf"p([xytrbl]?)-({SPACE})", lambda m: sides("padding", m), ""),
+    (r"text-(left|center|right|justify)", lambda m: f"text-align:{m[1]}", ""),
+    (
+        r"text-(xs|sm|base|lg|xl|2xl|3xl|4xl)",
+        lambda m: "font-size:{};line-height:{}".format(*FONT_SIZES[m[1]]),
+        "",
+    ),
+    (
+        r"font-(normal|medium|semibold|bold)",
+        lambda m: f"font-weight:{FONT_WEIGHTS[m[1]]}",
+        "",
+    ),
+    (rf"text-({COLOR})", lambda m: f"color:{COLORS[m[1]]}", ""),
+    (r"outline-none", lambda m: "outline:2px solid transparent;outline-offset:2px", ""),
+    (r"ring(?:-([0248]))?", ring, ""),
+    (rf"ring-({COLOR})", lambda m: f"--tw-ring-color:{COLORS[m[1]]}", ""),
+    (r"ring-offset-([0248])", lambda m: f"--tw-ring-offset-width:{m[1]}px", ""),
+]
+UTILITIES = [
+    (re.compile(pattern), declarations, suffix)
+    for pattern, declarations, suffix in UTILITIES
+]
+
+# Tokens of the content files, the class names are among them
+TOKEN = re.compile(r"[^\s\"'<>{}=`%]+")
+CLASS_ATTRIBUTE = re.compile(
+    r"""class=(["'])(.*?)\1|"class"\s*\]\s*=\s*(["'])(.*?)\3"""
+)
+TEMPLATE_TAG = re.compile(r"{%.*?%}|{{.*?}}")
+# Class names with no style of their own
+MARKER_CLASSES = {"group"}
+
+
+def content_files():
+    # The templates and the forms, which set classes on their widgets
+    for directory in settings.TEMPLATES[0]["DIRS"]:
+        yield from sorted(Path(settings.BASE_DIR, directory).glob("**/*.html"))
+    yield from sorted(APP_DIR.glob("templates/**/*.html"))
+    yield APP_DIR / "views.py"
+
+
+def escape(class_name):
+    return re.sub(r"([^\w-])", r"\\\1", class_name)
+
+
+def utility_rule(token):
+    # Returns the sort key and the rule of a class name, None for other tokens
+    *variants, utility = token.split(":")
+    if any(
+        variant not in PSEUDO_CLASSES and variant not in SCREENS for variant in variants
+    ):
+        return None
+    for order, (pattern, declarations, suffix) in enumerate(UTILITIES):
+        match = pattern.fullmatch(utility)
+        if match:
+            break
+    else:
+        return None
+
+    pseudo_classes = "".join(PSEUDO_CLASSES.get(variant, "") for variant in variants)
+    screens = [variant for variant in variants if variant in SCREENS]
+    screen = screens[-1] if screens else None
+    rule = f".{escape(token)}{pseudo_classes}{suffix}{{{declarations(match)}}}"
+    screen_order = list(SCREENS).index(screen) + 1 if screen else 0
+    return (screen_order, bool(pseudo_classes), order, token), screen, rule
+
+
+def minify(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>~])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+def build_css(files):
+    tokens = set()
+    for path in files:
+        tokens.update(TOKEN.findall(path.read_text()))
+    rules = sorted(filter(None, map(utility_rule, tokens)))
+
+    css = [minify((ASSETS_DIR / "base.css").read_text())]
+    media = None
+    for _, screen, rule in rules:
+        if screen != media:
+            if media:
+                css.append("}")
+            css.append(f"@media (min-width:{SCREENS[screen]}){{")
+            media = screen
+        css.append(rule)
+    if media:
+        css.append("}")
+    return "".join(css) + "\n"
+
+
+def unknown_classes(files):
+    # Class names the stylesheet has no rule for, typos or utilities to add
+    unknown = set()
+    for path in files:
+        for match in CLASS_ATTRIBUTE.finditer(path.read_text()):
+            for class_name in TEMPLATE_TAG.sub(" ", match[2] or match[4] or "").split():
+                if class_name not in MARKER_CLASSES and not utility_rule(class_name):
+                    unknown.add(class_name)
+    return sorted(unknown)
+
+
+def build_icons():
+    # One sprite, the icons are its symbols: <use href="icons.svg#tick">
+    ElementTree.register_namespace("", SVG_NAMESPACE)
+    sprite = ElementTree.Element(f"{{{SVG_NAMESPACE}}}svg")
+    for path in sorted((ASSETS_DIR / "icons").glob("*.svg")):
+        icon = ElementTree.parse(path).getroot()
+        attributes = {
+            name: value
+            for name, value in icon.attrib.items()
+            if name not in ("width", "height")
+        }
+        symbol = ElementTree.SubElement(
+            sprite, f"{{{SVG_NAMESPACE}}}symbol", id=path.stem, **attributes
+        )
+        symbol.extend(icon)
+    for element in sprite.iter():
+        element.text = element.tail = None
+    return ElementTree.tostring(sprite, encoding="unicode") + "\n"
+
+
+def build():
+    # The built files, by name in OUTPUT_DIR
+    files = list(content_files())
+    return {"app.css": build_css(files), "icons.svg": build_icons()}
@@ -0,0 +1,54 @@
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Only text compresses, images and fonts already are
+COMPRESSED_EXTENSIONS = (".css", ".js", ".svg", ".html", ".txt", ".json", ".map")
+
+
+def gzip_compress(content):
+    # mtime=0, the same file gives the same bytes on every collectstatic
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def brotli_compress(content):
+    return brotli.compress(content, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # Writes file.gz and file.br next to every collected text file, for
+    # static_file_view to send to the clients accepting them
+    def get_compressors(self):
+        compressors = {".gz": gzip_compress}
+        if brotli:
+            compressors[".br"] = brotli_compress
+        return compressors
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        compressors = self.get_compressors()
+        # The original names and their hashed copies
+        names = [*paths, *self.hashed_files.values()]
+        for name in sorted(set(names)):
+            if not name.endswith(COMPRESSED_EXTENSIONS):
+                continue
+            with self.open(name) as original:
+                content = original.read()
+            for extension, compress in compressors.items():
+                compressed = compress(content)
+                # Not worth a request header for a file this small
+                if len(compressed) >= len(content):
+                    continue
+                if self.exists(name + extension):
+                    self.delete(name + extension)
+                self._save(name + extension, ContentFile(compressed))
+                yield name, name + extension, True
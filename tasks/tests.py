@@ -1 +1,2305 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import tracemalloc
+import unittest
+from contextlib import closing, redirect_stdout
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, connections, router, transaction
+from django.test import (
+    AsyncClient,
+    Client,
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.db.models import Max
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from tasks.admin import EstimatedCountPaginator
+from tasks.cache import bump_list_version, get_cache, get_stats
+from tasks.checks import check_sessions_cache, check_task_list_cache
+from tasks.database import copy_sqlite_database
+from tasks.middleware import sql_shape
+from tasks.models import Task, TaskArchive, TaskCounter, TaskDailyStats
+from tasks.routers import RoutingState, primary_pin_key, request_routing
+from tasks.search import build_match_query
+from tasks.views import (
+    GenericAllTaskView,
+    GenericCompletedTaskView,
+    GenericTaskView,
+    TaskExportView,
+    TaskListAPIView,
+    compact_priorities,
+    handlePriorityCascading,
+)
+
+# collectstatic has not run, there is no manifest of the hashed names to render
+# the static URLs of the templates with
+static_storage = override_settings(
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage"
+)
+
+
+def setUpModule():
+    static_storage.enable()
+
+
+def tearDownModule():
+    static_storage.disable()
+
+
+class TaskTestCase(TestCase):
+    def setUp(self):
+        # Cached list pages would outlive the rolled back users and tasks
+        get_cache().clear()
+
+
+class PriorityCascadingTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.client.force_login(self.user)
+
+    def create_tasks(self, *priorities, **kwargs):
+        return [
+            Task.objects.create(
+                title=f"TASK NUMBER {priority}",
+                description="",
+                priority=priority,
+                user=self.user,
+                **kwargs,
+            )
+            for priority in priorities
+        ]
+
+    def pending_priorities(self):
+        return list(
+            Task.objects.filter(user=self.user, completed=False, deleted=False)
+            .order_by("priority")
+            .values_list("title", "priority")
+        )
+
+    def test_free_priority_does_not_shift_anything(self):
+        self.create_tasks(1, 3)
+        handlePriorityCascading(None, 2, self.user)
+        self.assertEqual(
+            self.pending_priorities(), [("TASK NUMBER 1", 1), ("TASK NUMBER 3", 3)]
+        )
+
+    def test_only_the_contiguous_run_is_shifted(self):
+        self.create_tasks(1, 2, 3, 5, 6)
+        handlePriorityCascading(None, 2, self.user)
+        self.assertEqual(
+            [priority for _, priority in self.pending_priorities()], [1, 3, 4, 5, 6]
+        )
+
+    def test_completed_deleted_and_other_users_tasks_are_ignored(self):
+        self.create_tasks(2, completed=True)
+        self.create_tasks(3, deleted=True)
+        other = User.objects.create_user(username="bob", password="pass12345")
+        Task.objects.create(title="OTHER USERS TASK", priority=2, user=other)
+        self.create_tasks(1, 2)
+
+        handlePriorityCascading(None, 1, self.user)
+
+        self.assertEqual(
+            [priority for _, priority in self.pending_priorities()], [2, 3]
+        )
+        self.assertEqual(Task.objects.get(user=other).priority, 2)
+        self.assertEqual(Task.objects.get(user=self.user, completed=True).priority, 2)
+        self.assertEqual(Task.objects.get(user=self.user, deleted=True).priority, 3)
+
+    def test_create_view_cascades(self):
+        self.create_tasks(1, 2, 3)
+        response = self.client.post(
+            "/create-task/",
+            {"title": "a brand new task", "description": "Some details", "priority": 1},
+        )
+        self.assertRedirects(response, "/tasks", fetch_redirect_response=False)
+        self.assertEqual(
+            self.pending_priorities(),
+            [
+                ("A BRAND NEW TASK", 1),
+                ("TASK NUMBER 1", 2),
+                ("TASK NUMBER 2", 3),
+                ("TASK NUMBER 3", 4),
+            ],
+        )
+
+    def test_update_view_cascades(self):
+        first, second, third = self.create_tasks(1, 2, 3)
+        self.client.post(
+            f"/update-task/{third.id}",
+            {"title": third.title, "description": "Some details", "priority": 1},
+        )
+        self.assertEqual(
+            self.pending_priorities(),
+            [("TASK NUMBER 3", 1), ("TASK NUMBER 1", 2), ("TASK NUMBER 2", 3)],
+        )
+
+    def test_update_view_cascades_into_the_tasks_own_old_slot(self):
+        first, second, third, fourth = self.create_tasks(1, 2, 3, 4)
+        self.client.post(
+            f"/update-task/{third.id}",
+            {"title": third.title, "description": "Some details", "priority": 1},
+        )
+        self.assertEqual(
+            self.pending_priorities(),
+            [
+                ("TASK NUMBER 3", 1),
+                ("TASK NUMBER 1", 2),
+                ("TASK NUMBER 2", 3),
+                ("TASK NUMBER 4", 4),
+            ],
+        )
+
+    def test_update_view_cascades_from_priority_zero(self):
+        zero, one = self.create_tasks(0, 1)
+        response = self.client.post(
+            f"/update-task/{zero.id}",
+            {"title": zero.title, "description": "Some details", "priority": 1},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            self.pending_priorities(), [("TASK NUMBER 0", 1), ("TASK NUMBER 1", 2)]
+        )
+
+    def test_create_form_defaults_to_the_next_free_priority(self):
+        response = self.client.get("/create-task/")
+        self.assertEqual(response.context["form"].initial["priority"], 1)
+
+        self.create_tasks(1, 2, 5)
+        self.create_tasks(9, completed=True)
+        response = self.client.get("/create-task/")
+        self.assertEqual(response.context["form"].initial["priority"], 6)
+
+    def test_creating_with_the_default_priority_writes_a_single_task(self):
+        self.create_tasks(*range(1, 51))
+        priority = self.client.get("/create-task/").context["form"].initial["priority"]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(
+                "/create-task/",
+                {
+                    "title": "a brand new task",
+                    "description": "Details",
+                    "priority": priority,
+                },
+            )
+        task_writes = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith(("INSERT", "UPDATE"))
+            and '"tasks_task"' in query["sql"].split("(")[0]
+        ]
+        self.assertEqual(len(task_writes), 1)
+        self.assertTrue(task_writes[0].startswith('INSERT INTO "tasks_task"'))
+
+    def cascade_query_count(self, run_length):
+        Task.objects.all().delete()
+        self.create_tasks(*range(1, run_length + 1))
+        TaskCounter.objects.rebuild(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            handlePriorityCascading(None, 1, self.user)
+        self.assertEqual(
+            [priority for _, priority in self.pending_priorities()],
+            list(range(2, run_length + 2)),
+        )
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_run_length(self):
+        self.assertEqual(self.cascade_query_count(1), self.cascade_query_count(200))
+
+
+class TaskConstraintTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+
+    def test_pending_tasks_cannot_share_a_priority(self):
+        Task.objects.create(title="FIRST TASK", priority=1, user=self.user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Task.objects.create(title="SECOND TASK", priority=1, user=self.user)
+
+    def test_completed_and_deleted_tasks_can_share_a_priority(self):
+        Task.objects.create(title="FIRST TASK", priority=1, user=self.user)
+        Task.objects.create(
+            title="SECOND TASK", priority=1, user=self.user, completed=True
+        )
+        Task.objects.create(
+            title="THIRD TASK", priority=1, user=self.user, deleted=True
+        )
+        self.assertEqual(Task.objects.filter(priority=1).count(), 3)
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "EXPLAIN output is SQLite's")
+class TaskIndexTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.request = RequestFactory().get("/")
+        self.request.user = User.objects.create_user(username="alice")
+
+    def assertUsesIndex(self, view_class, index_name):
+        view = view_class()
+        view.setup(self.request)
+        plan = view.get_queryset().explain()
+        self.assertIn(f"USING INDEX {index_name}", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_pending_tasks_use_the_unique_priority_index(self):
+        self.assertUsesIndex(GenericTaskView, "unique_pending_task_priority")
+
+    def test_completed_tasks_use_the_completed_index(self):
+        self.assertUsesIndex(GenericCompletedTaskView, "completed_task_priority_idx")
+
+    def test_all_tasks_use_the_live_task_index(self):
+        self.assertUsesIndex(GenericAllTaskView, "live_task_priority_idx")
+
+    def test_cursor_pages_seek_into_the_index(self):
+        view = GenericCompletedTaskView()
+        view.setup(self.request)
+        tasks = view.get_queryset().filter(view.get_cursor_filter([3, 10], False))
+        plan = tasks.explain()
+        self.assertIn("USING INDEX completed_task_priority_idx", plan)
+        self.assertIn("priority>?", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+class CursorPaginationTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.client.force_login(self.user)
+        for priority in range(1, 13):
+            Task.objects.create(
+                title=f"PENDING {priority:02}", priority=priority, user=self.user
+            )
+            Task.objects.create(
+                title=f"COMPLETED {priority:02}",
+                priority=priority % 3,
+                completed=True,
+                user=self.user,
+            )
+
+    def titles(self, response):
+        return [task.title for task in response.context["tasks"]]
+
+    def walk(self, url):
+        pages = []
+        response = self.client.get(url)
+        while True:
+            pages.append(self.titles(response))
+            page = response.context["page_obj"]
+            if not page.has_next():
+                return pages, response
+            response = self.client.get(url, {"cursor": page.next_cursor})
+
+    def test_walks_forward_through_every_pending_task_in_priority_order(self):
+        pages, _ = self.walk("/tasks/")
+        self.assertEqual(
+            pages,
+            [
+                [f"PENDING {priority:02}" for priority in range(1, 6)],
+                [f"PENDING {priority:02}" for priority in range(6, 11)],
+                ["PENDING 11", "PENDING 12"],
+            ],
+        )
+
+    def test_completed_tasks_sharing_a_priority_are_neither_skipped_nor_repeated(self):
+        pages, _ = self.walk("/completed_tasks/")
+        titles = [title for page in pages for title in page]
+        expected = Task.objects.filter(completed=True).order_by("priority", "id")
+        self.assertEqual(titles, [task.title for task in expected])
+
+    def test_previous_cursor_walks_back(self):
+        pages, response = self.walk("/tasks/")
+        page = response.context["page_obj"]
+        response = self.client.get("/tasks/", {"cursor": page.previous_cursor})
+        self.assertEqual(self.titles(response), pages[1])
+        page = response.context["page_obj"]
+        response = self.client.get("/tasks/", {"cursor": page.previous_cursor})
+        self.assertEqual(self.titles(response), pages[0])
+        self.assertFalse(response.context["page_obj"].has_previous())
+
+    def test_search_results_keep_the_search_filter(self):
+        response = self.client.get("/tasks/", {"search": "pending 1"})
+        self.assertEqual(
+            self.titles(response), ["PENDING 10", "PENDING 11", "PENDING 12"]
+        )
+        self.assertFalse(response.context["is_paginated"])
+
+    def test_cursor_pages_do_not_count_the_tasks(self):
+        response = self.client.get("/tasks/")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                "/tasks/", {"cursor": response.context["page_obj"].next_cursor}
+            )
+        counts = [query for query in queries if "COUNT(" in query["sql"]]
+        self.assertEqual(counts, [])
+        self.assertNotIn("OFFSET", queries[-1]["sql"])
+
+    def test_page_numbers_fall_back_to_offset_pagination(self):
+        response = self.client.get("/tasks/", {"page": 2})
+        self.assertEqual(response.context["page_obj"].number, 2)
+        self.assertEqual(
+            self.titles(response),
+            [f"PENDING {priority:02}" for priority in range(6, 11)],
+        )
+        self.assertContains(response, "?page=3&search=")
+
+    def test_rendered_links_carry_the_cursor(self):
+        response = self.client.get("/tasks/")
+        self.assertContains(
+            response, f"?cursor={response.context['page_obj'].next_cursor}&search="
+        )
+
+    def test_tampered_cursor_is_a_404(self):
+        response = self.client.get("/tasks/", {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_of_another_list_is_a_404(self):
+        cursor = self.client.get("/tasks/").context["page_obj"].next_cursor
+        for url in ("/all_tasks/", "/completed_tasks/"):
+            response = self.client.get(url, {"cursor": cursor})
+            self.assertEqual(response.status_code, 404)
+
+
+class AllTasksViewTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.client.force_login(self.user)
+        for title, priority, completed in [
+            ("PENDING WRITE REPORT", 2, False),
+            ("COMPLETED BUY MILK", 1, True),
+            ("PENDING BUY BREAD", 1, False),
+            ("COMPLETED WRITE NOTES", 3, True),
+            ("PENDING CALL BANK", 4, False),
+            ("COMPLETED CALL MOM", 2, True),
+        ]:
+            Task.objects.create(
+                title=title, priority=priority, completed=completed, user=self.user
+            )
+        Task.objects.create(
+            title="PENDING DELETED", priority=3, deleted=True, user=self.user
+        )
+        other = User.objects.create_user(username="bob")
+        Task.objects.create(title="PENDING OF BOB", priority=1, user=other)
+
+    def all_titles(self, params=None):
+        titles = []
+        response = self.client.get("/all_tasks/", params)
+        while True:
+            titles += [task.title for task in response.context["tasks"]]
+            page = response.context["page_obj"]
+            if not page.has_next():
+                return titles
+            response = self.client.get(
+                "/all_tasks/", {**(params or {}), "cursor": page.next_cursor}
+            )
+
+    def test_pending_tasks_come_first_then_completed_each_by_priority(self):
+        self.assertEqual(
+            self.all_titles(),
+            [
+                "PENDING BUY BREAD",
+                "PENDING WRITE REPORT",
+                "PENDING CALL BANK",
+                "COMPLETED BUY MILK",
+                "COMPLETED CALL MOM",
+                "COMPLETED WRITE NOTES",
+            ],
+        )
+
+    def test_search_filters_both_pending_and_completed_tasks(self):
+        self.assertEqual(
+            self.all_titles({"search": "write"}),
+            ["PENDING WRITE REPORT", "COMPLETED WRITE NOTES"],
+        )
+
+    def test_page_numbers_only_fetch_the_requested_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/all_tasks/", {"page": 2})
+        self.assertEqual(
+            [task.title for task in response.context["tasks"]],
+            ["COMPLETED WRITE NOTES"],
+        )
+        task_queries = [
+            query["sql"] for query in queries if 'FROM "tasks_task"' in query["sql"]
+        ]
+        for sql in task_queries:
+            self.assertTrue("COUNT(" in sql or "OFFSET 5" in sql, sql)
+
+
+class TaskCounterTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.client.force_login(self.user)
+
+    def create_task(self, priority, **extra):
+        self.client.post(
+            "/create-task/",
+            {
+                "title": f"task with priority {priority}",
+                "description": "Some details",
+                "priority": priority,
+                **extra,
+            },
+        )
+        return Task.objects.get(user=self.user, priority=priority, **extra)
+
+    def assertCounters(self, pending, completed, deleted=0):
+        counter = TaskCounter.objects.get(user=self.user)
+        self.assertEqual(
+            (counter.pending, counter.completed, counter.deleted),
+            (pending, completed, deleted),
+        )
+        recounted = TaskCounter.objects.count_tasks([self.user]).get()
+        self.assertEqual(
+            (recounted["pending"], recounted["completed"], recounted["deleted"]),
+            (pending, completed, deleted),
+        )
+
+    def test_write_paths_keep_the_counters_up_to_date(self):
+        first = self.create_task(1)
+        second = self.create_task(2)
+        self.create_task(3, completed=True)
+        self.assertCounters(pending=2, completed=1)
+
+        self.client.post(f"/complete_task/{first.id}/")
+        self.assertCounters(pending=1, completed=2)
+
+        self.client.post(
+            f"/update-task/{second.id}",
+            {
+                "title": second.title,
+                "description": "Some details",
+                "priority": 2,
+                "completed": True,
+            },
+        )
+        self.assertCounters(pending=0, completed=3)
+
+        fourth = self.create_task(4)
+        self.assertCounters(pending=1, completed=3)
+        self.client.post(f"/delete-task/{fourth.id}/")
+        self.assertCounters(pending=0, completed=3, deleted=1)
+
+    def test_progress_header_is_a_single_primary_key_lookup(self):
+        self.create_task(1)
+        self.create_task(2, completed=True)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/tasks/")
+        self.assertContains(response, "1 of 2 tasks completed")
+        counter_queries = [
+            query["sql"] for query in queries if "tasks_taskcounter" in query["sql"]
+        ]
+        self.assertEqual(len(counter_queries), 1)
+        self.assertNotIn("COUNT(", counter_queries[0])
+
+    def test_missing_counters_are_rebuilt_on_first_use(self):
+        Task.objects.create(title="PENDING TASK", priority=1, user=self.user)
+        response = self.client.get("/tasks/")
+        self.assertContains(response, "0 of 1 tasks completed")
+        self.assertCounters(pending=1, completed=0)
+
+    def test_drifted_counters_are_rebuilt_instead_of_going_negative(self):
+        task = self.create_task(1)
+        TaskCounter.objects.filter(user=self.user).update(pending=0)
+        response = self.client.post(f"/complete_task/{task.id}/")
+        self.assertEqual(response.status_code, 302)
+        self.assertCounters(pending=0, completed=1)
+
+    def test_command_verifies_and_rebuilds_the_counters(self):
+        self.create_task(1)
+        TaskCounter.objects.filter(user=self.user).update(pending=7)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_task_counters", verify=True, stderr=StringIO())
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command("rebuild_task_counters", stdout=StringIO())
+        self.assertCounters(pending=1, completed=0)
+        call_command("rebuild_task_counters", verify=True, stdout=StringIO())
+        # The user's counter is locked before the tasks are counted
+        statements = [query["sql"] for query in queries]
+        lock = next(i for i, sql in enumerate(statements) if sql.startswith("UPDATE"))
+        count = next(i for i, sql in enumerate(statements) if "COUNT(" in sql)
+        self.assertLess(lock, count)
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "FTS5 is SQLite's")
+class TaskSearchTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.client.force_login(self.user)
+
+    def create_task(self, title, description="", **extra):
+        return Task.objects.create(
+            title=title, description=description, user=self.user, **extra
+        )
+
+    def search(self, url, search_term):
+        # Tasks are changed through the ORM here, not through the views
+        bump_list_version(self.user)
+        response = self.client.get(url, {"search": search_term})
+        return [task.title for task in response.context["tasks"]]
+
+    def test_searches_titles_and_descriptions_ranked_by_relevance(self):
+        self.create_task("CALL THE PLUMBER", "About the kitchen sink", priority=1)
+        self.create_task("FIX THE KITCHEN SINK", "Before the weekend", priority=2)
+        self.create_task("BUY GROCERIES", "Milk and bread", priority=3)
+        self.assertEqual(
+            self.search("/tasks/", "kitchen"),
+            ["FIX THE KITCHEN SINK", "CALL THE PLUMBER"],
+        )
+
+    def test_matches_word_prefixes(self):
+        self.create_task("PREPARE THE PRESENTATION", priority=1)
+        self.create_task("PRESS THE SHIRTS", priority=2)
+        self.assertEqual(self.search("/tasks/", "presen"), ["PREPARE THE PRESENTATION"])
+        self.assertEqual(len(self.search("/tasks/", "pre")), 2)
+
+    def test_results_are_scoped_to_the_user_and_the_list(self):
+        self.create_task("PENDING REPORT", priority=1)
+        self.create_task("COMPLETED REPORT", priority=1, completed=True)
+        other = User.objects.create_user(username="bob")
+        Task.objects.create(title="REPORT OF BOB", priority=1, user=other)
+
+        self.assertEqual(self.search("/tasks/", "report"), ["PENDING REPORT"])
+        self.assertEqual(
+            self.search("/completed_tasks/", "report"), ["COMPLETED REPORT"]
+        )
+        self.assertEqual(
+            self.search("/all_tasks/", "report"),
+            ["PENDING REPORT", "COMPLETED REPORT"],
+        )
+
+    def test_index_follows_updates_and_deletes(self):
+        task = self.create_task("OLD TITLE OF THE TASK", priority=1)
+        task.title = "NEW TITLE OF THE TASK"
+        task.save()
+        self.assertEqual(self.search("/tasks/", "old"), [])
+        self.assertEqual(self.search("/tasks/", "new"), ["NEW TITLE OF THE TASK"])
+
+        task.delete()
+        self.assertEqual(self.search("/tasks/", "new"), [])
+
+    def test_search_operators_are_not_interpreted(self):
+        self.create_task("WRITE THE REPORT", priority=1)
+        self.assertEqual(self.search("/tasks/", 'report" OR "x'), [])
+        self.assertEqual(self.search("/tasks/", "***"), [])
+
+    def test_match_query_quotes_every_word_as_a_prefix(self):
+        self.assertEqual(
+            build_match_query("buy Milk-2"),
+            '{title description} : ("buy"* "Milk"* "2"*)',
+        )
+        self.assertEqual(
+            build_match_query("buy", user_id=7),
+            '{title description} : ("buy"*) AND user_id : "7"',
+        )
+        self.assertEqual(build_match_query(" :* "), "")
+
+
+# Batches are held to budgets of their own below, not to those of a request,
+# which would log a warning into the test output
+@override_settings(REQUEST_TIMING_QUERY_BUDGET=1000)
+class TaskBatchTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.client.force_login(self.user)
+
+    def batch(self, *operations):
+        response = self.client.post(
+            "/api/tasks/batch/",
+            json.dumps({"operations": list(operations)}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]
+
+    def tasks_of(self, user):
+        return list(
+            Task.objects.filter(user=user)
+            .order_by("completed", "priority", "title")
+            .values_list("title", "priority", "completed")
+        )
+
+    def test_matches_applying_the_operations_one_by_one_through_the_views(self):
+        other = User.objects.create_user(username="bob", password="pass12345")
+        existing = {}
+        for user in (self.user, other):
+            for priority in (1, 2, 3, 5):
+                existing[user, priority] = Task.objects.create(
+                    title=f"EXISTING TASK {priority}",
+                    description="Details",
+                    priority=priority,
+                    user=user,
+                ).id
+
+        # (operation, priority of the existing task it applies to)
+        operations = [
+            ({"op": "create", "title": "first new task", "priority": 2}, None),
+            ({"op": "reprioritize", "priority": 1}, 5),
+            ({"op": "create", "title": "second new task", "priority": 1}, None),
+            ({"op": "complete"}, 2),
+            (
+                {
+                    "op": "create",
+                    "title": "done new task",
+                    "priority": 3,
+                    "completed": True,
+                },
+                None,
+            ),
+            ({"op": "reprioritize", "priority": 4}, 1),
+        ]
+
+        self.batch(
+            *[
+                {
+                    **operation,
+                    "description": "Details",
+                    "id": existing.get((self.user, target)),
+                }
+                for operation, target in operations
+            ]
+        )
+
+        self.client.force_login(other)
+        for operation, target in operations:
+            task_id = existing.get((other, target))
+            if operation["op"] == "create":
+                self.client.post(
+                    "/create-task/", {**operation, "description": "Details"}
+                )
+            elif operation["op"] == "complete":
+                self.client.post(f"/complete_task/{task_id}/")
+            else:
+                self.client.post(
+                    f"/update-task/{task_id}",
+                    {
+                        "title": Task.objects.get(id=task_id).title,
+                        "description": "Details",
+                        "priority": operation["priority"],
+                    },
+                )
+
+        self.assertEqual(self.tasks_of(self.user), self.tasks_of(other))
+        self.assertEqual(
+            TaskCounter.objects.get(user=self.user).pending,
+            Task.objects.filter(user=self.user, completed=False).count(),
+        )
+
+    def test_reports_invalid_operations_and_applies_the_others(self):
+        task = Task.objects.create(title="EXISTING TASK", priority=1, user=self.user)
+        other = User.objects.create_user(username="bob")
+        others_task = Task.objects.create(title="BOBS TASK", priority=1, user=other)
+
+        results = self.batch(
+            {"op": "create", "title": "too short", "description": "a", "priority": 1},
+            {
+                "op": "create",
+                "title": "long enough title",
+                "description": "a",
+                "priority": 1,
+            },
+            {"op": "complete", "id": others_task.id},
+            {"op": "reprioritize", "id": task.id, "priority": -1},
+            {"op": "archive", "id": task.id},
+        )
+
+        self.assertEqual(
+            results[0]["errors"]["title"][0]["message"],
+            "Error: Length must be 10 characters",
+        )
+        created = Task.objects.get(title="LONG ENOUGH TITLE")
+        self.assertEqual(results[1], {"ok": True, "id": created.id, "priority": 1})
+        self.assertEqual(
+            results[2]["errors"]["id"][0]["message"], "No such pending task"
+        )
+        self.assertIn("priority", results[3]["errors"])
+        self.assertIn("op", results[4]["errors"])
+        task.refresh_from_db()
+        others_task.refresh_from_db()
+        self.assertEqual(task.priority, 2)
+        self.assertFalse(others_task.completed)
+
+    @override_settings(TASKS_COMPACT_PRIORITIES=True)
+    def test_completing_can_close_the_gaps(self):
+        first, second, third = [
+            Task.objects.create(
+                title=f"EXISTING TASK {priority}", priority=priority, user=self.user
+            )
+            for priority in (1, 2, 3)
+        ]
+        results = self.batch(
+            {"op": "complete", "id": first.id},
+            {"op": "reprioritize", "id": third.id, "priority": 5},
+            {
+                "op": "create",
+                "title": "first new task",
+                "description": "a",
+                "priority": 7,
+            },
+        )
+
+        self.assertEqual(
+            self.tasks_of(self.user),
+            [
+                ("EXISTING TASK 2", 1, False),
+                ("EXISTING TASK 3", 2, False),
+                ("FIRST NEW TASK", 3, False),
+                ("EXISTING TASK 1", 1, True),
+            ],
+        )
+        self.assertEqual(
+            [result["priority"] for result in results[1:]],
+            [2, 3],
+        )
+        self.assertEqual(results[0]["priority"], 1)
+
+    def test_rejects_malformed_requests(self):
+        response = self.client.post(
+            "/api/tasks/batch/", "not json", content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.client.logout()
+        response = self.client.post(
+            "/api/tasks/batch/",
+            json.dumps({"operations": []}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def batch_query_count(self, size):
+        Task.objects.all().delete()
+        for priority in range(1, 101):
+            Task.objects.create(
+                title=f"TASK {priority}", priority=priority, user=self.user
+            )
+        operations = [
+            {
+                "op": "create",
+                "title": f"new task number {index}",
+                "description": "a",
+                "priority": 1,
+            }
+            for index in range(size)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            results = self.batch(*operations)
+        self.assertTrue(all(result["ok"] for result in results))
+        self.assertEqual(
+            Task.objects.filter(user=self.user).aggregate(Max("priority"))[
+                "priority__max"
+            ],
+            100 + size,
+        )
+        return len(queries)
+
+    def test_query_count_grows_sub_linearly_with_the_batch_size(self):
+        small, large = self.batch_query_count(5), self.batch_query_count(200)
+        self.assertLessEqual(large, small + 2)
+
+
+class TaskListCacheTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.client.force_login(self.user)
+        Task.objects.create(title="FIRST TASK", priority=1, user=self.user)
+
+    def test_second_view_of_a_page_is_served_from_the_cache(self):
+        self.assertEqual(self.client.get("/tasks/")["X-Cache"], "MISS")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/tasks/")
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertContains(response, "FIRST TASK")
+        self.assertFalse([query for query in queries if "tasks_task" in query["sql"]])
+        self.assertEqual(get_stats(), {"hits": 1, "misses": 1})
+
+    def test_pages_and_searches_are_cached_separately(self):
+        self.client.get("/tasks/")
+        self.assertEqual(self.client.get("/tasks/", {"page": 1})["X-Cache"], "MISS")
+        self.assertEqual(
+            self.client.get("/tasks/", {"search": "first"})["X-Cache"], "MISS"
+        )
+        self.assertEqual(self.client.get("/completed_tasks/")["X-Cache"], "MISS")
+
+    def test_users_do_not_share_cached_pages(self):
+        self.client.get("/tasks/")
+        other = User.objects.create_user(username="bob")
+        self.client.force_login(other)
+        response = self.client.get("/tasks/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertNotContains(response, "FIRST TASK")
+
+    def assertInvalidates(self, url, data, **extra):
+        self.client.get("/all_tasks/")
+        self.client.post(url, data, **extra)
+        self.assertEqual(self.client.get("/all_tasks/")["X-Cache"], "MISS", url)
+
+    def test_every_write_view_invalidates_the_users_pages(self):
+        task = Task.objects.get()
+        self.assertInvalidates(
+            "/create-task/", {"title": "second task", "description": "a", "priority": 2}
+        )
+        self.assertInvalidates(
+            f"/update-task/{task.id}",
+            {"title": "renamed task", "description": "a", "priority": 1},
+        )
+        self.assertInvalidates(f"/complete_task/{task.id}/", {})
+
+        second = Task.objects.get(title="SECOND TASK")
+        operation = {"op": "reprioritize", "id": second.id, "priority": 3}
+        self.assertInvalidates(
+            "/api/tasks/batch/",
+            json.dumps({"operations": [operation]}),
+            content_type="application/json",
+        )
+        self.assertInvalidates(f"/delete-task/{second.id}/", {})
+        self.assertFalse(Task.objects.pending().exists())
+
+    def test_works_with_the_file_based_backend(self):
+        with tempfile.TemporaryDirectory() as location:
+            backend = "django.core.cache.backends.filebased.FileBasedCache"
+            with override_settings(
+                CACHES={
+                    **settings.CACHES,
+                    "default": {"BACKEND": backend, "LOCATION": location},
+                }
+            ):
+                self.assertEqual(self.client.get("/tasks/")["X-Cache"], "MISS")
+                self.assertEqual(self.client.get("/tasks/")["X-Cache"], "HIT")
+                self.client.post(
+                    "/create-task/",
+                    {"title": "second task", "description": "a", "priority": 2},
+                )
+                response = self.client.get("/tasks/")
+                self.assertEqual(response["X-Cache"], "MISS")
+                self.assertContains(response, "SECOND TASK")
+
+    def test_stats_command_reports_the_counters(self):
+        self.client.get("/tasks/")
+        self.client.get("/tasks/")
+        out = StringIO()
+        call_command("task_list_cache_stats", reset=True, stdout=out)
+        self.assertIn("hits: 1  misses: 1  hit ratio: 50.0%", out.getvalue())
+        self.assertEqual(get_stats(), {"hits": 0, "misses": 0})
+
+    def test_warns_about_a_cache_per_process(self):
+        self.assertEqual(
+            [warning.id for warning in check_task_list_cache(None)], ["tasks.W001"]
+        )
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            CACHES={
+                **settings.CACHES,
+                settings.TASK_LIST_CACHE: {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": directory,
+                },
+            }
+        ):
+            self.assertEqual(check_task_list_cache(None), [])
+
+
+class ConditionalGetTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.client.force_login(self.user)
+        self.task = Task.objects.create(title="FIRST TASK", priority=1, user=self.user)
+
+    def test_list_answers_if_none_match_without_rendering(self):
+        response = self.client.get("/tasks/")
+        etag = response["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/tasks/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response.templates, [])
+        self.assertFalse([query for query in queries if "tasks_task" in query["sql"]])
+
+    def test_list_answers_if_modified_since(self):
+        response = self.client.get("/completed_tasks/")
+        response = self.client.get(
+            "/completed_tasks/", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_a_write_changes_the_validator(self):
+        etag = self.client.get("/all_tasks/")["ETag"]
+        self.client.post(
+            "/create-task/",
+            {"title": "second task", "description": "a", "priority": 1},
+        )
+        response = self.client.get("/all_tasks/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_detail_answers_if_none_match(self):
+        response = self.client.get(f"/detail-task/{self.task.id}")
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            f"/detail-task/{self.task.id}", HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get("/detail-task/0").status_code, 404)
+
+    def test_cascaded_tasks_get_a_new_validator(self):
+        etag = self.client.get(f"/detail-task/{self.task.id}")["ETag"]
+        self.client.post(
+            "/create-task/",
+            {"title": "second task", "description": "a", "priority": 1},
+        )
+        response = self.client.get(
+            f"/detail-task/{self.task.id}", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "<p>2</p>", html=False)
+        self.assertNotIn("Last-Modified", response)
+
+    def test_cascades_keep_the_dates_of_the_moved_tasks(self):
+        created_date = self.task.created_date
+        self.client.post(
+            "/create-task/",
+            {"title": "second task", "description": "a", "priority": 1},
+        )
+        task = {"title": "third task", "description": "a", "priority": 1}
+        self.client.post(
+            "/api/tasks/batch/",
+            json.dumps({"operations": [{"op": "create", **task}]}),
+            content_type="application/json",
+        )
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.priority, 3)
+        self.assertEqual(self.task.created_date, created_date)
+
+
+class BenchmarkTests(TaskTestCase):
+    def test_seeds_tasks_within_the_constraints(self):
+        call_command("seed_tasks", users=2, tasks=200, prefix="load", stdout=StringIO())
+
+        for user in User.objects.filter(username__startswith="load-"):
+            tasks = Task.objects.filter(user=user)
+            pending = tasks.filter(completed=False, deleted=False)
+            self.assertEqual(tasks.count(), 200)
+            self.assertTrue(0 < pending.count() < 200)
+            self.assertEqual(
+                pending.values("priority").distinct().count(), pending.count()
+            )
+            self.assertEqual(user.task_counter.pending, pending.count())
+
+    # The async views would read in threads outside the transaction of the test
+    @override_settings(ASYNC_READ_THREADS=0)
+    def test_fails_on_regressions_from_the_baseline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            results = f"{directory}/results.json"
+            options = {
+                "users": 1,
+                "tasks": 100,
+                "iterations": 3,
+                "warmup": 1,
+                "run_lengths": [0, 20],
+                "use_current_database": True,
+                "stdout": StringIO(),
+            }
+            # Rolled back, so that the second run seeds the same users again
+            with transaction.atomic():
+                call_command("benchmark_urls", output=results, **options)
+                transaction.set_rollback(True)
+
+            with open(results) as output:
+                baseline = json.load(output)
+            self.assertEqual(
+                baseline["scenarios"]["create-task/ cascade over 20"]["queries"],
+                baseline["scenarios"]["create-task/ cascade over 0"]["queries"] + 2,
+            )
+            for result in baseline["scenarios"].values():
+                result["queries"] -= 1
+            with open(results, "w") as output:
+                json.dump(baseline, output)
+
+            with self.assertRaisesMessage(CommandError, "Regressions"):
+                call_command(
+                    "benchmark_urls", output=results, baseline=results, **options
+                )
+
+
+class RequestTimingTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.client.force_login(self.user)
+        for priority in range(1, 4):
+            Task.objects.create(
+                title=f"TASK NUMBER {priority}",
+                description="",
+                priority=priority,
+                user=self.user,
+            )
+
+    @override_settings(REQUEST_TIMING_HEADER=True)
+    def test_reports_the_timings_of_the_request(self):
+        with CaptureQueriesContext(connection) as queries, self.assertLogs(
+            "tasks.timing", "INFO"
+        ) as logs:
+            response = self.client.get("/tasks/")
+
+        self.assertRegex(
+            response["Server-Timing"],
+            r'^db;dur=[\d.]+;desc="(\d+) queries", tpl;dur=[\d.]+, total;dur=[\d.]+$',
+        )
+        self.assertIn(f'desc="{len(queries)} queries"', response["Server-Timing"])
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line["path"], "/tasks/")
+        self.assertEqual(line["queries"], len(queries))
+        self.assertGreater(line["template_ms"], 0)
+        self.assertEqual(line["over_budget"], [])
+        self.assertEqual(logs.records[0].levelname, "INFO")
+
+    @override_settings(REQUEST_TIMING_HEADER=False)
+    def test_timings_are_only_logged_without_the_header_setting(self):
+        with self.assertLogs("tasks.timing", "INFO"):
+            response = self.client.get("/tasks/")
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(REQUEST_TIMING_QUERY_BUDGET=2)
+    def test_warns_about_requests_over_budget(self):
+        with self.assertLogs("tasks.timing", "WARNING") as logs:
+            for task in Task.objects.all():
+                self.client.get(f"/detail-task/{task.id}")
+            self.client.get("/tasks/")
+
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line["over_budget"], ["queries"])
+
+    def test_lists_the_repeated_queries(self):
+        with self.assertLogs("tasks.timing", "INFO") as logs:
+            self.client.post(
+                "/create-task/",
+                {"title": "new task here", "description": "a", "priority": 1},
+            )
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertTrue(all(query["count"] > 1 for query in line["repeated_queries"]))
+
+    def test_sql_shapes_ignore_values(self):
+        self.assertEqual(
+            sql_shape('SELECT * FROM "t" WHERE "id" IN (%s, %s,%s) LIMIT 21'),
+            sql_shape('SELECT *  FROM "t"\nWHERE "id" IN (%s, %s) LIMIT 10'),
+        )
+
+
+@unittest.skipIf(
+    connection.vendor == "sqlite" and connection.is_in_memory_db(),
+    "Threads cannot write concurrently to an in-memory SQLite database",
+)
+class ConcurrentCascadeTests(TransactionTestCase):
+    writers = 4
+    tasks_per_writer = 10
+    # Seconds before a stuck writer fails the test instead of hanging it
+    timeout = 120
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+
+    # The writers wait for each other's locks, well over the latency budget
+    @override_settings(REQUEST_TIMING_LATENCY_BUDGET_MS=60_000)
+    def test_priorities_stay_unique_under_concurrent_writers(self):
+        errors = []
+        start = threading.Barrier(self.writers, timeout=self.timeout)
+
+        def write(writer):
+            try:
+                client = Client()
+                client.force_login(self.user)
+                start.wait()
+                for number in range(self.tasks_per_writer):
+                    # Every create cascades all the tasks of the other writers
+                    response = client.post(
+                        "/create-task/",
+                        {
+                            "title": f"writer {writer} task {number}",
+                            "description": "a",
+                            "priority": 1,
+                        },
+                    )
+                    if response.status_code != 302:
+                        errors.append(response.status_code)
+            except Exception as error:
+                errors.append(error)
+                # The other writers would wait for this one forever
+                start.abort()
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=write, args=(writer,))
+            for writer in range(self.writers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(self.timeout)
+            self.assertFalse(thread.is_alive())
+
+        self.assertEqual(errors, [])
+        total = self.writers * self.tasks_per_writer
+        self.assertEqual(
+            sorted(
+                Task.objects.filter(user=self.user).values_list("priority", flat=True)
+            ),
+            list(range(1, total + 1)),
+        )
+        self.assertEqual(TaskCounter.objects.get(user=self.user).pending, total)
+
+
+class TaskExportTests(TaskTestCase):
+    # A million rows take a minute, TASKS_EXPORT_TEST_ROWS=1000000 runs them
+    export_test_rows = int(os.environ.get("TASKS_EXPORT_TEST_ROWS", 100_000))
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.client.force_login(self.user)
+
+    def insert_tasks(self, count):
+        # Much faster than bulk_create for a million rows
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                WITH RECURSIVE numbers(number) AS (
+                    SELECT 1 UNION ALL SELECT number + 1 FROM numbers
+                    WHERE number < %s
+                )
+                INSERT INTO tasks_task
+                    (title, description, completed, deleted, created_date,
+                     created_at, user_id, priority)
+                SELECT 'TASK NUMBER ' || number, 'Details of the task', 0, 0,
+                    CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, %s, number
+                FROM numbers
+                """,
+                [count, self.user.id],
+            )
+
+    def test_exports_the_tasks_of_the_list_views(self):
+        for priority, completed in [(1, False), (2, False), (1, True)]:
+            Task.objects.create(
+                title=f"TASK {priority} {'DONE' if completed else 'TODO'}",
+                description='Call, the "plumber"\nagain',
+                completed=completed,
+                priority=priority,
+                user=self.user,
+            )
+        Task.objects.create(title="SOMEONE ELSE", description="", priority=1)
+
+        response = self.client.get("/export/tasks.csv?status=pending")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.reader(StringIO(response.getvalue().decode())))
+        self.assertEqual(rows[0], list(TaskExportView.fields))
+        self.assertEqual(
+            [(row[1], row[2], row[3]) for row in rows[1:]],
+            [
+                ("TASK 1 TODO", 'Call, the "plumber"\nagain', "1"),
+                ("TASK 2 TODO", 'Call, the "plumber"\nagain', "2"),
+            ],
+        )
+
+        response = self.client.get("/export/tasks.ndjson")
+        tasks = [json.loads(line) for line in response.getvalue().splitlines()]
+        self.assertEqual(
+            [(task["title"], task["completed"]) for task in tasks],
+            [("TASK 1 TODO", False), ("TASK 2 TODO", False), ("TASK 1 DONE", True)],
+        )
+
+        bump_list_version(self.user)
+        response = self.client.get("/export/tasks.ndjson?status=completed&search=done")
+        self.assertEqual(len(response.getvalue().splitlines()), 1)
+        self.assertEqual(self.client.get("/export/tasks.csv?status=x").status_code, 404)
+
+    def peak_memory(self, count):
+        Task.objects.all().delete()
+        self.insert_tasks(count)
+        tracemalloc.start()
+        try:
+            response = self.client.get("/export/tasks.ndjson?status=pending")
+            lines = sum(chunk.count(b"\n") for chunk in response.streaming_content)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+            self.assertEqual(lines, count)
+
+    def test_memory_does_not_grow_with_the_number_of_tasks(self):
+        small = self.peak_memory(10_000)
+        large = self.peak_memory(self.export_test_rows)
+        # The export of a million tasks is about 120 MB
+        self.assertLess(large, 10 * 1024 * 1024)
+        self.assertLess(large, small * 1.5)
+
+
+class TaskListAPITests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.client.force_login(self.user)
+        for priority in range(1, 8):
+            Task.objects.create(
+                title=f"TASK NUMBER {priority}",
+                description="Call the plumber" if priority % 2 else "Water the plants",
+                completed=priority > 5,
+                priority=priority,
+                user=self.user,
+            )
+        Task.objects.create(title="SOMEONE ELSE", description="", priority=1)
+
+    def get_all(self, path):
+        # Follows the cursors, returns the pages
+        pages = []
+        while path:
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json())
+            cursor = pages[-1]["next"]
+            path = cursor and f"{path.split('&cursor=')[0]}&cursor={cursor}"
+        return pages
+
+    def test_pages_through_the_tasks_of_a_list(self):
+        pages = self.get_all("/api/tasks/?status=all&limit=3&fields=title,priority")
+        self.assertEqual([len(page["tasks"]) for page in pages], [3, 3, 1])
+        self.assertEqual(pages[0]["fields"], ["title", "priority"])
+        self.assertEqual(
+            [tuple(task) for page in pages for task in page["tasks"]],
+            [(f"TASK NUMBER {priority}", priority) for priority in range(1, 8)],
+        )
+
+        pages = self.get_all("/api/tasks/?status=pending&limit=5")
+        self.assertEqual(len(pages), 1)
+        self.assertEqual(pages[0]["fields"], list(TaskListAPIView.default_fields))
+        self.assertEqual([task[2] for task in pages[0]["tasks"]], [1, 2, 3, 4, 5])
+
+    def test_pages_through_search_results(self):
+        pages = self.get_all("/api/tasks/?status=all&search=plumber&limit=2&fields=id")
+        self.assertEqual([len(page["tasks"]) for page in pages], [2, 2])
+
+    def test_reads_only_the_requested_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/api/tasks/?fields=id,title")
+        self.assertNotIn('"description"', queries[-1]["sql"])
+
+        response = self.client.get("/api/tasks/?fields=description&limit=1")
+        self.assertEqual(response.json()["tasks"], [["Call the plumber"]])
+
+    def test_rejects_the_cursor_of_another_status(self):
+        cursor = self.client.get("/api/tasks/?status=pending&limit=1").json()["next"]
+        for status in ("all", "completed"):
+            response = self.client.get(f"/api/tasks/?status={status}&cursor={cursor}")
+            self.assertEqual(response.status_code, 400)
+
+    def test_rejects_invalid_parameters(self):
+        for query in ["status=deleted", "fields=id,user", "cursor=abc", "limit=x"]:
+            response = self.client.get(f"/api/tasks/?{query}")
+            self.assertEqual(response.status_code, 400, query)
+        self.assertEqual(Client().get("/api/tasks/").status_code, 403)
+
+    def test_list_views_defer_the_description(self):
+        for path in ["/tasks/", "/completed_tasks/", "/all_tasks/?page=1"]:
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(path)
+            tasks_queries = [
+                query["sql"]
+                for query in queries
+                if 'FROM "tasks_task"' in query["sql"] and "ORDER BY" in query["sql"]
+            ]
+            self.assertTrue(tasks_queries, path)
+            for sql in tasks_queries:
+                self.assertNotIn('"description"', sql, path)
+
+
+class ImportTasksTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.alice = User.objects.create_user(username="alice", password="pass12345")
+        self.bob = User.objects.create_user(username="bob", password="pass12345")
+
+    def write(self, name, content):
+        path = f"{self.directory.name}/{name}"
+        with open(path, "w") as rows_file:
+            rows_file.write(content)
+        return path
+
+    def import_tasks(self, path, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command("import_tasks", path, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def tasks_of(self, user):
+        return list(
+            Task.objects.filter(user=user)
+            .order_by("completed", "priority", "title")
+            .values_list("title", "priority", "completed")
+        )
+
+    def test_matches_creating_the_tasks_through_the_view(self):
+        rows = [
+            {"title": "first imported task", "description": "a", "priority": 2},
+            {"title": "second imported task", "description": "a", "priority": 1},
+            {
+                "title": "done imported task",
+                "description": "a",
+                "priority": 1,
+                "completed": True,
+            },
+            {"title": "third imported task", "description": "a", "priority": 4},
+        ]
+        for user in (self.alice, self.bob):
+            for priority in (1, 2, 3, 5):
+                Task.objects.create(
+                    title=f"EXISTING TASK {priority}",
+                    description="a",
+                    priority=priority,
+                    user=user,
+                )
+        self.client.force_login(self.bob)
+        for row in rows:
+            self.client.post("/create-task/", row)
+
+        path = self.write(
+            "tasks.jsonl",
+            "\n".join(json.dumps({**row, "user": "alice"}) for row in rows),
+        )
+        stdout, _ = self.import_tasks(path, chunk_size=3)
+
+        self.assertEqual(self.tasks_of(self.alice), self.tasks_of(self.bob))
+        self.assertIn("Imported 4 tasks from 4 rows", stdout)
+        self.assertEqual(TaskCounter.objects.get(user=self.alice).pending, 7)
+        self.assertEqual(TaskCounter.objects.get(user=self.alice).completed, 1)
+
+    def test_skips_invalid_rows(self):
+        path = self.write(
+            "tasks.jsonl",
+            "\n".join(
+                [
+                    json.dumps({"title": "short", "description": "a", "priority": 1}),
+                    "not json",
+                    json.dumps({"title": "a valid task", "priority": 1}),
+                    json.dumps(
+                        {"title": "a valid task", "description": "a", "priority": 1}
+                    ),
+                    json.dumps(
+                        {
+                            "title": "someone else's",
+                            "description": "a",
+                            "priority": 1,
+                            "user": "carol",
+                        }
+                    ),
+                ]
+            ),
+        )
+        stdout, stderr = self.import_tasks(path, user="alice")
+
+        self.assertEqual(self.tasks_of(self.alice), [("A VALID TASK", 1, False)])
+        self.assertIn("4 invalid rows skipped", stdout)
+        self.assertIn("Row 1 skipped, title: Error: Length must be 10", stderr)
+        self.assertIn("Row 3 skipped, description:", stderr)
+        self.assertIn("Row 5 skipped, user: No user 'carol'", stderr)
+
+    def test_imports_an_export(self):
+        for priority in (1, 2, 4):
+            Task.objects.create(
+                title=f"EXPORTED TASK {priority}",
+                description='Call, the "plumber"\nagain',
+                priority=priority,
+                user=self.alice,
+            )
+        self.client.force_login(self.alice)
+        # Completed tasks would cascade the pending ones, as they do when created
+        export = self.client.get("/export/tasks.csv?status=pending").getvalue()
+
+        self.import_tasks(self.write("tasks.csv", export.decode()), user="bob")
+
+        self.assertEqual(self.tasks_of(self.bob), self.tasks_of(self.alice))
+
+    def test_resumes_after_the_committed_rows(self):
+        path = self.write(
+            "tasks.jsonl",
+            "\n".join(
+                json.dumps(
+                    {
+                        "title": f"imported task {number}",
+                        "description": "a",
+                        "priority": number,
+                    }
+                )
+                for number in range(1, 6)
+            ),
+        )
+        with open(f"{path}.progress", "w") as progress:
+            json.dump({"rows": 2}, progress)
+
+        with self.assertRaisesMessage(CommandError, "committed the first 2 rows"):
+            self.import_tasks(path, user="alice")
+        stdout, _ = self.import_tasks(path, user="alice", resume=True, chunk_size=2)
+
+        self.assertEqual(
+            [priority for _, priority, _ in self.tasks_of(self.alice)], [3, 4, 5]
+        )
+        self.assertIn("Resuming after row 2", stdout)
+        self.assertIn("4 rows read", stdout)
+        self.assertFalse(os.path.exists(f"{path}.progress"))
+
+
+class SoftDeleteTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.client.force_login(self.user)
+
+    def create_task(self, title, priority, **fields):
+        return Task.objects.create(
+            title=title, description="a", priority=priority, user=self.user, **fields
+        )
+
+    def test_deleting_keeps_the_task_out_of_the_lists(self):
+        task = self.create_task("DELETED TASK", 1)
+        TaskCounter.objects.rebuild(self.user)
+
+        self.client.post(f"/delete-task/{task.id}/")
+
+        task.refresh_from_db()
+        self.assertTrue(task.deleted)
+        self.assertEqual(list(Task.live.all()), [])
+        self.assertEqual(self.client.get(f"/detail-task/{task.id}").status_code, 404)
+        self.assertNotContains(self.client.get("/all_tasks/"), "DELETED TASK")
+        # The priority is free again
+        self.client.post(
+            "/create-task/",
+            {"title": "another task", "description": "a", "priority": 1},
+        )
+        self.assertEqual(Task.objects.pending().get().priority, 1)
+        self.assertEqual(Task.objects.get(id=task.id).priority, 1)
+
+    def test_purge_archives_old_finished_tasks(self):
+        old = timezone.now() - timedelta(days=40)
+        pending = self.create_task("OLD PENDING TASK", 1)
+        completed = self.create_task("OLD COMPLETED TASK", 1, completed=True)
+        deleted = self.create_task("OLD DELETED TASK", 2, deleted=True)
+        recent = self.create_task("RECENT COMPLETED TASK", 2, completed=True)
+        Task.objects.exclude(id=recent.id).update(created_date=old)
+        TaskCounter.objects.rebuild(self.user)
+
+        stdout = StringIO()
+        call_command("purge_tasks", days=30, batch_size=1, stdout=stdout)
+
+        self.assertEqual(
+            set(Task.objects.values_list("id", flat=True)), {pending.id, recent.id}
+        )
+        archived = TaskArchive.objects.order_by("task_id")
+        self.assertEqual(
+            list(archived.values_list("task_id", "title", "deleted", "user")),
+            [
+                (completed.id, "OLD COMPLETED TASK", False, self.user.id),
+                (deleted.id, "OLD DELETED TASK", True, self.user.id),
+            ],
+        )
+        self.assertEqual(archived.first().created_date, old)
+        self.assertIn("Archived 2 tasks", stdout.getvalue())
+        counter = TaskCounter.objects.get(user=self.user)
+        self.assertEqual(
+            (counter.pending, counter.completed, counter.deleted), (1, 1, 0)
+        )
+        self.assertEqual(Task.objects.search("old", self.user).count(), 1)
+
+
+@override_settings(SESSION_ENGINE="django.contrib.sessions.backends.cached_db")
+class WriteQueryBudgetTests(TaskTestCase):
+    # Besides its own statements, every write takes the user lookup (the
+    # session is cached), and a savepoint and its release (the transaction of
+    # the view, within the one of the test)
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.client.force_login(self.user)
+        # Today's stats exist after the first write of the day
+        TaskDailyStats.objects.add(self.user)
+        self.tasks = [
+            Task.objects.create(
+                title=f"TASK NUMBER {priority}",
+                description="a",
+                priority=priority,
+                user=self.user,
+            )
+            for priority in (1, 2, 3)
+        ]
+        TaskCounter.objects.rebuild(self.user)
+
+    def post(self, path, data, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.post(path, data)
+        self.assertEqual(response.status_code, 302)
+
+    def test_create(self):
+        # Lock, run lookup, insert, counter and stats updates
+        task = {"title": "a brand new task", "description": "a", "priority": 4}
+        self.post("/create-task/", task, 8)
+
+    def test_create_with_cascade(self):
+        # Lock, run lookup, the two steps of the shift, insert, counter and stats
+        # updates
+        task = {"title": "a brand new task", "description": "a", "priority": 1}
+        self.post("/create-task/", task, 10)
+
+    def test_update(self):
+        # Task lookup and update
+        task = {"title": "a renamed task", "description": "a", "priority": 2}
+        self.post(f"/update-task/{self.tasks[1].id}", task, 5)
+        self.assertEqual(Task.objects.get(id=self.tasks[1].id).title, "A RENAMED TASK")
+
+    def test_update_without_changes(self):
+        # User and task lookups only
+        task = {"title": "task number 2", "description": "a", "priority": 2}
+        self.post(f"/update-task/{self.tasks[1].id}", task, 2)
+
+    def test_update_with_cascade(self):
+        # Task lookup, lock, run lookup, the two steps of the shift and update
+        task = {"title": "task number 3", "description": "a", "priority": 1}
+        self.post(f"/update-task/{self.tasks[2].id}", task, 9)
+        self.assertEqual(
+            list(Task.objects.order_by("priority").values_list("title", flat=True)),
+            ["TASK NUMBER 3", "TASK NUMBER 1", "TASK NUMBER 2"],
+        )
+
+    def test_complete(self):
+        # Task lookup, update, counter and stats updates
+        self.post(f"/complete_task/{self.tasks[0].id}/", {}, 7)
+        self.assertTrue(Task.objects.get(id=self.tasks[0].id).completed)
+
+    def test_delete(self):
+        # Task lookup, update and counter update
+        self.post(f"/delete-task/{self.tasks[0].id}/", {}, 6)
+        self.assertTrue(Task.objects.get(id=self.tasks[0].id).deleted)
+
+
+class CompactPrioritiesTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.client.force_login(self.user)
+
+    def create_tasks(self, user, *priorities, **fields):
+        for priority in priorities:
+            Task.objects.create(
+                title=f"TASK NUMBER {priority}",
+                description="a",
+                priority=priority,
+                user=user,
+                **fields,
+            )
+
+    def pending_titles(self, user):
+        return list(
+            Task.objects.pending()
+            .filter(user=user)
+            .order_by("priority")
+            .values_list("priority", "title")
+        )
+
+    def test_renumbers_the_pending_tasks_of_every_user(self):
+        bob = User.objects.create_user(username="bob", password="pass12345")
+        carol = User.objects.create_user(username="carol", password="pass12345")
+        self.create_tasks(self.user, 2, 3, 7, 40)
+        self.create_tasks(self.user, 1, 5, completed=True)
+        self.create_tasks(self.user, 4, deleted=True)
+        self.create_tasks(bob, 1, 2, 3)
+        self.create_tasks(carol, 5)
+
+        stdout = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command("compact_priorities", batch_size=2, stdout=stdout)
+
+        self.assertEqual(
+            self.pending_titles(self.user),
+            [
+                (1, "TASK NUMBER 2"),
+                (2, "TASK NUMBER 3"),
+                (3, "TASK NUMBER 7"),
+                (4, "TASK NUMBER 40"),
+            ],
+        )
+        self.assertEqual(
+            sorted(
+                Task.objects.filter(user=self.user, completed=True).values_list(
+                    "priority", flat=True
+                )
+            ),
+            [1, 5],
+        )
+        self.assertEqual([p for p, _ in self.pending_titles(bob)], [1, 2, 3])
+        self.assertEqual([p for p, _ in self.pending_titles(carol)], [1])
+        self.assertIn("Renumbered 5 tasks of 2 users", stdout.getvalue())
+        # One window function update per user with gaps
+        window_updates = [q for q in queries if "ROW_NUMBER()" in q["sql"]]
+        self.assertEqual(len(window_updates), 2)
+
+    def test_renumbers_from_priority_zero(self):
+        bob = User.objects.create_user(username="bob", password="pass12345")
+        self.create_tasks(self.user, 2, 1, 0)
+        self.create_tasks(bob, 2, 1, 0)
+        compact_priorities(self.user)
+        call_command("compact_priorities", stdout=StringIO())
+        for user in (self.user, bob):
+            self.assertEqual(
+                self.pending_titles(user),
+                [(1, "TASK NUMBER 0"), (2, "TASK NUMBER 1"), (3, "TASK NUMBER 2")],
+            )
+
+    @override_settings(TASKS_COMPACT_PRIORITIES=True)
+    def test_completing_and_deleting_can_close_the_gap(self):
+        self.create_tasks(self.user, 1, 2, 3, 4)
+        first, second = Task.objects.filter(priority__in=[1, 2]).order_by("priority")
+
+        self.client.post(f"/complete_task/{first.id}/")
+        self.client.post(f"/delete-task/{second.id}/")
+
+        self.assertEqual(
+            self.pending_titles(self.user),
+            [(1, "TASK NUMBER 3"), (2, "TASK NUMBER 4")],
+        )
+
+    @override_settings(TASKS_COMPACT_PRIORITIES=True)
+    def test_completing_through_the_update_form_closes_the_gap(self):
+        self.create_tasks(self.user, 1, 2, 3)
+        first = Task.objects.get(priority=1)
+
+        self.client.post(
+            f"/update-task/{first.id}",
+            {
+                "title": first.title,
+                "description": "a",
+                "priority": 1,
+                "completed": "on",
+            },
+        )
+
+        self.assertTrue(Task.objects.get(id=first.id).completed)
+        self.assertEqual(
+            self.pending_titles(self.user),
+            [(1, "TASK NUMBER 2"), (2, "TASK NUMBER 3")],
+        )
+
+
+class AsyncViewTests(TransactionTestCase):
+    # The async views query in executor threads, which only see committed rows
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.other = User.objects.create_user(username="bob", password="pass12345")
+        self.tasks = [
+            Task.objects.create(
+                title=f"TASK NUMBER {priority}",
+                description="a",
+                priority=priority,
+                user=self.user,
+            )
+            for priority in (1, 2, 3)
+        ]
+        self.other_task = Task.objects.create(
+            title="NOT ALICE'S", description="a", priority=1, user=self.other
+        )
+        TaskCounter.objects.rebuild(self.user)
+        self.async_client = AsyncClient()
+        self.async_client.force_login(self.user)
+
+    @override_settings(REQUEST_TIMING_HEADER=True)
+    async def test_pending_tasks(self):
+        response = await self.async_client.get("/async/tasks/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertContains(response, "TASK NUMBER 1")
+        self.assertNotContains(response, "NOT ALICE&#x27;S")
+        # The queries of the executor threads are timed too
+        self.assertNotIn('desc="0 queries"', response["Server-Timing"])
+
+        response = await self.async_client.get("/async/tasks/")
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_pending_tasks_match_the_sync_view(self):
+        self.client.force_login(self.user)
+        sync_response = self.client.get("/tasks/")
+        get_cache().clear()
+        async_response = self.client.get("/async/tasks/")
+        self.assertEqual(async_response["X-Cache"], "MISS")
+        self.assertEqual(async_response.content, sync_response.content)
+
+    async def test_login_required(self):
+        response = await AsyncClient().get("/async/tasks/")
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith("/user/login"))
+
+    async def test_detail(self):
+        response = await self.async_client.get(f"/async/detail-task/{self.tasks[0].id}")
+        self.assertContains(response, "TASK NUMBER 1")
+        response = await self.async_client.get(
+            f"/async/detail-task/{self.other_task.id}"
+        )
+        self.assertEqual(response.status_code, 404)
+
+    async def test_complete(self):
+        response = await self.async_client.post(
+            f"/async/complete_task/{self.tasks[0].id}/"
+        )
+        self.assertEqual(response.status_code, 302)
+        response = await self.async_client.post(
+            f"/async/complete_task/{self.other_task.id}/"
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_complete_updates_the_counter(self):
+        client = Client()
+        client.force_login(self.user)
+        client.post(f"/async/complete_task/{self.tasks[0].id}/")
+        self.assertTrue(Task.objects.get(id=self.tasks[0].id).completed)
+        counter = TaskCounter.objects.get(user=self.user)
+        self.assertEqual((counter.pending, counter.completed), (2, 1))
+
+
+class SessionStorageTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        caches[settings.SESSION_CACHE_ALIAS].clear()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+
+    def count_views(self, requests):
+        # The views reported and the requests that saved the session
+        views, saves = [], 0
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get("/sessiontest")
+            views.append(int(response.content.split()[3]))
+            saves += any(
+                'INTO "django_session"' in query["sql"]
+                or query["sql"].startswith('UPDATE "django_session"')
+                for query in queries
+            )
+        return views, saves
+
+    @override_settings(SESSION_VIEWS_FLUSH_EVERY=3)
+    def test_saves_the_view_counter_every_few_views(self):
+        for engine in settings.SESSION_ENGINES.values():
+            with self.subTest(engine=engine), override_settings(SESSION_ENGINE=engine):
+                self.client = Client()
+                self.client.force_login(self.user)
+                with redirect_stdout(StringIO()):
+                    views, saves = self.count_views(7)
+                self.assertEqual(views, list(range(7)))
+                if engine != settings.SESSION_ENGINES["signed_cookies"]:
+                    self.assertEqual(saves, 2)
+
+    @override_settings(SESSION_ENGINE=settings.SESSION_ENGINES["cached_db"])
+    def test_cached_sessions_skip_the_session_lookup(self):
+        self.client.force_login(self.user)
+        Task.objects.create(title="A TASK", description="", priority=1, user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/tasks/")
+        self.assertFalse(
+            [query for query in queries if "django_session" in query["sql"]]
+        )
+
+    def test_process_local_caches_are_refused_for_shared_session_state(self):
+        self.assertEqual(check_sessions_cache(None), [])
+        with override_settings(
+            SESSION_ENGINE=settings.SESSION_ENGINES["cached_db"],
+            SESSION_VIEWS_FLUSH_EVERY=10,
+        ):
+            errors = check_sessions_cache(None)
+            self.assertEqual(
+                [error.id for error in errors], ["tasks.E001", "tasks.E002"]
+            )
+            shared = {
+                **settings.CACHES,
+                settings.SESSION_CACHE_ALIAS: {
+                    "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+                    "LOCATION": "sessions",
+                },
+            }
+            with override_settings(CACHES=shared):
+                self.assertEqual(check_sessions_cache(None), [])
+
+
+class StaticFilesTests(TaskTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.TemporaryDirectory()
+        cls.collected = override_settings(
+            STATIC_ROOT=cls.static_root.name,
+            STATICFILES_STORAGE="tasks.storage.CompressedManifestStaticFilesStorage",
+        )
+        cls.collected.enable()
+        call_command(
+            "collectstatic", interactive=False, ignore_patterns=["admin"], verbosity=0
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.collected.disable()
+        cls.static_root.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.client.force_login(self.user)
+
+    def test_built_files_are_up_to_date(self):
+        call_command("build_static", check=True, stderr=StringIO())
+
+    def test_pages_load_nothing_from_cdns(self):
+        Task.objects.create(title="TASK", description="", priority=1, user=self.user)
+        response = self.client.get("/tasks/")
+        self.assertNotContains(response, "cdn.tailwindcss.com")
+        self.assertNotContains(response, "iconify")
+        self.assertContains(response, staticfiles_storage.url("tasks/app.css"))
+        self.assertContains(
+            response, staticfiles_storage.url("tasks/icons.svg") + "#edit"
+        )
+
+    def test_collected_files_are_hashed_and_compressed(self):
+        url = staticfiles_storage.url("tasks/app.css")
+        self.assertRegex(url, r"^/static/tasks/app\.[0-9a-f]{12}\.css$")
+        path = os.path.join(self.static_root.name, url[len("/static/") :])
+        with open(path, "rb") as original, open(path + ".gz", "rb") as compressed:
+            content = original.read()
+            self.assertEqual(gzip.decompress(compressed.read()), content)
+
+    def test_hashed_files_are_cached_for_good(self):
+        url = staticfiles_storage.url("tasks/app.css")
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertIn("immutable", response["Cache-Control"])
+        content = gzip.decompress(b"".join(response.streaming_content))
+        self.assertIn(b".flex{display:flex}", content)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip;q=0")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_unhashed_files_are_revalidated(self):
+        response = self.client.get("/static/tasks/app.css")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "no-cache")
+
+    def test_missing_files(self):
+        self.assertEqual(self.client.get("/static/tasks/none.css").status_code, 404)
+        self.assertEqual(self.client.get("/static/../manage.py").status_code, 404)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReadReplicaTests(TransactionTestCase):
+    # Under tests the replica alias is a second connection to the test database
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        Task.objects.create(
+            title="TASK NUMBER 1", description="", priority=1, user=self.user
+        )
+        TaskCounter.objects.rebuild(self.user)
+        self.client.force_login(self.user)
+
+    def get(self, path):
+        with CaptureQueriesContext(connections["default"]) as primary:
+            with CaptureQueriesContext(connections["replica"]) as replica:
+                response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return primary, replica
+
+    def test_get_requests_read_from_the_replica(self):
+        primary, replica = self.get("/tasks/")
+        self.assertTrue(any("tasks_task" in query["sql"] for query in replica))
+        # Only the session and the user, read before the routing starts
+        self.assertFalse([query for query in primary if "tasks_" in query["sql"]])
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        response = self.client.post(
+            "/create-task/",
+            {"title": "TASK NUMBER 2", "description": "Some details", "priority": 1},
+        )
+        self.assertEqual(response.status_code, 302)
+        cookie = response.cookies[settings.DATABASE_PRIMARY_COOKIE]
+        self.assertEqual(cookie["max-age"], settings.DATABASE_REPLICA_LAG_SECONDS)
+
+        primary, replica = self.get("/tasks/")
+        self.assertEqual(len(replica), 0)
+        self.assertTrue(any("tasks_task" in query["sql"] for query in primary))
+
+    def test_writes_pin_the_user_on_every_device(self):
+        other_device = Client()
+        other_device.force_login(self.user)
+        self.client.post(
+            "/create-task/",
+            {"title": "TASK NUMBER 2", "description": "Some details", "priority": 1},
+        )
+
+        self.client = other_device
+        primary, replica = self.get("/tasks/")
+        self.assertEqual(len(replica), 0)
+        self.assertTrue(any("tasks_task" in query["sql"] for query in primary))
+
+        # Once the replicas have caught up
+        get_cache().delete(primary_pin_key(self.user))
+        primary, replica = self.get("/completed_tasks/")
+        self.assertTrue(any("tasks_task" in query["sql"] for query in replica))
+
+    def test_reads_without_writes_do_not_pin(self):
+        response = self.client.get("/tasks/")
+        self.assertNotIn(settings.DATABASE_PRIMARY_COOKIE, response.cookies)
+
+    def test_router(self):
+        token = request_routing.set(RoutingState("replica"))
+        try:
+            self.assertEqual(router.db_for_read(Task), "replica")
+            self.assertEqual(router.db_for_read(Session), "default")
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Task), "default")
+            self.assertEqual(router.db_for_write(Session), "default")
+            self.assertEqual(router.db_for_read(Task), "replica")
+            self.assertEqual(router.db_for_write(Task), "default")
+            # Reads its own writes
+            self.assertEqual(router.db_for_read(Task), "default")
+        finally:
+            request_routing.reset(token)
+        # Outside of requests
+        self.assertEqual(router.db_for_read(Task), "default")
+        self.assertFalse(router.allow_migrate("replica", "tasks"))
+
+    def test_sync_replica(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "primary.sqlite3")
+            target = os.path.join(directory, "replica.sqlite3")
+            with closing(sqlite3.connect(source)) as primary:
+                primary.execute("CREATE TABLE task (title TEXT)")
+                primary.execute("INSERT INTO task VALUES ('TASK NUMBER 1')")
+                primary.commit()
+            copy_sqlite_database(source, target)
+            with closing(sqlite3.connect(target)) as replica:
+                rows = replica.execute("SELECT title FROM task").fetchall()
+            self.assertEqual(rows, [("TASK NUMBER 1",)])
+
+        # Under tests the replica is the test database itself
+        with self.assertRaisesMessage(CommandError, "primary database file itself"):
+            call_command("sync_replica", stdout=StringIO())
+
+
+class TaskAdminTests(TaskTestCase):
+    changelist = "/admin/tasks/task/"
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser(
+            username="admin", password="pass12345"
+        )
+        self.client.force_login(self.admin)
+        self.alice = User.objects.create_user(username="alice", password="pass12345")
+        self.bob = User.objects.create_user(username="bob", password="pass12345")
+
+    def create_tasks(self, user, *priorities, **fields):
+        tasks = [
+            Task.objects.create(
+                title=f"TASK NUMBER {priority}",
+                description="a",
+                priority=priority,
+                user=user,
+                **fields,
+            )
+            for priority in priorities
+        ]
+        TaskCounter.objects.rebuild(user)
+        return tasks
+
+    def run_action(self, action, tasks):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                self.changelist,
+                {"action": action, "_selected_action": [task.id for task in tasks]},
+            )
+        self.assertEqual(response.status_code, 302)
+        return [
+            query["sql"]
+            for query in queries
+            if query["sql"].replace('"', "").lstrip().startswith("UPDATE tasks_task ")
+        ]
+
+    def test_changelist_queries_do_not_grow_with_the_rows(self):
+        self.create_tasks(self.alice, 1, 2)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(self.changelist).status_code, 200)
+        self.create_tasks(self.alice, *range(3, 40))
+        self.create_tasks(self.bob, *range(1, 40))
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(self.changelist)
+        self.assertEqual(len(many), len(few))
+        self.assertContains(response, f'href="?user={self.bob.id}"')
+        self.assertNotContains(response, "delete_selected")
+
+    def test_filters(self):
+        self.create_tasks(self.alice, 1, 2, 12)
+        self.create_tasks(self.alice, 3, completed=True)
+        self.create_tasks(self.bob, 1)
+        response = self.client.get(
+            self.changelist, {"user": self.alice.id, "state": "pending"}
+        )
+        self.assertEqual(response.context["cl"].result_count, 3)
+        response = self.client.get(
+            self.changelist, {"user": self.alice.id, "priority": "11+"}
+        )
+        self.assertEqual(
+            [task.title for task in response.context["cl"].result_list],
+            ["TASK NUMBER 12"],
+        )
+
+    def test_search_uses_the_full_text_index(self):
+        self.create_tasks(self.alice, 1, 2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.changelist, {"q": "number 2"})
+        self.assertEqual(
+            [task.title for task in response.context["cl"].result_list],
+            ["TASK NUMBER 2"],
+        )
+        self.assertTrue(any("MATCH" in query["sql"] for query in queries))
+
+    def test_estimated_count(self):
+        tasks = self.create_tasks(self.alice, 1, 2, 3)
+        tasks[0].delete()
+        paginator = EstimatedCountPaginator(Task.objects.order_by("id"), 10)
+        self.assertEqual(paginator.count, 2)
+
+        paginator = EstimatedCountPaginator(Task.objects.order_by("id"), 10)
+        paginator.exact_below = 0
+        # The last id, the deleted task included
+        self.assertEqual(paginator.count, tasks[-1].id)
+
+        # Filtered changelists are counted
+        paginator = EstimatedCountPaginator(
+            Task.objects.filter(priority=2).order_by("id"), 10
+        )
+        paginator.exact_below = 0
+        self.assertEqual(paginator.count, 1)
+
+    def test_complete_action(self):
+        tasks = self.create_tasks(self.alice, *range(1, 21))
+        tasks += self.create_tasks(self.bob, 1, 2)
+        updates = self.run_action("complete_tasks", tasks[5:])
+        self.assertEqual(len(updates), 1)
+
+        self.assertEqual(Task.objects.filter(completed=True).count(), 17)
+        counter = TaskCounter.objects.get(user=self.alice)
+        self.assertEqual((counter.pending, counter.completed), (5, 15))
+        counter = TaskCounter.objects.get(user=self.bob)
+        self.assertEqual((counter.pending, counter.completed), (0, 2))
+        stats = TaskDailyStats.objects.get(user=self.alice)
+        self.assertEqual((stats.created, stats.completed), (0, 15))
+
+    def test_soft_delete_action(self):
+        tasks = self.create_tasks(self.alice, 1, 2, 3)
+        tasks += self.create_tasks(self.alice, 4, completed=True)
+        updates = self.run_action("soft_delete_tasks", tasks[1:])
+        self.assertEqual(len(updates), 1)
+
+        self.assertEqual(Task.live.count(), 1)
+        counter = TaskCounter.objects.get(user=self.alice)
+        self.assertEqual(
+            (counter.pending, counter.completed, counter.deleted), (1, 0, 3)
+        )
+
+    def test_add_and_change_pages_cascade_and_count(self):
+        first, second = self.create_tasks(self.alice, 1, 2)
+        response = self.client.post(
+            "/admin/tasks/task/add/",
+            {
+                "title": "ADDED IN THE ADMIN",
+                "description": "a",
+                "priority": 1,
+                "user": self.alice.id,
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        added = Task.objects.get(title="ADDED IN THE ADMIN")
+        self.assertEqual(
+            list(
+                Task.objects.filter(user=self.alice)
+                .order_by("priority")
+                .values_list("id", "priority")
+            ),
+            [(added.id, 1), (first.id, 2), (second.id, 3)],
+        )
+        counter = TaskCounter.objects.get(user=self.alice)
+        self.assertEqual((counter.pending, counter.completed), (3, 0))
+
+        # Moved to another user, at a priority taken there
+        bobs = self.create_tasks(self.bob, 1)[0]
+        response = self.client.post(
+            f"/admin/tasks/task/{added.id}/change/",
+            {
+                "title": added.title,
+                "description": "a",
+                "priority": 1,
+                "user": self.bob.id,
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        bobs.refresh_from_db()
+        self.assertEqual(bobs.priority, 2)
+        self.assertEqual(TaskCounter.objects.get(user=self.alice).pending, 2)
+        self.assertEqual(TaskCounter.objects.get(user=self.bob).pending, 2)
+
+        self.client.force_login(self.bob)
+        response = self.client.post(f"/complete_task/{added.id}/")
+        self.assertEqual(response.status_code, 302)
+        counter = TaskCounter.objects.get(user=self.bob)
+        self.assertEqual((counter.pending, counter.completed), (1, 1))
+
+    def test_delete_page_soft_deletes(self):
+        task = self.create_tasks(self.alice, 1, 2)[0]
+        response = self.client.post(
+            f"/admin/tasks/task/{task.id}/delete/", {"post": "yes"}
+        )
+        self.assertEqual(response.status_code, 302)
+        task.refresh_from_db()
+        self.assertTrue(task.deleted)
+        counter = TaskCounter.objects.get(user=self.alice)
+        self.assertEqual((counter.pending, counter.deleted), (1, 1))
+
+    def test_compact_priorities_action(self):
+        tasks = self.create_tasks(self.alice, 2, 5, 9)
+        tasks += self.create_tasks(self.bob, 3, 4)
+        updates = self.run_action("compact_task_priorities", tasks[:1] + tasks[3:4])
+        # Renumbering the tasks of both users, then bringing them down
+        self.assertEqual(len(updates), 2)
+        for user in (self.alice, self.bob):
+            self.assertEqual(
+                list(
+                    Task.objects.filter(user=user)
+                    .order_by("priority")
+                    .values_list("priority", flat=True)
+                ),
+                list(range(1, Task.objects.filter(user=user).count() + 1)),
+            )
+
+
+class TaskStatsTests(TaskTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="alice", password="pass12345")
+        self.client.force_login(self.user)
+
+    def create(self, priority, completed=False):
+        task = {"title": "a brand new task", "description": "a", "priority": priority}
+        if completed:
+            task["completed"] = "on"
+        self.client.post("/create-task/", task)
+        return Task.objects.get(user=self.user, priority=priority)
+
+    def test_writes_update_the_daily_stats(self):
+        first = self.create(1)
+        self.create(2)
+        self.create(3, completed=True)
+        Task.objects.filter(pk=first.pk).update(
+            created_at=timezone.now() - timedelta(hours=2)
+        )
+        self.client.post(f"/complete_task/{first.id}/")
+
+        stats = TaskDailyStats.objects.get(user=self.user)
+        self.assertEqual(stats.date, timezone.localdate())
+        self.assertEqual((stats.created, stats.completed), (3, 2))
+        self.assertAlmostEqual(stats.completion_seconds, 7200, delta=5)
+
+        response = self.client.get("/api/stats/", {"days": 7})
+        data = response.json()
+        self.assertEqual(len(data["days"]), 7)
+        self.assertEqual(data["days"][-1]["date"], timezone.localdate().isoformat())
+        self.assertEqual((data["created"], data["completed"]), (3, 2))
+        self.assertEqual(data["completion_rate"], 0.667)
+        self.assertAlmostEqual(data["average_completion_seconds"], 3600, delta=5)
+
+    def test_stats_queries_do_not_grow_with_the_tasks(self):
+        self.create(1)
+        with CaptureQueriesContext(connection) as few:
+            response = self.client.get("/stats/")
+        self.assertContains(response, "1 created, 0 completed")
+        for priority in range(2, 30):
+            self.create(priority, completed=priority % 2 == 0)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get("/stats/")
+        self.assertContains(response, "29 created, 14 completed")
+        self.assertEqual(len(many), len(few))
+        self.assertFalse(any('"tasks_task"' in query["sql"] for query in many))
+
+    def test_days_must_be_a_number(self):
+        self.assertEqual(self.client.get("/api/stats/?days=a").status_code, 400)
+        self.assertEqual(len(self.client.get("/api/stats/?days=0").json()["days"]), 1)
+        self.assertEqual(
+            len(self.client.get("/api/stats/?days=1000").json()["days"]), 365
+        )
+
+    def test_rebuild_matches_the_incremental_stats(self):
+        for priority in range(1, 6):
+            self.create(priority, completed=priority > 3)
+        self.client.post(f"/complete_task/{Task.objects.get(priority=1).id}/")
+        yesterday = timezone.now() - timedelta(days=1)
+        TaskArchive.objects.create(
+            task_id=10**6,
+            title="an archived task",
+            description="a",
+            completed=True,
+            deleted=False,
+            user=self.user,
+            priority=1,
+            created_at=yesterday,
+            created_date=yesterday,
+        )
+        today = list(TaskDailyStats.objects.values_list("date", "created", "completed"))
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command("rebuild_task_stats", batch_size=1, stdout=StringIO())
+        rows = TaskDailyStats.objects.order_by("date")
+        self.assertEqual(
+            [(stats.date, stats.created, stats.completed) for stats in rows],
+            [(timezone.localdate(yesterday), 1, 1), *today],
+        )
+        # The user's counter is locked before the tasks are counted
+        statements = [query["sql"] for query in queries]
+        lock = next(i for i, sql in enumerate(statements) if sql.startswith("UPDATE"))
+        count = next(i for i, sql in enumerate(statements) if "COUNT(" in sql)
+        self.assertLess(lock, count)
@@ -1,139 +1,450 @@
-from itertools import chain
-from django.http import HttpResponse, HttpResponseRedirect
+import csv
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import timedelta
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotAllowed,
+    HttpResponseNotModified,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.utils import timezone
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
 from django.utils.safestring import mark_safe
-from tasks.models import Task
-
+from tasks.cache import (
+    get_cache,
+    get_list_version,
+    get_or_set_list_value,
+    invalidate_lists,
+    list_page_key,
+    record,
+)
+from tasks.models import Task, TaskCounter, TaskDailyStats, time_to_complete
+
+from django.views.generic.base import TemplateView, View
 from django.views.generic.list import ListView
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.forms import ModelForm
-from django.core.exceptions import ValidationError, ObjectDoesNotExist
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
 from django.views.generic.detail import DetailView
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
-from django.contrib.auth.views import LoginView
+from django.contrib.auth.views import LoginView, redirect_to_login
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db import transaction
+from django.db import close_old_connections, connection, connections, transaction
+from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
+from django.template.response import TemplateResponse
+from django.db.models import (
+    Case,
+    Count,
+    Exists,
+    F,
+    Max,
+    Min,
+    OuterRef,
+    Q,
+    Sum,
+    When,
+)
 
 
 class AuthorizedTaskManager(LoginRequiredMixin):
     def get_queryset(self):
-        tasks = Task.objects.filter(
-            deleted=False, completed=False, user=self.request.user
-        )
+        tasks = Task.objects.pending().filter(user=self.request.user)
         return tasks
 
 
 class TaskProgressManager:
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["completed_tasks_count"] = Task.objects.filter(
-            completed=True, user=self.request.user
-        ).count()
-        context["total_tasks_count"] = (
-            context["completed_tasks_count"]
-            + Task.objects.filter(
-                deleted=False, completed=False, user=self.request.user
-            ).count()
-        )
+        # A primary key lookup on the user's counters instead of counting tasks
+        try:
+            counter = TaskCounter.objects.get(user=self.request.user)
+        except TaskCounter.DoesNotExist:
+            counter = TaskCounter.objects.rebuild(self.request.user)
+        context["completed_tasks_count"] = counter.completed
+        context["total_tasks_count"] = counter.completed + counter.pending
         return context
 
 
-def handlePriorityCascading(id, new_priority, user):
-    with transaction.atomic():
-        # Fetching all pending tasks of the user
-        pending_tasks = Task.objects.filter(
-            user=user, completed=False, deleted=False
-        ).select_for_update()
+class CursorPage:
+    # Quacks like django's Page for the templates, but only knows its neighbours
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
 
-        pending_tasks = pending_tasks.exclude(id=id)
+    def has_next(self):
+        return self.next_cursor is not None
 
-        tasksToUpdate = []
+    def has_previous(self):
+        return self.previous_cursor is not None
 
-        while True:
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginationManager:
+    # Pages are fetched with WHERE (priority, id) > (last seen) instead of an
+    # OFFSET and without counting the tasks. Page number links (?page=N) and
+    # search results still use django's offset paginator.
+    cursor_kwarg = "cursor"
+    cursor_ordering = ("priority", "id")
+    cursor_salt = "tasks.cursor"
+
+    def paginate_queryset(self, queryset, page_size):
+        # Search results are ordered by relevance, which is no cursor key
+        ordered_by_cursor = tuple(queryset.query.order_by) == self.cursor_ordering
+        if self.page_kwarg in self.request.GET or not ordered_by_cursor:
+            return super().paginate_queryset(queryset, page_size)
+
+        key, reverse = None, False
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        if cursor:
             try:
-                taskToUpdate = pending_tasks.get(priority=new_priority)
-                taskToUpdate.priority += 1
-                tasksToUpdate.append(taskToUpdate)
-                new_priority += 1
+                key, reverse = signing.loads(cursor, salt=self.get_cursor_salt())
+            except (signing.BadSignature, TypeError, ValueError):
+                raise Http404("Invalid cursor")
+            if len(key) != len(self.cursor_ordering):
+                raise Http404("Invalid cursor")
+
+        ordering = [f"-{field}" if reverse else field for field in self.cursor_ordering]
+        tasks = queryset.order_by(*ordering)
+        if key is not None:
+            tasks = tasks.filter(self.get_cursor_filter(key, reverse))
+
+        # One extra row tells whether there is a page after this one
+        tasks = list(tasks[: page_size + 1])
+        has_more = len(tasks) > page_size
+        tasks = tasks[:page_size]
+        if reverse:
+            tasks.reverse()
+
+        has_next, has_previous = (True, has_more) if reverse else (has_more, bool(key))
+        if not tasks:
+            has_next = has_previous = False
+        page = CursorPage(
+            tasks,
+            next_cursor=self.make_cursor(tasks[-1], False) if has_next else None,
+            previous_cursor=self.make_cursor(tasks[0], True) if has_previous else None,
+        )
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def get_cursor_filter(self, key, reverse):
+        lookup = "lt" if reverse else "gt"
+        first_field = self.cursor_ordering[0]
+        # The redundant bound on the first field lets the index seek to the cursor
+        condition = Q(**{f"{first_field}__{lookup}e": key[0]})
+        after_key = Q()
+        for position, field in enumerate(self.cursor_ordering):
+            equal_fields = dict(zip(self.cursor_ordering[:position], key))
+            after_key |= Q(**equal_fields, **{f"{field}__{lookup}": key[position]})
+        return condition & after_key
+
+    def get_cursor_salt(self):
+        # The cursor of one list is no position in another, whose ordering may
+        # not even have the same fields
+        return f"{self.cursor_salt}.{type(self).__name__}"
+
+    def make_cursor(self, task, reverse):
+        key = [getattr(task, field) for field in self.cursor_ordering]
+        return signing.dumps([key, reverse], salt=self.get_cursor_salt())
+
+
+class TaskListCacheManager:
+    # Serves the rendered list page from the cache until the user's tasks change
+    def get(self, request, *args, **kwargs):
+        cache = get_cache()
+        key = list_page_key(request.user, type(self).__name__, request.GET)
+        content = cache.get(key)
+        if content is not None:
+            record("hits")
+            response = HttpResponse(content)
+            response["X-Cache"] = "HIT"
+            return response
+
+        record("misses")
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            # Cached once rendered, the rendering is left to the handler
+            response.add_post_render_callback(
+                lambda response: cache.set(
+                    key, response.content, settings.TASK_LIST_CACHE_TIMEOUT
+                )
+            )
+        response["X-Cache"] = "MISS"
+        return response
+
+
+class ConditionalGetManager:
+    # Answers If-None-Match / If-Modified-Since with a 304 before any rendering
+    send_last_modified = True
+
+    def get_validators(self):
+        # The number of tasks of the user and the time of the last change,
+        # cached until the user's next write
+        def count_tasks():
+            tasks = Task.objects.filter(user=self.request.user).aggregate(
+                count=Count("id"), last_modified=Max("created_date")
+            )
+            return tasks["count"], tasks["last_modified"]
+
+        return get_or_set_list_value(self.request.user, "validators", count_tasks)
+
+    def get(self, request, *args, **kwargs):
+        count, last_modified = self.get_validators()
+        # The list version changes with every write of the user, the priorities
+        # a cascade moves included, which leaves their created_date alone
+        etag = f"{request.user.pk}-{get_list_version(request.user)}-{count}"
+        timestamp = None
+        if last_modified is not None:
+            etag += f"-{last_modified.timestamp():.6f}"
+            if self.send_last_modified:
+                timestamp = int(last_modified.timestamp())
+        etag = f'"{etag}"'
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        response["ETag"] = etag
+        if timestamp is not None:
+            response["Last-Modified"] = http_date(timestamp)
+        return response
 
-            except ObjectDoesNotExist:
-                break
 
-        Task.objects.bulk_update(tasksToUpdate, ["priority"])
+def handlePriorityCascading(id, new_priority, user):
+    # id is the task being updated, or None for a new task. The views call it
+    # in their transaction, a savepoint would only add two statements.
+    with transaction.atomic(savepoint=False):
+        # Concurrent cascades of the same user would read the same run
+        TaskCounter.objects.lock(user)
+
+        # Fetching all pending tasks of the user
+        user_pending_tasks = Task.objects.pending().filter(user=user)
+        pending_tasks = user_pending_tasks
+        if id is not None:
+            pending_tasks = user_pending_tasks.exclude(id=id)
+
+        # A task is the end of a run when no task holds the priority right after it
+        next_priority_taken = pending_tasks.filter(priority=OuterRef("priority") + 1)
+
+        # One query finds whether new_priority is taken, where its run ends and
+        # the highest priority in use after it
+        run = pending_tasks.filter(priority__gte=new_priority).aggregate(
+            start=Min("priority"),
+            end=Min(Case(When(~Exists(next_priority_taken), then="priority"))),
+            highest=Max("priority"),
+        )
+
+        if run["start"] != new_priority:
+            return
+
+        # The unique constraint is checked row by row, so shifting the run by one
+        # in place would collide with itself. The run (and the task being updated,
+        # which is saved with its new priority afterwards) is first moved above
+        # every priority in use, then brought back down one slot higher. Two
+        # above, a task updated from priority 0 would be parked on the run's
+        # last slot at one.
+        offset = run["highest"] + 2
+        moved_tasks = Q(priority__range=(run["start"], run["end"]))
+        if id is not None:
+            moved_tasks |= Q(id=id)
+        user_pending_tasks.filter(moved_tasks).update(priority=F("priority") + offset)
+        pending_tasks.filter(priority__gt=run["highest"]).update(
+            priority=F("priority") - offset + 1
+        )
+
+
+# Renumbers the pending tasks of users 1..N in their order. Rows are updated
+# in no particular order and the unique constraint is checked row by row, so
+# the tasks out of place first move above every priority in use, at their new
+# priority plus an offset, and then down by the offset.
+COMPACT_PRIORITIES_SQL = f"""
+UPDATE {Task._meta.db_table} SET priority = %s + ranked.position
+FROM (
+    SELECT id, ROW_NUMBER() OVER (
+        PARTITION BY user_id ORDER BY priority, id
+    ) AS position
+    FROM {Task._meta.db_table}
+    WHERE user_id IN ({{users}}) AND NOT completed AND NOT deleted
+) AS ranked
+WHERE {Task._meta.db_table}.id = ranked.id
+    AND {Task._meta.db_table}.priority <> ranked.position
+"""
+
+
+def compact_priorities(*users):
+    # One statement for any number of users
+    with transaction.atomic(savepoint=False):
+        for user in users:
+            TaskCounter.objects.lock(user)
+        user_ids = [user.pk for user in users]
+        pending_tasks = Task.objects.pending().filter(user__in=user_ids)
+        tasks = pending_tasks.aggregate(highest=Max("priority"), count=Count("id"))
+        if tasks["highest"] is None:
+            return 0
+        # Above the final 1..N too, which is above the highest priority unless
+        # priority 0 is in use
+        offset = max(tasks["highest"], tasks["count"]) + 1
+        sql = COMPACT_PRIORITIES_SQL.format(users=", ".join(["%s"] * len(user_ids)))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [offset, *user_ids])
+            moved = cursor.rowcount
+        if moved:
+            pending_tasks.filter(priority__gt=offset).update(
+                priority=F("priority") - offset
+            )
+        return moved
 
 
 ################################ Pending tasks ##########################################
-class GenericTaskView(LoginRequiredMixin, TaskProgressManager, ListView):
-    queryset = Task.objects.filter(deleted=False, completed=False)
+class GenericTaskView(
+    LoginRequiredMixin,
+    ConditionalGetManager,
+    TaskListCacheManager,
+    TaskProgressManager,
+    CursorPaginationManager,
+    ListView,
+):
+    queryset = Task.objects.pending()
     template_name = "pending_tasks.html"
     context_object_name = "tasks"
+    extra_context = {"list_name": "pending"}
     paginate_by = 5
 
     def get_queryset(self):
         search_term = self.request.GET.get("search")
-        tasks = Task.objects.filter(
-            deleted=False, completed=False, user=self.request.user
-        ).order_by("priority")
+        # The list only shows the title, the date and the priority
+        tasks = (
+            Task.objects.pending()
+            .filter(user=self.request.user)
+            .defer("description")
+            .order_by("priority", "id")
+        )
 
         if search_term:
-            tasks = tasks.filter(title__icontains=search_term)
+            tasks = tasks.search(search_term, self.request.user).order_by(
+                "search_rank", "priority", "id"
+            )
 
         return tasks
 
 
 ################################ Completed tasks ##########################################
-class GenericCompletedTaskView(LoginRequiredMixin, TaskProgressManager, ListView):
-    queryset = Task.objects.filter(completed=True)
+class GenericCompletedTaskView(
+    LoginRequiredMixin,
+    ConditionalGetManager,
+    TaskListCacheManager,
+    TaskProgressManager,
+    CursorPaginationManager,
+    ListView,
+):
+    queryset = Task.live.filter(completed=True)
     template_name = "completed_tasks.html"
     context_object_name = "tasks"
+    extra_context = {"list_name": "completed"}
     paginate_by = 5
 
     def get_queryset(self):
         search_term = self.request.GET.get("search")
-        tasks = Task.objects.filter(completed=True, user=self.request.user).order_by(
-            "priority"
+        tasks = (
+            Task.live.filter(completed=True, user=self.request.user)
+            .defer("description")
+            .order_by("priority", "id")
         )
 
         if search_term:
-            tasks = tasks.filter(title__icontains=search_term)
+            tasks = tasks.search(search_term, self.request.user).order_by(
+                "search_rank", "priority", "id"
+            )
 
         return tasks
 
 
 ################################ All tasks ##########################################
-class GenericAllTaskView(LoginRequiredMixin, TaskProgressManager, ListView):
-    queryset = Task.objects.filter(deleted=False)
+class GenericAllTaskView(
+    LoginRequiredMixin,
+    ConditionalGetManager,
+    TaskListCacheManager,
+    TaskProgressManager,
+    CursorPaginationManager,
+    ListView,
+):
+    queryset = Task.live.all()
     template_name = "all_tasks.html"
     context_object_name = "tasks"
+    extra_context = {"list_name": "all"}
     paginate_by = 5
+    # Pending tasks (completed=False) come before the completed ones
+    cursor_ordering = ("completed", "priority", "id")
 
     def get_queryset(self):
         search_term = self.request.GET.get("search")
-        active_tasks = Task.objects.filter(
-            deleted=False, completed=False, user=self.request.user
-        ).order_by("priority")
-        completed_tasks = Task.objects.filter(
-            completed=True, user=self.request.user
-        ).order_by("priority")
+        tasks = (
+            Task.live.filter(user=self.request.user)
+            .defer("description")
+            .order_by(*self.cursor_ordering)
+        )
 
         if search_term:
-            active_tasks = active_tasks.filter(title__icontains=search_term)
-            completed_tasks = completed_tasks.filter(title__icontains=search_term)
-
-        tasks = list(chain(active_tasks, completed_tasks))
+            tasks = tasks.search(search_term, self.request.user).order_by(
+                "completed", "search_rank", "priority", "id"
+            )
 
         return tasks
 
 
 ################################ Task Detail View ##########################################
-class GenericTaskDetailView(DetailView):
+class GenericTaskDetailView(LoginRequiredMixin, ConditionalGetManager, DetailView):
     model = Task
     template_name = "task_detail.html"
+    # The priority of a task moves with the cascades of the others, without a
+    # new created_date. Only the ETag tells.
+    send_last_modified = False
 
     # The details of both completed and pending tasks can be viewed
     def get_queryset(self):
-        tasks = Task.objects.filter(deleted=False, user=self.request.user)
+        tasks = Task.live.filter(user=self.request.user)
         return tasks
 
+    def get_validators(self):
+        # Only this task matters, a missing one falls through to the 404
+        last_modified = (
+            self.get_queryset()
+            .filter(pk=self.kwargs["pk"])
+            .values_list("created_date", flat=True)
+            .first()
+        )
+        return 1 if last_modified else 0, last_modified
+
 
 ################################ Add a task ##########################################
 class TaskCreateForm(ModelForm):
@@ -169,15 +480,37 @@ class GenericTaskCreateView(LoginRequiredMixin, CreateView):
     template_name = "task_create.html"
     success_url = "/tasks"
 
+    def get_initial(self):
+        # Only the empty form shows the initial priority
+        if self.request.method != "GET":
+            return super().get_initial()
+        # Defaulting to the priority right after the user's last pending task
+        # means a new task which keeps the default cascades nothing, instead of
+        # shifting every task from priority 1 onwards
+        highest_priority = (
+            Task.objects.pending()
+            .filter(user=self.request.user)
+            .aggregate(highest=Max("priority"))["highest"]
+        )
+        return {**super().get_initial(), "priority": (highest_priority or 0) + 1}
+
     def form_valid(self, form):
         new_priority = form.cleaned_data["priority"]
 
         self.object = form.save(commit=False)
         self.object.user = self.request.user
 
-        handlePriorityCascading(self.object.id, new_priority, self.request.user)
-
-        self.object.save()
+        with transaction.atomic():
+            handlePriorityCascading(None, new_priority, self.request.user)
+            self.object.save()
+            if self.object.completed:
+                TaskCounter.objects.add(self.request.user, completed=1)
+            else:
+                TaskCounter.objects.add(self.request.user, pending=1)
+            TaskDailyStats.objects.add(
+                self.request.user, created=1, completed=int(self.object.completed)
+            )
+            invalidate_lists(self.request.user)
         return HttpResponseRedirect(self.get_success_url())
 
 
@@ -189,13 +522,34 @@ class GenericTaskUpdateView(AuthorizedTaskManager, UpdateView):
     success_url = "/tasks"
 
     def form_valid(self, form):
-        existing_priority = Task.objects.get(id=self.object.id).priority
-        new_priority = form.cleaned_data["priority"]
-
-        if existing_priority != new_priority:
-            handlePriorityCascading(self.object.id, new_priority, self.request.user)
-
-        self.object = form.save()
+        # The form holds the values the task was loaded with, the task already
+        # has the submitted ones
+        changed_fields = [
+            field
+            for field in form.Meta.fields
+            if form.initial[field] != form.cleaned_data[field]
+        ]
+        if not changed_fields:
+            return HttpResponseRedirect(self.get_success_url())
+
+        with transaction.atomic():
+            if "priority" in changed_fields:
+                handlePriorityCascading(
+                    self.object.id, self.object.priority, self.request.user
+                )
+
+            self.object.save(update_fields=[*changed_fields, "created_date"])
+            # Only pending tasks can be updated, but the form can complete them
+            if self.object.completed:
+                TaskCounter.objects.add(self.request.user, pending=-1, completed=1)
+                TaskDailyStats.objects.add(
+                    self.request.user,
+                    completed=1,
+                    completion_time=self.object.created_date - self.object.created_at,
+                )
+                if settings.TASKS_COMPACT_PRIORITIES:
+                    compact_priorities(self.request.user)
+            invalidate_lists(self.request.user)
         return HttpResponseRedirect(self.get_success_url())
 
 
@@ -205,6 +559,17 @@ class GenericTaskDeleteView(AuthorizedTaskManager, DeleteView):
     template_name = "task_delete.html"
     success_url = "/tasks"
 
+    def form_valid(self, form):
+        # Soft deleted, purge_tasks archives the task later on
+        with transaction.atomic():
+            self.object.deleted = True
+            self.object.save(update_fields=["deleted", "created_date"])
+            TaskCounter.objects.add(self.request.user, pending=-1, deleted=1)
+            if settings.TASKS_COMPACT_PRIORITIES:
+                compact_priorities(self.request.user)
+            invalidate_lists(self.request.user)
+        return HttpResponseRedirect(self.get_success_url())
+
 
 ################################ Mark task as complete ##########################################
 class GenericMarkTaskAsCompleteView(AuthorizedTaskManager, UpdateView):
@@ -214,22 +579,661 @@ class GenericMarkTaskAsCompleteView(AuthorizedTaskManager, UpdateView):
     success_url = "/tasks"
 
     def form_valid(self, form):
-        self.object = form.save()
-        self.object.completed = True
-        self.object.save()
+        complete_task(self.object, self.request.user)
         return HttpResponseRedirect(self.get_success_url())
 
 
+def complete_task(task, user):
+    with transaction.atomic():
+        task.completed = True
+        task.save(update_fields=["completed", "created_date"])
+        TaskCounter.objects.add(user, pending=-1, completed=1)
+        TaskDailyStats.objects.add(
+            user, completed=1, completion_time=task.created_date - task.created_at
+        )
+        if settings.TASKS_COMPACT_PRIORITIES:
+            compact_priorities(user)
+        invalidate_lists(user)
+
+
+################################ Batch operations ##########################################
+class TaskPriorityForm(ModelForm):
+    class Meta:
+        model = Task
+        fields = ("priority",)
+
+
+class PendingPriorities:
+    # In memory mirror of handlePriorityCascading, so that a whole batch needs a
+    # single cascade in the database. Keys are task ids, or ("new", index) for
+    # the tasks created by the batch.
+    def __init__(self, tasks):
+        self.by_key = dict(tasks)
+        self.by_priority = {priority: key for key, priority in self.by_key.items()}
+
+    def remove(self, key):
+        del self.by_priority[self.by_key.pop(key)]
+
+    def place(self, key, new_priority):
+        # Shifting the contiguous run starting at new_priority, from its end
+        run_end = new_priority
+        while run_end in self.by_priority:
+            run_end += 1
+        for priority in range(run_end - 1, new_priority - 1, -1):
+            shifted = self.by_priority.pop(priority)
+            self.by_priority[priority + 1] = shifted
+            self.by_key[shifted] = priority + 1
+        if key is not None:
+            self.by_priority[new_priority] = key
+            self.by_key[key] = new_priority
+
+
+def move_pending_tasks(original_priorities, final_priorities):
+    # Saves the priorities PendingPriorities moved the existing tasks to
+    moved = {
+        task_id: final_priorities[task_id]
+        for task_id, priority in original_priorities.items()
+        if final_priorities[task_id] != priority
+    }
+    if not moved:
+        return
+
+    # The constraint is checked row by row, so the moved tasks are parked above
+    # every priority in use before taking their new ones
+    offset = max([*original_priorities.values(), *moved.values()]) + 1
+    Task.objects.filter(id__in=moved).update(priority=F("priority") + offset)
+    Task.objects.bulk_update(
+        [Task(id=task_id, priority=priority) for task_id, priority in moved.items()],
+        ["priority"],
+    )
+
+
+class TaskBatchView(LoginRequiredMixin, View):
+    # POST {"operations": [{"op": "create", "title": ..., "description": ...,
+    # "priority": ..., "completed": ...}, {"op": "reprioritize", "id": ...,
+    # "priority": ...}, {"op": "complete", "id": ...}]}
+    # Operations apply in order, with the cascading of the task views. Invalid
+    # ones are reported and skipped, the others are saved in one transaction.
+    raise_exception = True
+    max_operations = 1000
+
+    def post(self, request):
+        try:
+            operations = json.loads(request.body)["operations"]
+        except (ValueError, TypeError, KeyError):
+            return JsonResponse({"error": 'Expected {"operations": [...]}'}, status=400)
+        if not isinstance(operations, list) or not all(
+            isinstance(operation, dict) for operation in operations
+        ):
+            return JsonResponse(
+                {"error": "operations must be a list of objects"}, status=400
+            )
+        if len(operations) > self.max_operations:
+            return JsonResponse(
+                {"error": f"At most {self.max_operations} operations per batch"},
+                status=400,
+            )
+
+        with transaction.atomic():
+            # Locking the user's tasks, as the cascade does
+            TaskCounter.objects.lock(request.user)
+            self.pending = PendingPriorities(
+                Task.objects.pending()
+                .filter(user=request.user)
+                .values_list("id", "priority")
+            )
+            self.original_priorities = dict(self.pending.by_key)
+            self.new_tasks = {}
+            self.completed_priorities = {}
+            self.reprioritized = set()
+
+            outcomes = [
+                self.apply(operation, index)
+                for index, operation in enumerate(operations)
+            ]
+            final_priorities = self.save()
+            invalidate_lists(request.user)
+
+        results = []
+        for key, errors in outcomes:
+            if errors:
+                results.append({"ok": False, "errors": errors})
+            else:
+                task_id = self.new_tasks[key].id if key in self.new_tasks else key
+                results.append(
+                    {"ok": True, "id": task_id, "priority": final_priorities[key]}
+                )
+        return JsonResponse({"results": results})
+
+    def apply(self, operation, index):
+        # Returns the key of the task and the errors of the operation
+        op = operation.get("op")
+        if op == "create":
+            form = TaskCreateForm(data=operation)
+            if not form.is_valid():
+                return None, form.errors.get_json_data()
+            task = form.save(commit=False)
+            task.user = self.request.user
+            key = ("new", index)
+            self.new_tasks[key] = task
+            self.pending.place(None if task.completed else key, task.priority)
+            return key, None
+
+        if op not in ("reprioritize", "complete"):
+            return None, {
+                "op": [{"message": f"Unknown operation {op!r}", "code": "invalid"}]
+            }
+        task_id = operation.get("id")
+        if type(task_id) is not int or task_id not in self.pending.by_key:
+            return None, {
+                "id": [{"message": "No such pending task", "code": "invalid"}]
+            }
+
+        if op == "complete":
+            self.completed_priorities[task_id] = self.pending.by_key[task_id]
+            self.pending.remove(task_id)
+            return task_id, None
+
+        form = TaskPriorityForm(data=operation)
+        if not form.is_valid():
+            return None, form.errors.get_json_data()
+        new_priority = form.cleaned_data["priority"]
+        if self.pending.by_key[task_id] != new_priority:
+            self.pending.remove(task_id)
+            self.pending.place(task_id, new_priority)
+            self.reprioritized.add(task_id)
+        return task_id, None
+
+    def save(self):
+        final_priorities = {**self.pending.by_key, **self.completed_priorities}
+        for key, task in self.new_tasks.items():
+            task.priority = final_priorities.setdefault(key, task.priority)
+
+        # Completed tasks leave the unique priority constraint first
+        completion_time = None
+        if self.completed_priorities:
+            completed_tasks = Task.objects.filter(id__in=self.completed_priorities)
+            now = timezone.now()
+            completion_time = completed_tasks.aggregate(
+                total=Sum(time_to_complete(now))
+            )["total"]
+            completed_tasks.update(completed=True, created_date=now)
+        move_pending_tasks(self.original_priorities, final_priorities)
+        # The tasks moved along keep their created_date, like in the cascade
+        reprioritized = [
+            task_id
+            for task_id in self.reprioritized
+            if final_priorities[task_id] != self.original_priorities[task_id]
+        ]
+        if reprioritized:
+            Task.objects.filter(id__in=reprioritized).update(
+                created_date=timezone.now()
+            )
+        Task.objects.bulk_create(self.new_tasks.values())
+
+        created_completed = sum(task.completed for task in self.new_tasks.values())
+        created_pending = len(self.new_tasks) - created_completed
+        if self.new_tasks or self.completed_priorities:
+            TaskCounter.objects.add(
+                self.request.user,
+                pending=created_pending - len(self.completed_priorities),
+                completed=created_completed + len(self.completed_priorities),
+            )
+            TaskDailyStats.objects.add(
+                self.request.user,
+                created=len(self.new_tasks),
+                completed=created_completed + len(self.completed_priorities),
+                completion_time=completion_time,
+            )
+        if (
+            self.completed_priorities
+            and settings.TASKS_COMPACT_PRIORITIES
+            and compact_priorities(self.request.user)
+        ):
+            # The pending tasks moved down into the gaps, as reported
+            ids = {
+                key: self.new_tasks[key].id if key in self.new_tasks else key
+                for key in final_priorities
+            }
+            priorities = dict(
+                Task.objects.filter(id__in=ids.values()).values_list("id", "priority")
+            )
+            final_priorities = {key: priorities[ids[key]] for key in final_priorities}
+        return final_priorities
+
+
+################################ Export ##########################################
+class TaskExportView(LoginRequiredMixin, View):
+    # GET /export/tasks.csv?status=pending&search=...
+    # Streams the tasks of a list view (?status=pending, completed or all) with
+    # its search, in chunks, so that the export takes the same memory for ten
+    # tasks or a million
+    format = "csv"
+    list_views = {
+        "pending": GenericTaskView,
+        "completed": GenericCompletedTaskView,
+        "all": GenericAllTaskView,
+    }
+    fields = ("id", "title", "description", "priority", "completed", "created_date")
+    chunk_size = 2000
+
+    def get(self, request):
+        list_view = self.list_views.get(request.GET.get("status", "all"))
+        if list_view is None:
+            raise Http404("Unknown status")
+        tasks = (
+            list_view(request=request)
+            .get_queryset()
+            .values_list(*self.fields)
+            .iterator(chunk_size=self.chunk_size)
+        )
+
+        if self.format == "csv":
+            rows = self.csv_rows(tasks)
+            content_type = "text/csv"
+        else:
+            rows = self.ndjson_rows(tasks)
+            content_type = "application/x-ndjson"
+        response = StreamingHttpResponse(rows, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="tasks.{self.format}"'
+        return response
+
+    def chunks(self, tasks):
+        # Yielding a chunk of rows at a time rather than every row saves most of
+        # the work of the response
+        chunk = []
+        for task in tasks:
+            chunk.append(task)
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def csv_rows(self, tasks):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.fields)
+        for chunk in self.chunks(tasks):
+            writer.writerows(chunk)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    def ndjson_rows(self, tasks):
+        encoder = DjangoJSONEncoder()
+        for chunk in self.chunks(tasks):
+            yield "".join(
+                encoder.encode(dict(zip(self.fields, task))) + "\n" for task in chunk
+            )
+
+
+################################ JSON API ##########################################
+class TaskListAPIView(LoginRequiredMixin, View):
+    # GET /api/tasks/?status=pending&search=...&fields=id,title&limit=50&cursor=...
+    # {"fields": ["id", "title"], "tasks": [[1, "..."], ...], "next": cursor}
+    # The tasks of a list view, as rows of the requested fields. They are read
+    # with values_list() and serialized as they come, no Task is built and the
+    # description is only read when asked for.
+    raise_exception = True
+    list_views = TaskExportView.list_views
+    fields = TaskExportView.fields
+    default_fields = ("id", "title", "priority", "completed", "created_date")
+    default_limit = 50
+    max_limit = 500
+    cursor_salt = "tasks.api.cursor"
+
+    def get(self, request):
+        status = request.GET.get("status", "pending")
+        list_view = self.list_views.get(status)
+        if list_view is None:
+            return JsonResponse(
+                {"error": f"status must be one of {list(self.list_views)}"}, status=400
+            )
+        fields = request.GET.get("fields")
+        fields = tuple(fields.split(",")) if fields else self.default_fields
+        if not set(fields) <= set(self.fields):
+            return JsonResponse(
+                {"error": f"fields must be some of {list(self.fields)}"}, status=400
+            )
+        try:
+            limit = int(request.GET.get("limit", self.default_limit))
+            position = {"status": status}
+            if "cursor" in request.GET:
+                position = signing.loads(request.GET["cursor"], salt=self.cursor_salt)
+        except (ValueError, signing.BadSignature):
+            return JsonResponse({"error": "Invalid limit or cursor"}, status=400)
+        # A position in one list is none in another, ordered by other fields
+        if position.get("status") != status:
+            return JsonResponse({"error": "Invalid limit or cursor"}, status=400)
+        limit = max(1, min(limit, self.max_limit))
+
+        view = list_view(request=request)
+        tasks = view.get_queryset()
+        # The fields of the cursor are read too, after the requested ones
+        columns = fields + tuple(
+            field for field in view.cursor_ordering if field not in fields
+        )
+        ordered_by_cursor = tuple(tasks.query.order_by) == view.cursor_ordering
+        offset = 0
+        if not ordered_by_cursor:
+            # Search results are ordered by relevance, they are paged by offset
+            offset = position.get("offset", 0)
+        elif "after" in position:
+            tasks = tasks.filter(view.get_cursor_filter(position["after"], False))
+
+        # One extra row tells whether there is a page after this one
+        rows = list(tasks.values_list(*columns)[offset : offset + limit + 1])
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            if ordered_by_cursor:
+                last = dict(zip(columns, rows[-1]))
+                position = {
+                    "status": status,
+                    "after": [last[field] for field in view.cursor_ordering],
+                }
+            else:
+                position = {"status": status, "offset": offset + limit}
+            next_cursor = signing.dumps(position, salt=self.cursor_salt)
+
+        if len(columns) > len(fields):
+            rows = [row[: len(fields)] for row in rows]
+        return JsonResponse({"fields": fields, "tasks": rows, "next": next_cursor})
+
+
+################################ Stats ##########################################
+def get_task_stats(user, days):
+    # Reads the daily rollups only, a row per day of the period at most however
+    # many tasks the user has
+    end = timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    rows = {
+        stats.date: stats
+        for stats in TaskDailyStats.objects.filter(user=user, date__range=(start, end))
+    }
+    daily = []
+    created = completed = completion_seconds = 0
+    for offset in range(days):
+        date = start + timedelta(days=offset)
+        stats = rows.get(date) or TaskDailyStats(date=date)
+        daily.append(
+            {
+                "date": date.isoformat(),
+                "created": stats.created,
+                "completed": stats.completed,
+            }
+        )
+        created += stats.created
+        completed += stats.completed
+        completion_seconds += stats.completion_seconds
+    return {
+        "days": daily,
+        "created": created,
+        "completed": completed,
+        # Above 1 when tasks created before the period were completed in it
+        "completion_rate": round(completed / created, 3) if created else None,
+        "average_completion_seconds": (
+            round(completion_seconds / completed) if completed else None
+        ),
+    }
+
+
+class TaskStatsManager:
+    default_days = 30
+    max_days = 365
+
+    def get_days(self):
+        # None when ?days= is not a number
+        try:
+            days = int(self.request.GET.get("days", self.default_days))
+        except ValueError:
+            return None
+        return max(1, min(days, self.max_days))
+
+
+class TaskStatsView(LoginRequiredMixin, TaskStatsManager, TemplateView):
+    template_name = "task_stats.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        days = self.get_days() or self.default_days
+        stats = get_task_stats(self.request.user, days)
+        context["days"] = days
+        context["stats"] = stats
+        # Most recent first, the days something happened
+        context["active_days"] = [
+            day for day in reversed(stats["days"]) if day["created"] or day["completed"]
+        ]
+        if stats["average_completion_seconds"] is not None:
+            context["average_completion_hours"] = (
+                stats["average_completion_seconds"] / 3600
+            )
+        return context
+
+
+class TaskStatsAPIView(LoginRequiredMixin, TaskStatsManager, View):
+    # GET /api/stats/?days=30
+    # {"days": [{"date": "2026-10-17", "created": 3, "completed": 2}, ...],
+    # "created": 3, "completed": 2, "completion_rate": 0.667,
+    # "average_completion_seconds": 5400}
+    raise_exception = True
+
+    def get(self, request):
+        days = self.get_days()
+        if days is None:
+            return JsonResponse({"error": "days must be a number"}, status=400)
+        return JsonResponse(get_task_stats(request.user, days))
+
+
+################################ Async views ##########################################
+# Django 4.0 has no async ORM methods (acount(), aget() and async iteration
+# came in 4.1), so the async views await their queries in threads. Under ASGI
+# the sync views take a thread, and a connection, of their own per request.
+# The reads of the async views share a fixed pool of threads instead. Writes
+# stay thread sensitive: they run in the thread sync code of the request runs
+# in, a whole transaction per call, on the connection of that thread.
+@lru_cache(maxsize=None)
+def get_read_executor(threads):
+    return ThreadPoolExecutor(threads, thread_name_prefix="tasks-read")
+
+
+def read(request, function):
+    if not settings.ASYNC_READ_THREADS:
+        # In the request's thread, which sees the transaction of a test
+        return sync_to_async(function)
+
+    def run(*args, **kwargs):
+        # These threads never see request_started/finished, which close the
+        # connections past CONN_MAX_AGE
+        close_old_connections()
+        with ExitStack() as stack:
+            # Counted by RequestTimingMiddleware, like the queries of its thread
+            timing = getattr(request, "timing", None)
+            if timing is not None:
+                for db_connection in connections.all():
+                    stack.enter_context(db_connection.execute_wrapper(timing))
+            return function(*args, **kwargs)
+
+    executor = get_read_executor(settings.ASYNC_READ_THREADS)
+    return sync_to_async(run, thread_sensitive=False, executor=executor)
+
+
+def write(function):
+    return sync_to_async(function, thread_sensitive=True)
+
+
+async def get_authenticated_user(request):
+    # request.user is loaded lazily, from the database
+    def load_user():
+        return request.user if request.user.is_authenticated else None
+
+    return await read(request, load_user)()
+
+
+async def async_task_view(request):
+    # The pending tasks list of GenericTaskView, sharing its cached pages
+    user = await get_authenticated_user(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+
+    cache = get_cache()
+    key = list_page_key(user, GenericTaskView.__name__, request.GET)
+    content = cache.get(key)
+    if content is not None:
+        record("hits")
+        response = HttpResponse(content)
+        response["X-Cache"] = "HIT"
+        return response
+
+    record("misses")
+    view = GenericTaskView()
+    view.setup(request)
+
+    def render_page():
+        view.object_list = view.get_queryset()
+        context = view.get_context_data()
+        return render_to_string(view.template_name, context, request)
+
+    content = await read(request, render_page)()
+    cache.set(key, content, settings.TASK_LIST_CACHE_TIMEOUT)
+    response = HttpResponse(content)
+    response["X-Cache"] = "MISS"
+    return response
+
+
+async def async_task_detail_view(request, pk):
+    user = await get_authenticated_user(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    task = await read(request, get_object_or_404)(Task.live, pk=pk, user=user)
+    return TemplateResponse(request, "task_detail.html", {"object": task})
+
+
+async def async_complete_task_view(request, pk):
+    # require_http_methods() cannot wrap async views before Django 4.1
+    if request.method not in ("GET", "POST"):
+        return HttpResponseNotAllowed(["GET", "POST"])
+    user = await get_authenticated_user(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    task = await read(request, get_object_or_404)(
+        Task.objects.pending(), pk=pk, user=user
+    )
+    if request.method == "POST":
+        await write(complete_task)(task, user)
+        return HttpResponseRedirect("/tasks")
+    return TemplateResponse(request, "task_complete.html", {"object": task})
+
+
+################################ Static files ##########################################
+# Variants written by collectstatic, by order of preference
+STATIC_ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+# The hash of ManifestStaticFilesStorage, app.1d2c3b4a5f6e.css
+HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.\w+$")
+
+
+def accepted_encodings(header):
+    encodings = set()
+    for item in header.split(","):
+        encoding, _, parameters = item.partition(";")
+        # gzip;q=0 refuses gzip
+        if not re.fullmatch(r"\s*q\s*=\s*0(\.0*)?\s*", parameters):
+            encodings.add(encoding.strip().lower())
+    return encodings
+
+
+def find_static_file(path):
+    # The collected file, or the file of an app before collectstatic has run
+    if settings.STATIC_ROOT:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+        if os.path.isfile(full_path):
+            return full_path
+    return finders.find(path)
+
+
+def static_file_view(request, path):
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+    try:
+        full_path = find_static_file(path)
+    except SuspiciousFileOperation:
+        full_path = None
+    if not full_path or not os.path.isfile(full_path):
+        raise Http404(f"{path} is not a static file")
+
+    stat = os.stat(full_path)
+    if not was_modified_since(
+        request.META.get("HTTP_IF_MODIFIED_SINCE"), stat.st_mtime
+    ):
+        return HttpResponseNotModified()
+
+    variants = [
+        (encoding, full_path + extension)
+        for encoding, extension in STATIC_ENCODINGS
+        if os.path.isfile(full_path + extension)
+    ]
+    accepted = accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+    served_path, content_encoding = full_path, None
+    for encoding, variant_path in variants:
+        if encoding in accepted:
+            served_path, content_encoding = variant_path, encoding
+            break
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    response = FileResponse(
+        open(served_path, "rb"),
+        content_type=content_type or "application/octet-stream",
+    )
+    response.headers["Last-Modified"] = http_date(stat.st_mtime)
+    if content_encoding:
+        response.headers["Content-Encoding"] = content_encoding
+    if variants:
+        patch_vary_headers(response, ["Accept-Encoding"])
+    if HASHED_NAME.search(path):
+        # A new content gets a new name, the browsers never need to ask again
+        response.headers["Cache-Control"] = (
+            f"public, max-age={settings.STATIC_MAX_AGE}, immutable"
+        )
+    else:
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
 ################################ Session Storage ##########################################
+def count_session_view(session):
+    # Returns the number of views before this one. The views are counted in the
+    # sessions cache and added to the session every SESSION_VIEWS_FLUSH_EVERY
+    # views, the session is only saved then. Views not added yet are lost with
+    # the cache.
+    total_views = session.get("total_views", 0)
+    if session.session_key is None:
+        # A new session is saved anyway
+        session["total_views"] = total_views + 1
+        return total_views
+
+    cache = caches[settings.SESSION_CACHE_ALIAS]
+    # Signed cookie sessions have the whole session in their key
+    digest = hashlib.md5(session.session_key.encode()).hexdigest()
+    key = f"tasks:session:views:{digest}"
+    try:
+        unsaved_views = cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, settings.SESSION_COOKIE_AGE)
+        unsaved_views = 1
+    if unsaved_views >= settings.SESSION_VIEWS_FLUSH_EVERY:
+        session["total_views"] = total_views + unsaved_views
+        cache.delete(key)
+    return total_views + unsaved_views - 1
+
+
 def session_storage_view(request):
     print(
         request.session
     )  # <django.contrib.sessions.backends.db.SessionStore object at 0x7f8fa8126d90> (It is a dict)
 
-    # Get the total views from the session
-    total_views = request.session.get("total_views", 0)
-    # Store the value back in the session
-    request.session["total_views"] = total_views + 1
+    # Get the total views, from the session and the views not saved in it yet
+    total_views = count_session_view(request.session)
     # Render it back to us
     return HttpResponse(
         f"Total views is {total_views} and the user is {request.user} and are they authenticated? {request.user.is_authenticated}"